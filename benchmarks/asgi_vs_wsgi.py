@@ -0,0 +1,153 @@
+"""
+Role pages under WSGI vs. ASGI: requests per second and p50/p99 latency.
+
+Seeds a scratch database, then starts the project under each server in turn
+(gunicorn for WSGI, uvicorn for ASGI — the ASGI run serves the async views)
+with the same number of workers, and drives each read-mostly role page with
+--concurrency client threads for --duration seconds.
+
+    pip install gunicorn uvicorn
+    python benchmarks/asgi_vs_wsgi.py --patients 5000 --workers 2 --concurrency 50
+
+Override the server commands with --wsgi-cmd / --asgi-cmd; {port},
+{workers} and {threads} are filled in.
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import time
+
+from common import ROOT, setup_django, seed, summarize
+
+PAGES = [
+    '/patients/',
+    '/enrollments/',
+    '/doctor/patients/',
+    '/pharmacy/queue/',
+    '/overview/',
+]
+WSGI_CMD = ('gunicorn health_system.wsgi:application --bind 127.0.0.1:{port} '
+            '--workers {workers} --threads {threads} --log-level warning')
+ASGI_CMD = ('uvicorn health_system.asgi:application --port {port} '
+            '--workers {workers} --log-level warning')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def create_user():
+    """A superuser in every role group, so one login can load every page."""
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group
+    from health_app.models import Program, DoctorProfile
+    user = get_user_model().objects.create_superuser('bench', 'bench@example.com', 'bench')
+    for name in ('Receptionist', 'Doctor', 'Pharmacist'):
+        user.groups.add(Group.objects.get_or_create(name=name)[0])
+    DoctorProfile.objects.create(user=user, program=Program.objects.first())
+
+
+def login(base):
+    import requests
+    session = requests.Session()
+    session.get(f'{base}/accounts/login/')
+    session.post(f'{base}/accounts/login/', data={
+        'username': 'bench', 'password': 'bench',
+        'csrfmiddlewaretoken': session.cookies['csrftoken'],
+    })
+    return session.cookies
+
+
+def load(base, path, cookies, concurrency, duration):
+    import requests
+    samples, errors, lock = [], [0], threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        session.cookies.update(cookies)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = session.get(base + path, allow_redirects=False).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    samples.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {'requests': len(samples), 'errors': errors[0],
+            'rps': round(len(samples) / duration, 1),
+            **(summarize(samples) if samples else {})}
+
+
+def run(command, db_path, args):
+    port = free_port()
+    env  = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'health_system.settings',
+            'HEALTH_SQLITE_PATH': db_path}
+    cmd  = command.format(port=port, workers=args.workers, threads=args.threads)
+    server = subprocess.Popen(shlex.split(cmd), cwd=ROOT, env=env)
+    try:
+        wait_for(port)
+        base    = f'http://127.0.0.1:{port}'
+        cookies = login(base)
+        for path in PAGES:   # warm caches and imports
+            load(base, path, cookies, 1, 0.5)
+        return {path: load(base, path, cookies, args.concurrency, args.duration) for path in PAGES}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients',    type=int,   default=2000)
+    parser.add_argument('--workers',     type=int,   default=2)
+    parser.add_argument('--threads',     type=int,   default=4, help='WSGI threads per worker')
+    parser.add_argument('--concurrency', type=int,   default=32)
+    parser.add_argument('--duration',    type=float, default=10.0, help='seconds per page')
+    parser.add_argument('--wsgi-cmd',    default=WSGI_CMD)
+    parser.add_argument('--asgi-cmd',    default=ASGI_CMD)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    seed(patients=args.patients)
+    create_user()
+
+    results = {
+        'patients':    args.patients,
+        'workers':     args.workers,
+        'concurrency': args.concurrency,
+        'wsgi':        run(args.wsgi_cmd, db_path, args),
+        'asgi':        run(args.asgi_cmd, db_path, args),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Shared bootstrap for the standalone benchmark scripts.
+
+On SQLite each script runs against a throwaway file so it never touches
+the project's db.sqlite3. With HEALTH_DATABASE_URL set (PostgreSQL) the
+scripts use that database as configured, so point it at a scratch one:
+
+    python benchmarks/<script>.py --help
+"""
+import os
+import sys
+import statistics
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(db_path=None, migrate=True):
+    """
+    Configure Django against a scratch database and (unless migrate=False)
+    create the schema. Returns the database path (or name) in use.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'health_system.settings')
+
+    import django
+    from django.conf import settings
+    django.setup()
+
+    database = settings.DATABASES['default']
+    if database['ENGINE'].endswith('sqlite3'):
+        db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='health-bench-'), 'bench.sqlite3')
+        database['NAME'] = db_path
+    else:
+        db_path = database['NAME']
+
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', run_syncdb=True, verbosity=0)
+    return db_path
+
+
+def seed(patients=1000, programs=5, enrollments_per_patient=2, diagnosed_ratio=0.5,
+         dispensed_ratio=0.8, days=365):
+    """
+    Bulk-insert a synthetic dataset (see health_app/synthetic.py) with
+    enrollment/diagnosis dates spread over the last `days` days; returns
+    the created programs, largest first.
+    """
+    from health_app import synthetic
+    return synthetic.generate(patients=patients, programs=programs,
+                              enrollments_per_patient=enrollments_per_patient,
+                              diagnosed_ratio=diagnosed_ratio, dispensed_ratio=dispensed_ratio,
+                              days=days)['programs']
+
+
+def timed(fn, repeat=20):
+    """Run fn() `repeat` times; returns latency stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples):
+    """Mean and percentiles of latency samples given in milliseconds."""
+    samples = sorted(samples)
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+    return {
+        'mean_ms': round(statistics.mean(samples), 3),
+        'p50_ms':  pct(0.50),
+        'p95_ms':  pct(0.95),
+        'p99_ms':  pct(0.99),
+        'max_ms':  round(samples[-1], 3),
+    }
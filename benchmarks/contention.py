@@ -0,0 +1,191 @@
+"""
+Write contention: dispensing and diagnosing stations sharing one database.
+
+Seeds a scratch database, then runs --pharmacists, --doctors and --readers
+threads against it for --duration seconds. Each thread stands for one
+workstation with its own connection:
+
+    pharmacist  services.dispense() on the next --batch pending diagnoses
+    doctor      services.diagnose() on the next --batch registered enrollments
+    reader      the first page of the pharmacy queue plus the overview counters
+
+Reports operations per second, latency percentiles and errors (e.g.
+"database is locked") per role as JSON. The configured backend is used;
+on SQLite, --journal (repeatable) runs the workload once per journal mode
+on a fresh file, to compare WAL with the rollback journal:
+
+    python benchmarks/contention.py --journal delete --journal wal
+    HEALTH_DATABASE_URL=postgres://localhost/health_bench python benchmarks/contention.py
+    HEALTH_DATABASE_URL=… HEALTH_DB_POOL=4:16 python benchmarks/contention.py --pharmacists 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+from common import ROOT, setup_django, seed, summarize
+
+
+class Station(threading.Thread):
+    def __init__(self, role, work, start_at, stop_at):
+        super().__init__(daemon=True)
+        self.role     = role
+        self.work     = work          # callable() → False once there is nothing left to do
+        self.start_at = start_at
+        self.stop_at  = stop_at
+        self.samples  = []
+        self.errors   = {}
+
+    def run(self):
+        from django.db import connection, DatabaseError
+        threading.Event().wait(max(0, self.start_at - time.perf_counter()))
+        try:
+            while time.perf_counter() < self.stop_at:
+                begin = time.perf_counter()
+                try:
+                    if self.work() is False:
+                        break
+                except DatabaseError as exc:
+                    key = f'{type(exc).__name__}: {exc}'
+                    self.errors[key] = self.errors.get(key, 0) + 1
+                    continue
+                self.samples.append((time.perf_counter() - begin) * 1000)
+        finally:
+            connection.close()
+
+
+def queues():
+    """Shared work lists: pending diagnosis ids and undiagnosed enrollment ids."""
+    from health_app.models import Diagnosis, Enrollment
+    pending = deque(Diagnosis.objects.filter(dispensed=False).order_by('created_on', 'id')
+                    .values_list('id', flat=True))
+    undiagnosed = deque(Enrollment.objects.filter(diagnosis__isnull=True).order_by('id')
+                        .values_list('id', flat=True))
+    return pending, undiagnosed
+
+
+def workload(args):
+    from django.contrib.auth import get_user_model
+    from health_app import services, stats
+
+    pharmacist = get_user_model().objects.get(username='bench-pharmacist')
+    doctors    = list(get_user_model().objects.filter(username__startswith='bench-doctor-'))
+    pending, undiagnosed = queues()
+    lock = threading.Lock()
+
+    def take(queue):
+        with lock:
+            return [queue.popleft() for _ in range(min(args.batch, len(queue)))]
+
+    def dispense():
+        ids = take(pending)
+        if not ids:
+            return False
+        services.dispense(ids, pharmacist)
+
+    def diagnose_as(doctor):
+        def diagnose():
+            ids = take(undiagnosed)
+            if not ids:
+                return False
+            services.diagnose([{'enrollment': pk, 'diagnosis': 'Malaria', 'recommendations': 'ACT'}
+                               for pk in ids], doctor)
+        return diagnose
+
+    def read():
+        list(services.pending_queue()[:25])
+        stats.overview()
+
+    start_at = time.perf_counter() + 0.5
+    stop_at  = start_at + args.duration
+    stations = (
+        [Station('pharmacist', dispense, start_at, stop_at) for _ in range(args.pharmacists)]
+        + [Station('doctor', diagnose_as(doctors[i % len(doctors)]), start_at, stop_at)
+           for i in range(args.doctors)]
+        + [Station('reader', read, start_at, stop_at) for _ in range(args.readers)]
+    )
+    for station in stations:
+        station.start()
+    for station in stations:
+        station.join()
+    elapsed = min(time.perf_counter(), stop_at) - start_at
+
+    report = {}
+    for role in ('pharmacist', 'doctor', 'reader'):
+        group = [s for s in stations if s.role == role]
+        if not group:
+            continue
+        samples = [ms for s in group for ms in s.samples]
+        errors  = {}
+        for s in group:
+            for key, count in s.errors.items():
+                errors[key] = errors.get(key, 0) + count
+        report[role] = {
+            'stations':       len(group),
+            'operations':     len(samples),
+            'ops_per_second': round(len(samples) / elapsed, 1),
+            **(summarize(samples) if samples else {}),
+            'errors':         errors,
+        }
+    return report
+
+
+def describe():
+    from django.db import connection
+    database = connection.settings_dict
+    info = {'database': connection.vendor}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            info['journal_mode'] = cursor.fetchone()[0]
+    else:
+        info['conn_max_age'] = database['CONN_MAX_AGE']
+        info['pool']         = database['OPTIONS'].get('pool')
+    return info
+
+
+def run(args, journal=None):
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+    from health_app import database
+    if journal:
+        # a fresh file per journal mode: WAL stays set in a file once enabled
+        connections.close_all()
+        path = os.path.join(tempfile.mkdtemp(prefix='health-bench-'), 'contention.sqlite3')
+        settings.DATABASES['default'].update(database.sqlite(
+            {**os.environ, 'HEALTH_SQLITE_PATH': path, 'HEALTH_SQLITE_JOURNAL': journal}, ROOT))
+        call_command('migrate', run_syncdb=True, verbosity=0)
+    seed(patients=args.patients, programs=args.programs, diagnosed_ratio=0.5, dispensed_ratio=0.3)
+    return {**describe(), 'roles': workload(args)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients',    type=int, default=3000)
+    parser.add_argument('--programs',    type=int, default=5)
+    parser.add_argument('--pharmacists', type=int, default=4)
+    parser.add_argument('--doctors',     type=int, default=4)
+    parser.add_argument('--readers',     type=int, default=4)
+    parser.add_argument('--batch',       type=int, default=1, help='items per dispense/diagnose call')
+    parser.add_argument('--duration',    type=float, default=10, help='seconds per run')
+    parser.add_argument('--journal',     action='append', choices=('wal', 'delete', 'truncate', 'persist'),
+                        help='SQLite journal mode to run with (repeatable)')
+    args = parser.parse_args()
+
+    setup_django(migrate=not args.journal)
+    from django.db import connection
+    if args.journal and connection.vendor != 'sqlite':
+        parser.error('--journal applies to SQLite only')
+
+    runs = [run(args, journal) for journal in args.journal] if args.journal else [run(args)]
+    print(json.dumps({'workload': {k: getattr(args, k) for k in
+                                   ('patients', 'pharmacists', 'doctors', 'readers', 'batch', 'duration')},
+                      'runs': runs}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
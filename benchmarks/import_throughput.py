@@ -0,0 +1,74 @@
+"""
+Bulk import throughput (rows per second) for patients and enrollments.
+
+Generates synthetic CSV in memory and runs it through importer.py at a few
+chunk sizes; each run starts from an empty scratch database.
+
+    python benchmarks/import_throughput.py --rows 50000 --chunk-sizes 100 1000 5000
+"""
+import argparse
+import io
+import json
+import time
+
+from common import setup_django
+
+
+def patients_csv(n):
+    out = io.StringIO()
+    out.write('name,age,gender,contact\n')
+    for i in range(n):
+        out.write(f'Patient {i},{18 + i % 60},{("Male", "Female", "Other")[i % 3]},07{i:08d}\n')
+    out.seek(0)
+    return out
+
+
+def enrollments_csv(n, programs):
+    out = io.StringIO()
+    out.write('contact,program_name\n')
+    for i in range(n):
+        out.write(f'07{i:08d},Program {i % programs}\n')
+    out.seek(0)
+    return out
+
+
+def run(fn, source, chunk_size):
+    from health_app import importer
+    started = time.perf_counter()
+    report  = fn(importer.read_rows(source, 'csv'), chunk_size=chunk_size)
+    elapsed = time.perf_counter() - started
+    return {
+        'chunk_size':   chunk_size,
+        'rows':         report['rows'],
+        'created':      report['created'],
+        'seconds':      round(elapsed, 3),
+        'rows_per_sec': round(report['rows'] / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows',        type=int, default=20000)
+    parser.add_argument('--programs',    type=int, default=5)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    setup_django()
+    from health_app import importer
+    from health_app.models import Program, Patient
+
+    results = []
+    for chunk_size in args.chunk_sizes:
+        Patient.objects.all().delete()
+        Program.objects.all().delete()
+        Program.objects.bulk_create(Program(name=f'Program {i}') for i in range(args.programs))
+        results.append({
+            'patients':    run(importer.import_patients, patients_csv(args.rows), chunk_size),
+            'enrollments': run(importer.import_enrollments, enrollments_csv(args.rows, args.programs),
+                               chunk_size),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Patient list page: loopback HTTP self-call vs. the in-process service layer.
+
+The "loopback" column reproduces what list_patients used to do — GET
+/api/patients/ over HTTP from inside the request, then render the page from
+the JSON. The "in-process" column renders the same template from
+services.search_patients(). Both hit the same scratch database.
+
+    python benchmarks/loopback_latency.py --patients 500 --repeat 30
+"""
+import argparse
+import json
+import threading
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+from common import setup_django, seed, timed
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=500)
+    parser.add_argument('--repeat',   type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(patients=args.patients)
+
+    import requests
+    from django.core.wsgi import get_wsgi_application
+    from django.template.loader import render_to_string
+    from health_app import services
+
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = f'http://127.0.0.1:{server.server_port}/api/patients/'
+
+    def loopback():
+        resp = requests.get(api)
+        render_to_string('health_app/patients/list.html', {'patients': resp.json(), 'q': ''})
+
+    def in_process():
+        render_to_string('health_app/patients/list.html',
+                         {'patients': services.search_patients(''), 'q': ''})
+
+    results = {
+        'patients':   args.patients,
+        'loopback':   timed(loopback, args.repeat),
+        'in_process': timed(in_process, args.repeat),
+    }
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
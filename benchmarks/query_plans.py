@@ -0,0 +1,66 @@
+"""
+Query plans and timings for the hot query paths, before and after the
+0003_hot_path_indexes migration.
+
+Seeds a synthetic dataset at the pre-index schema (0002), records EXPLAIN
+output and latency for each query, applies 0003, and records them again.
+
+    python benchmarks/query_plans.py --patients 50000 --repeat 20 > plans.json
+"""
+import argparse
+import datetime
+import json
+
+from common import setup_django, seed, timed
+
+BEFORE = '0002_statcounter'
+AFTER  = '0003_hot_path_indexes'
+
+
+def hot_queries(program):
+    from health_app.models import Patient, Enrollment, Diagnosis
+    today = datetime.date.today()
+    return {
+        'pharmacy_pending':   Diagnosis.objects.filter(dispensed=False).order_by('created_on')[:50],
+        'pharmacy_dispensed': Diagnosis.objects.filter(dispensed=True).order_by('-dispensed_on')[:50],
+        'doctor_registered':  Enrollment.objects.filter(program=program, status='registered'),
+        'enrolled_on_date':   Enrollment.objects.filter(enrolled_on=today - datetime.timedelta(days=7)),
+        'enrolled_on_year':   Enrollment.objects.filter(enrolled_on__year=today.year),
+        'patient_name_contains': Patient.objects.filter(name__icontains='ent 12'),
+    }
+
+
+def measure(program, repeat):
+    results = {}
+    for name, qs in hot_queries(program).items():
+        results[name] = {
+            'plan':    qs.explain(),
+            'latency': timed(lambda: list(qs.all()), repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=20000)
+    parser.add_argument('--repeat',   type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    call_command('migrate', 'health_app', BEFORE, verbosity=0)
+
+    program = seed(patients=args.patients)[0]
+    before  = measure(program, args.repeat)
+    call_command('migrate', 'health_app', AFTER, verbosity=0)
+    after   = measure(program, args.repeat)
+
+    print(json.dumps({
+        'patients': args.patients,
+        'queries':  {name: {'before': before[name], 'after': after[name]} for name in before},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Pharmacy queue rendering: fragment cache on/off, compiled vs. re-parsed templates.
+
+Seeds a scratch database and renders pharmacy/queue.html with --rows pending
+diagnoses on one page. Each case times stamping (the version lookups) plus
+rendering:
+
+    plain         fragment cache off, cached template loader
+    uncompiled    fragment cache off, template re-read and re-parsed each time
+    cold          fragment cache on, emptied before every render
+    warm          fragment cache on, nothing changed since the last render
+    churn         warm, with --churn of the rows' diagnoses bumped before each render
+
+    python benchmarks/rendering.py --patients 5000 --rows 25 --rows 500
+"""
+import argparse
+import json
+import math
+
+from common import setup_django, seed, timed
+
+
+def renderer(rows, loaders=None):
+    """render() → HTML of the queue page with `rows` pending diagnoses."""
+    from django.contrib.auth import get_user_model
+    from django.core.paginator import Paginator
+    from django.template import engines
+    from django.template.backends.django import DjangoTemplates
+    from django.test import RequestFactory
+    from django.utils.timezone import now
+    from health_app import fragments, services
+
+    engine = engines['django']
+    if loaders:
+        config = engine.engine
+        engine = DjangoTemplates({'NAME': 'uncompiled', 'DIRS': config.dirs, 'APP_DIRS': False,
+                                  'OPTIONS': {'loaders': loaders,
+                                              'context_processors': config.context_processors}})
+    request      = RequestFactory().get('/pharmacy/queue/')
+    request.user = get_user_model().objects.get(username='bench-pharmacist')
+    queryset     = services.pending_queue()
+
+    def render():
+        page = Paginator(queryset, rows).get_page(1)
+        return engine.get_template('health_app/pharmacy/queue.html').render({
+            'undispensed_diagnoses': page,
+            'pending_version':       fragments.stamp_diagnoses(page),
+            'dispensed_diagnoses':   [],
+            'dispensed_version':     fragments.stamp_diagnoses([]),
+            'days':                  7,
+            'polled_at':             now().isoformat(),
+        }, request)
+    return render
+
+
+def cases(rows, churn, repeat):
+    from django.core.cache import caches
+    from django.test.utils import override_settings
+    from health_app import fragments, response_cache
+    from health_app.models import Diagnosis
+
+    cache   = caches[response_cache.CACHE_ALIAS]
+    render  = renderer(rows)
+    pending = list(Diagnosis.objects.filter(dispensed=False).order_by('created_on', 'id')
+                   .values_list('pk', flat=True)[:rows])
+    changed = max(1, math.ceil(len(pending) * churn))
+    cursor  = [0]
+
+    def cold():
+        cache.clear()
+        render()
+
+    def churned():
+        start = cursor[0] % len(pending)
+        fragments.bump(Diagnosis, pending[start:start + changed])
+        cursor[0] += changed
+        render()
+
+    with override_settings(HEALTH_FRAGMENT_CACHE=False):
+        results = {
+            'plain':      timed(render, repeat),
+            'uncompiled': timed(renderer(rows, loaders=[
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]), repeat),
+        }
+    render()
+    results['cold']  = timed(cold, repeat)
+    render()
+    results['warm']  = timed(render, repeat)
+    results['churn'] = {**timed(churned, repeat), 'rows_changed': changed}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--rows',     type=int, action='append', help='rows on the page (repeatable)')
+    parser.add_argument('--churn',    type=float, default=0.1, help='fraction of rows changed per render')
+    parser.add_argument('--repeat',   type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(patients=args.patients, diagnosed_ratio=0.8, dispensed_ratio=0.3)
+    results = {str(rows): cases(rows, args.churn, args.repeat) for rows in args.rows or [25, 250]}
+    print(json.dumps({'seeded_patients': args.patients, 'churn': args.churn, 'pages': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+List serialization: model serializers vs. the .values() path, full vs. sparse.
+
+Seeds a scratch database and, for each list endpoint, times turning --rows
+rows into response data three ways — DRF serializers over model instances
+(what lists did before), the ValuesPlan fast path, and the fast path with a
+sparse ?fields= selection — and reports the JSON payload size of each.
+
+    python benchmarks/serialization.py --patients 5000 --rows 2000
+"""
+import argparse
+import json
+
+from common import setup_django, seed, timed
+
+# endpoint → ?fields= selection for the sparse run
+SPARSE = {
+    'patients':    ['id', 'name'],
+    'enrollments': ['id', 'patient', 'program', 'status'],
+    'diagnoses':   ['id', 'enrollment', 'dispensed'],
+}
+
+
+def cases(rows):
+    from rest_framework.utils.encoders import JSONEncoder
+    from health_app import services
+    from health_app.fieldsets import ValuesPlan
+    from health_app.models import Diagnosis
+    from health_app.serializers import PatientSerializer, EnrollmentSerializer, DiagnosisSerializer
+
+    sources = {
+        'patients':    (PatientSerializer,    lambda: services.patient_queryset({}).order_by('id')),
+        'enrollments': (EnrollmentSerializer, lambda: services.enrollment_queryset().order_by('-id')),
+        'diagnoses':   (DiagnosisSerializer,  lambda: Diagnosis.objects.order_by('id')),
+    }
+    for name, (serializer, queryset) in sources.items():
+        full, sparse = ValuesPlan.of(serializer()), ValuesPlan.of(serializer(fields=SPARSE[name]))
+        runs = {
+            'serializer': lambda: serializer(queryset()[:rows], many=True).data,
+            'values':     lambda: full.rows(full.values(queryset())[:rows]),
+            'sparse':     lambda: sparse.rows(sparse.values(queryset())[:rows]),
+        }
+        yield name, {
+            label: {**timed(fn, repeat=10),
+                    'payload_bytes': len(json.dumps(fn(), cls=JSONEncoder).encode())}
+            for label, fn in runs.items()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=3000)
+    parser.add_argument('--rows',     type=int, default=1000, help='rows per list')
+    args = parser.parse_args()
+
+    setup_django()
+    seed(patients=args.patients)
+    results = {'seeded_patients': args.patients, 'rows': args.rows, 'lists': dict(cases(args.rows))}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Benchmark suite: the hot paths end to end, as JSON for run-to-run comparison.
+
+Seeds a scratch database with health_app.synthetic (or reuses --db), then
+sends each scenario's request through the full Django stack in-process
+(middleware, auth, views, templates) as the matching bench-* role user.
+For every scenario it reports latency percentiles, SQL queries per request
+and peak Python memory (tracemalloc, measured on separate passes so it
+does not skew the timings).
+
+    python benchmarks/suite.py --patients 20000 --repeat 50 --output run.json
+    python benchmarks/suite.py --baseline run.json         # adds p50/p95 ratios
+    python benchmarks/suite.py --scenario pharmacy_queue --scenario dispense
+
+API scenarios marked "cold" clear the response cache before every request;
+the others may be served from it, as in production. Every request must
+answer 200, or the run stops. The dispense scenario marks DISPENSE_BATCH
+diagnoses as dispensed per request. If the database has fewer pending
+than the run will take, a batch of undispensed ones is seeded first.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from common import ROOT, setup_django, seed, summarize
+
+DISPENSE_BATCH = 20
+
+
+class Scenario:
+    def __init__(self, name, user, path, method='get', cold=False, body=None):
+        self.name   = name
+        self.user   = user     # bench-* username
+        self.path   = path     # str, or callable(context) → str
+        self.method = method
+        self.cold   = cold     # clear the API response cache before each request
+        self.body   = body     # callable(context) → JSON body, for POSTs
+
+
+def scenarios():
+    return [
+        Scenario('api_patients_list',     'bench-admin', '/api/patients/', cold=True),
+        Scenario('api_patients_list_hit', 'bench-admin', '/api/patients/'),
+        Scenario('api_patients_sparse',   'bench-admin', '/api/patients/?fields=id,name', cold=True),
+        Scenario('api_patients_search',   'bench-admin', '/api/patients/?search=Wanjiru', cold=True),
+        Scenario('api_patients_contact',  'bench-admin', lambda c: f"/api/patients/?contact={c['contact']}",
+                 cold=True),
+        Scenario('api_patients_program',  'bench-admin', lambda c: f"/api/patients/?program_id={c['program']}",
+                 cold=True),
+        Scenario('api_patients_year',     'bench-admin', lambda c: f"/api/patients/?year={c['year']}",
+                 cold=True),
+        Scenario('api_enrollments_list',  'bench-admin', '/api/enrollments/', cold=True),
+        Scenario('doctor_patients',       lambda c: c['doctor'], '/doctor/patients/'),
+        Scenario('pharmacy_queue',        'bench-pharmacist', '/pharmacy/queue/'),
+        Scenario('dispense',              'bench-pharmacist', '/pharmacy/dispense/batch/', method='post',
+                 body=lambda c: {'ids': c['pending'](DISPENSE_BATCH)}),
+        Scenario('admin_overview',        'bench-admin', '/overview/'),
+        Scenario('admin_overview_lookup', 'bench-admin', lambda c: f"/overview/?contact={c['contact']}"),
+        Scenario('admin_patients',        'bench-admin', '/admin/health_app/patient/'),
+        Scenario('admin_diagnoses',       'bench-admin', '/admin/health_app/diagnosis/?dispensed__exact=0'),
+        Scenario('admin_enrollments_program', 'bench-admin',
+                 lambda c: f"/admin/health_app/enrollment/?program__id__exact={c['program']}"),
+    ]
+
+
+def context(programs):
+    """Ids and values the scenarios fill into their requests."""
+    from health_app.models import Patient, Diagnosis
+    pending = Diagnosis.objects.filter(dispensed=False).order_by('created_on', 'id') \
+        .values_list('id', flat=True).iterator()
+
+    def take(n):
+        return [pk for _, pk in zip(range(n), pending)]
+
+    return {
+        'program': programs[0].pk,
+        'doctor':  f'bench-doctor-{programs[0].pk}',
+        'contact': Patient.objects.order_by('-pk').values_list('contact', flat=True).first(),
+        'year':    datetime.date.today().year,
+        'pending': take,
+    }
+
+
+def ensure_pending(needed):
+    """Seed undispensed diagnoses until at least `needed` are pending."""
+    from health_app import synthetic
+    from health_app.models import Diagnosis
+    short = needed - Diagnosis.objects.filter(dispensed=False).count()
+    if short > 0:
+        # every enrollment diagnosed, none dispensed: at least one pending per patient
+        synthetic.generate(patients=short, programs=1, diagnosed_ratio=1, dispensed_ratio=0, days=30)
+
+
+def run(scenario, ctx, repeat, memory_repeat):
+    from django.core.cache import caches
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from health_app import response_cache
+
+    client = Client(HTTP_HOST='localhost')
+    user   = scenario.user(ctx) if callable(scenario.user) else scenario.user
+    client.force_login(get_user_model().objects.get(username=user))
+    cache  = caches[response_cache.CACHE_ALIAS]
+
+    def request():
+        path = scenario.path(ctx) if callable(scenario.path) else scenario.path
+        if scenario.cold:
+            cache.clear()
+        if scenario.method == 'post':
+            body = json.dumps(scenario.body(ctx))   # built before the clock starts
+            start = time.perf_counter()
+            response = client.post(path, body, content_type='application/json')
+        else:
+            start = time.perf_counter()
+            response = client.get(path)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise SystemExit(f'{scenario.name}: {scenario.method.upper()} {path} '
+                             f'returned {response.status_code}')
+        return elapsed
+
+    request()   # warm-up: imports, template loading, first cache fill
+    samples = [request() for _ in range(repeat)]
+
+    queries, peaks = [], []
+    for _ in range(memory_repeat):
+        with CaptureQueriesContext(connection) as captured:
+            tracemalloc.start()
+            request()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        queries.append(len(captured))
+
+    return {
+        'path':          scenario.path(ctx) if callable(scenario.path) else scenario.path,
+        'method':        scenario.method.upper(),
+        'cold':          scenario.cold,
+        **summarize(samples),
+        'queries':       max(queries) if queries else None,
+        'peak_mem_kib':  round(max(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def environment(patients, db_path):
+    import django
+    from django.db import connection
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit':    commit,
+        'python':    platform.python_version(),
+        'django':    django.get_version(),
+        'database':  connection.vendor,
+        'db_path':   db_path,
+        'patients':  patients,
+    }
+
+
+def compare(results, baseline_path):
+    """Add p50/p95 ratios (this run / baseline; below 1 is faster) per scenario."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before:
+            result['vs_baseline'] = {
+                key: round(result[key] / before[key], 3) if before.get(key) else None
+                for key in ('p50_ms', 'p95_ms')
+            }
+            result['vs_baseline']['queries'] = (result['queries'] or 0) - (before.get('queries') or 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients',  type=int, default=5000)
+    parser.add_argument('--programs',  type=int, default=8)
+    parser.add_argument('--repeat',    type=int, default=30, help='timed requests per scenario')
+    parser.add_argument('--memory-repeat', type=int, default=3,
+                        help='extra requests per scenario for query counts and peak memory')
+    parser.add_argument('--scenario',  action='append', help='run only these (repeatable)')
+    parser.add_argument('--db',        help='reuse this database (already migrated and seeded)')
+    parser.add_argument('--output',    help='write the JSON here as well as to stdout')
+    parser.add_argument('--baseline',  help='a previous --output file to compare with')
+    args = parser.parse_args()
+
+    selected = [s for s in scenarios() if not args.scenario or s.name in args.scenario]
+    unknown  = set(args.scenario or ()) - {s.name for s in selected}
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    db_path = setup_django(args.db, migrate=not args.db)
+    if args.db:
+        from health_app.models import Program
+        from django.db.models import Count
+        programs = list(Program.objects.annotate(n=Count('enrollment')).order_by('-n'))
+    else:
+        programs = seed(patients=args.patients, programs=args.programs,
+                        enrollments_per_patient=1.6, diagnosed_ratio=0.6, dispensed_ratio=0.85)
+
+    if any(s.name == 'dispense' for s in selected):
+        ensure_pending((1 + args.repeat + args.memory_repeat) * DISPENSE_BATCH)
+    ctx     = context(programs)
+    results = {s.name: run(s, ctx, args.repeat, args.memory_repeat) for s in selected}
+    if args.baseline:
+        compare(results, args.baseline)
+
+    output = json.dumps({'environment': environment(args.patients, db_path), 'scenarios': results},
+                        indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.utils.timezone import now
 
-from .models import Patient, Program, Enrollment, Diagnosis, DoctorProfile
+from . import search, services, jobs
+from .models import Patient, Program, Enrollment, Diagnosis, DoctorProfile, Job
+from .pagination import CountedPaginator
+
+DISPENSE_CHUNK = 500   # diagnoses per transaction in the mass-dispense action
 
 # ────────────────────────────────────────────────────────────────────────────────
 # First UNREGISTER the existing User model
@@ -18,9 +23,119 @@ admin.site.register(get_user_model(), UserAdmin)
 @admin.register(DoctorProfile)
 class DoctorProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'program')
+    list_select_related = ('user', 'program')
     search_fields = ('user__username', 'program__name')
 
-admin.site.register(Patient)
-admin.site.register(Program)
-admin.site.register(Enrollment)
-admin.site.register(Diagnosis)
+@admin.register(Program)
+class ProgramAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Large tables: each changelist page costs the same however many rows exist
+# ────────────────────────────────────────────────────────────────────────────────
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables that grow without bound: counts come from
+    CountedPaginator (no full COUNT(*), and no second one for "N total"),
+    the columns read only rows joined by list_select_related, and sorting
+    is limited to indexed columns so ORDER BY … LIMIT stays an index walk.
+    """
+    paginator              = CountedPaginator
+    show_full_result_count = False
+    list_per_page          = 50
+    ordering               = ('-pk',)     # newest first; also orders autocomplete results
+
+class PatientSearchMixin:
+    """Admin search through the patient search index (search.py), not LIKE scans."""
+    patient_path = 'patient'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        patients = search.search_patients(search_term).values('pk')
+        return queryset.filter(**{f'{self.patient_path}__in': patients}), False
+
+@admin.register(Patient)
+class PatientAdmin(LargeTableAdmin):
+    list_display  = ('id', 'name', 'age', 'gender', 'contact')
+    sortable_by   = ('id', 'contact')
+    search_fields = ('name', 'contact')    # required by autocomplete; see get_search_results
+
+    def get_search_results(self, request, queryset, search_term):
+        return search.search_patients(search_term, queryset), False
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(PatientSearchMixin, LargeTableAdmin):
+    list_display        = ('id', 'patient', 'program', 'status', 'enrolled_on')
+    list_select_related = ('patient', 'program')
+    list_filter         = ('program', 'status', 'enrolled_on')   # enroll_program_status_idx, enroll_enrolled_on_idx
+    sortable_by         = ('id', 'enrolled_on')
+    search_fields       = ('patient__name',)
+    autocomplete_fields = ('patient',)
+
+@admin.register(Diagnosis)
+class DiagnosisAdmin(PatientSearchMixin, LargeTableAdmin):
+    patient_path        = 'enrollment__patient'
+    list_display        = ('id', 'patient', 'program', 'created_on', 'created_by', 'dispensed', 'dispensed_on')
+    list_select_related = ('enrollment__patient', 'enrollment__program', 'created_by')
+    list_filter         = ('dispensed', 'created_on', 'enrollment__program')   # partial and created_on indexes
+    sortable_by         = ('id', 'created_on')
+    search_fields       = ('enrollment__patient__name',)
+    raw_id_fields       = ('enrollment', 'created_by', 'dispensed_by')
+    actions             = ('dispense_selected',)
+
+    @admin.display(description='Patient')
+    def patient(self, diagnosis):
+        return diagnosis.enrollment.patient.name
+
+    @admin.display(description='Program')
+    def program(self, diagnosis):
+        return diagnosis.enrollment.program.name
+
+    @admin.action(description='Dispense selected diagnoses')
+    def dispense_selected(self, request, queryset):
+        # services.dispense claims rows atomically and keeps counters, caches
+        # and timelines current; the selection is walked by id in chunks, each
+        # queued as soon as it is read, so "select all" on a huge filtered
+        # list never holds more than one chunk of ids. A selection that fits
+        # in one chunk is dispensed here; larger ones go to background jobs.
+        pending = queryset.filter(dispensed=False).order_by('pk').values_list('pk', flat=True)
+        batch   = list(pending[:DISPENSE_CHUNK])
+        if len(batch) < DISPENSE_CHUNK or not pending.filter(pk__gt=batch[-1]).exists():
+            dispensed = len(services.dispense(batch, request.user)['dispensed'])
+            self.message_user(request, f'Dispensed {dispensed} diagnoses.', messages.SUCCESS)
+            return
+        queued = count = 0
+        while batch:
+            jobs.enqueue('dispense', {'diagnosis_ids': batch, 'user_id': request.user.pk}, user=request.user)
+            queued, count = queued + 1, count + len(batch)
+            batch = list(pending.filter(pk__gt=batch[-1])[:DISPENSE_CHUNK])
+        self.message_user(request, f'Queued {count} diagnoses for dispensing '
+                                   f'in {queued} background jobs.', messages.SUCCESS)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Background jobs: queue depth and latency above the changelist
+# ────────────────────────────────────────────────────────────────────────────────
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display    = ('id', 'name', 'status', 'attempts', 'run_after', 'started_on', 'finished_on', 'worker')
+    list_filter     = ('status',)            # a filter on name would SELECT DISTINCT over the table
+    sortable_by     = ('id',)
+    raw_id_fields   = ('created_by',)
+    readonly_fields = ('name', 'payload', 'key', 'attempts', 'created_on', 'created_by',
+                       'started_on', 'finished_on', 'worker', 'result', 'error')
+    actions         = ('retry_selected',)
+
+    def has_add_permission(self, request):
+        return False                         # jobs come from jobs.enqueue
+
+    def changelist_view(self, request, extra_context=None):
+        return super().changelist_view(request, {**(extra_context or {}), 'queue_stats': jobs.queue_stats()})
+
+    @admin.action(description='Retry selected failed jobs')
+    def retry_selected(self, request, queryset):
+        retried = queryset.filter(status='failed').update(status='queued', attempts=0, run_after=now(),
+                                                          finished_on=None)
+        self.message_user(request, f'Requeued {retried} jobs.', messages.SUCCESS)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class HealthAppConfig(AppConfig):
+    name = 'health_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects receivers)
+        from . import metrics  # noqa: F401  (wraps new DB connections)
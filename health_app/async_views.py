@@ -0,0 +1,130 @@
+"""
+Async versions of the read-mostly role pages, for ASGI deployments.
+
+Same URLs, templates and context as their views.py counterparts; urls.py
+routes to these when settings.HEALTH_ASYNC_VIEWS is on (asgi.py turns it
+on). A page waiting on the database no longer holds a worker: queries go
+through the async ORM, independent ones are awaited together with
+asyncio.gather, and the template is rendered off the event loop because
+the auth and messages context processors load the session lazily.
+
+Django's async ORM still runs one request's queries on that request's
+database thread, so gather() saves the hops between them rather than
+overlapping them; the win is that the event loop keeps serving other
+requests meanwhile.
+"""
+import asyncio
+
+from asgiref.sync                          import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators        import login_required
+from django.core.paginator                 import Paginator
+from django.shortcuts                      import render
+from django.utils.functional               import SimpleLazyObject
+from django.utils.timezone                 import now
+from datetime                              import timedelta
+
+from .roles import doctor_program
+from .views import in_group, history_days, PHARMACY_PAGE_SIZE, OVERVIEW_MODELS
+from . import services, stats, fragments
+
+async def _render(request, template, context):
+    return await sync_to_async(render)(request, template, context)
+
+async def _page(queryset, number):
+    """A Paginator page (count + slice) with its rows already fetched."""
+    def fetch():
+        page = Paginator(queryset, PHARMACY_PAGE_SIZE).get_page(number)
+        page.object_list = list(page.object_list)
+        return page
+    return await sync_to_async(fetch)()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# RECEPTIONIST VIEWS
+# ────────────────────────────────────────────────────────────────────────────────
+
+@login_required
+@in_group('Receptionist')
+async def list_patients(request):
+    """List patients, with optional search (?q=)."""
+    q = request.GET.get('q', '')
+    # the FTS lookup behind search_patients runs raw SQL, so build it in a thread
+    queryset = await sync_to_async(services.search_patients)(q)
+    return await _render(request, 'health_app/patients/list.html', {
+        'patients': [p async for p in queryset],
+        'q':        q,
+    })
+
+@login_required
+@in_group('Receptionist')
+async def list_enrollments(request):
+    """List enrollments, with optional search (?q=) on patient or program name."""
+    q = request.GET.get('q', '')
+    return await _render(request, 'health_app/enrollments/list.html', {
+        'enrollments': [e async for e in services.enrollment_queryset(q)],
+        'q':           q,
+    })
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DOCTOR VIEWS
+# ────────────────────────────────────────────────────────────────────────────────
+
+@login_required
+@in_group('Doctor')
+async def doctor_patients(request):
+    """List patients enrolled in the logged-in doctor's program."""
+    q        = request.GET.get('q', '')
+    program  = await sync_to_async(doctor_program)(request.user)
+    queryset = await sync_to_async(services.program_patients)(program, q)
+    patients = [p async for p in queryset]
+    return await _render(request, 'health_app/doctor/patients.html', {
+        'patients':         patients,
+        'patients_version': await sync_to_async(fragments.stamp_program_patients)(patients),
+        'program':          program,
+        'q':                q,
+    })
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PHARMACIST VIEWS
+# ────────────────────────────────────────────────────────────────────────────────
+
+@login_required
+@in_group('Pharmacist')
+async def pharmacy_queue(request):
+    """Pending queue and dispensed history pages, fetched together."""
+    days = history_days(request)
+    pending, dispensed = await asyncio.gather(
+        _page(services.pending_queue(), request.GET.get('page')),
+        _page(services.dispensed_history(now() - timedelta(days=days)),
+              request.GET.get('dispensed_page')),
+    )
+    return await _render(request, 'health_app/pharmacy/queue.html', {
+        'undispensed_diagnoses': pending,
+        'pending_version':       await sync_to_async(fragments.stamp_diagnoses)(pending),
+        'dispensed_diagnoses':   dispensed,
+        'dispensed_version':     await sync_to_async(fragments.stamp_diagnoses)(dispensed),
+        'days':                  days,
+        'polled_at':             now().isoformat(),
+    })
+
+# ────────────────────────────────────────────────────────────────────────────────
+# STAFF‐ONLY ADMIN OVERVIEW
+# ────────────────────────────────────────────────────────────────────────────────
+
+async def _no_patient():
+    return None
+
+@staff_member_required
+async def admin_overview(request):
+    """Summary fragment version and the optional contact lookup, fetched together."""
+    contact = request.GET.get('contact')
+    version, searched_patient = await asyncio.gather(
+        sync_to_async(fragments.models_version)(*OVERVIEW_MODELS),
+        sync_to_async(services.lookup_patient)(contact) if contact else _no_patient(),
+    )
+    return await _render(request, 'health_app/admin/overview.html', {
+        # read during rendering (in a thread) only if the summary is not cached
+        'overview':         SimpleLazyObject(stats.overview),
+        'overview_version': version,
+        'searched_patient': searched_patient,
+    })
@@ -0,0 +1,42 @@
+"""
+Canonical patient contacts (Patient.contact_normalized).
+
+Phone numbers arrive as '+254 712 345 678', '0712-345678', '254712345678'
+or '00254712345678'. All of them are stored as '254712345678', which is
+unique across patients and is what the contact lookups match on.
+A leading trunk '0' is replaced by settings.HEALTH_CONTACT_COUNTRY_CODE.
+The '00' international prefix is dropped. Other digit strings are kept as they are.
+
+Only phone-shaped values (digits, spaces, '+', '-', '.', '/' and
+parentheses) are reduced to digits. Email addresses are kept whole and
+lower-cased, so 'jane85@gmail.com' and 'bob85@yahoo.com' stay distinct.
+Anything else has no canonical form.
+
+The search index (search.py) stores contacts in this form too, so a typed
+number is found if its canonical form is a substring of the stored one:
+'0712 345' or '712-345' finds '+254 712 345 678', but '0345' does not.
+"""
+import re
+
+from django.conf import settings
+
+TRUNK_PREFIX         = '0'
+INTERNATIONAL_PREFIX = '00'
+PHONE                = re.compile(r'\+?[\d\s().\-/]+')
+EMAIL                = re.compile(r'[^@\s]+@[^@\s]+')
+
+def normalize_contact(value):
+    """The canonical form of a contact, or None if it has none."""
+    value = (value or '').strip()
+    if EMAIL.fullmatch(value):
+        return value.lower()
+    if not PHONE.fullmatch(value):
+        return None
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return None
+    if digits.startswith(INTERNATIONAL_PREFIX):
+        return digits[len(INTERNATIONAL_PREFIX):] or None
+    if digits.startswith(TRUNK_PREFIX):
+        return getattr(settings, 'HEALTH_CONTACT_COUNTRY_CODE', '254') + digits[len(TRUNK_PREFIX):]
+    return digits
@@ -0,0 +1,160 @@
+"""
+Full extracts of clinical data for auditors and program managers.
+
+    enrollments   one row per enrollment, with its patient and program
+    diagnoses     one row per diagnosis, with enrollment, patient, program,
+                  doctor and, once dispensed, the pharmacist
+    dispensed     dispense history: dispensed diagnoses by dispensed_on
+
+Each dataset is one joined .values_list() query read through
+.iterator(chunk_size=CHUNK_SIZE) (a server-side cursor on PostgreSQL), in
+date column order so the range filter and the sort use the same index.
+Rows are written as they arrive: CSV a chunk of lines at a time, Parquet
+(when pyarrow is installed) one row group per chunk. Memory stays flat
+however large the tables are.
+
+    rows = export_rows('diagnoses', program_id=3, start=date(2024, 1, 1), end=date(2024, 3, 31))
+    for text in write_csv('diagnoses', rows): …
+
+start/end are inclusive dates on the dataset's date column (enrolled_on,
+created_on, dispensed_on). `manage.py export_data` writes a file;
+GET /api/exports/<dataset>.<csv|parquet> downloads one (staff only).
+"""
+import csv
+import datetime
+from itertools import islice
+
+from django.utils.timezone import make_aware
+
+from .models import Enrollment, Diagnosis
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:     # Parquet is optional: pip install pyarrow
+    pyarrow = None
+
+CHUNK_SIZE = 2000
+FORMATS    = ('csv', 'parquet')
+
+_PATIENT = [
+    ('patient_id',     'enrollment__patient_id',     'int'),
+    ('patient_name',   'enrollment__patient__name',  'str'),
+    ('program_id',     'enrollment__program_id',     'int'),
+    ('program',        'enrollment__program__name',  'str'),
+]
+
+# dataset → (queryset, date column, [(header, lookup, type), …])
+DATASETS = {
+    'enrollments': (Enrollment.objects.all(), 'enrolled_on', [
+        ('enrollment_id',  'id',                'int'),
+        ('patient_id',     'patient_id',        'int'),
+        ('patient_name',   'patient__name',     'str'),
+        ('patient_age',    'patient__age',      'int'),
+        ('patient_gender', 'patient__gender',   'str'),
+        ('program_id',     'program_id',        'int'),
+        ('program',        'program__name',     'str'),
+        ('status',         'status',            'str'),
+        ('enrolled_on',    'enrolled_on',       'date'),
+    ]),
+    'diagnoses': (Diagnosis.objects.all(), 'created_on', [
+        ('diagnosis_id',   'id',                'int'),
+        ('enrollment_id',  'enrollment_id',     'int'),
+        *_PATIENT,
+        ('diagnosis',      'diagnosis',         'str'),
+        ('recommendations', 'recommendations',  'str'),
+        ('created_on',     'created_on',        'datetime'),
+        ('created_by',     'created_by__username', 'str'),
+        ('dispensed',      'dispensed',         'bool'),
+        ('dispensed_on',   'dispensed_on',      'datetime'),
+        ('dispensed_by',   'dispensed_by__username', 'str'),
+    ]),
+    'dispensed': (Diagnosis.objects.filter(dispensed=True), 'dispensed_on', [
+        ('diagnosis_id',   'id',                'int'),
+        ('enrollment_id',  'enrollment_id',     'int'),
+        *_PATIENT,
+        ('dispensed_on',   'dispensed_on',      'datetime'),
+        ('dispensed_by',   'dispensed_by__username', 'str'),
+        ('created_on',     'created_on',        'datetime'),
+        ('created_by',     'created_by__username', 'str'),
+    ]),
+}
+
+def headers(dataset):
+    return [header for header, _, _ in DATASETS[dataset][2]]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# READING
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _bound(queryset, field, day):
+    # date bounds become local midnights on the datetime columns
+    if queryset.model._meta.get_field(field).get_internal_type() == 'DateTimeField':
+        return make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return day
+
+def export_rows(dataset, program_id=None, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Row tuples (in headers() order) of `dataset`, filtered, oldest first."""
+    queryset, field, columns = DATASETS[dataset]
+    program_path = 'program_id' if queryset.model is Enrollment else 'enrollment__program_id'
+    if program_id is not None:
+        queryset = queryset.filter(**{program_path: program_id})
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': _bound(queryset, field, start)})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': _bound(queryset, field, end + datetime.timedelta(days=1))})
+    return queryset.order_by(field, 'pk').values_list(*[lookup for _, lookup, _ in columns]) \
+        .iterator(chunk_size=chunk_size)
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+# ────────────────────────────────────────────────────────────────────────────────
+# WRITING
+# ────────────────────────────────────────────────────────────────────────────────
+
+class _Lines:
+    """File-like that hands back what csv.writer writes to it."""
+    def write(self, text):
+        return text
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+def write_csv(dataset, rows, chunk_size=CHUNK_SIZE):
+    """Yield the CSV text of `rows`, header first, a chunk of lines at a time."""
+    writer = csv.writer(_Lines())
+    yield writer.writerow(headers(dataset))
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(writer.writerow([_cell(v) for v in row]) for row in chunk)
+
+def parquet_available():
+    return pyarrow is not None
+
+def _arrow_schema(dataset):
+    types = {
+        'int':      pyarrow.int64(),
+        'str':      pyarrow.string(),
+        'bool':     pyarrow.bool_(),
+        'date':     pyarrow.date32(),
+        'datetime': pyarrow.timestamp('us', tz='UTC'),
+    }
+    return pyarrow.schema([(header, types[kind]) for header, _, kind in DATASETS[dataset][2]])
+
+def write_parquet(dataset, rows, out, chunk_size=CHUNK_SIZE):
+    """
+    Write `rows` to `out` (a path or binary file) as Parquet, one row
+    group per chunk. Returns the number of rows written.
+    """
+    if pyarrow is None:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow).')
+    schema, written = _arrow_schema(dataset), 0
+    with pyarrow.parquet.ParquetWriter(out, schema) as writer:
+        for chunk in _chunks(rows, chunk_size):
+            columns = [pyarrow.array(values, type=field.type)
+                       for values, field in zip(zip(*chunk), schema)]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            written += len(chunk)
+    return written
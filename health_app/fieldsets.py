@@ -0,0 +1,206 @@
+"""
+Sparse fieldsets (?fields=, ?expand=) and a fast list path for the API.
+
+    /api/patients/?fields=id,name              only those keys, no nesting
+    /api/enrollments/?expand=program,patient   related ids → nested objects
+    /api/patients/?expand=enrollments.program  dotted: expand inside a nested list
+
+Lists (and ?stream= lists) skip model instances: ValuesPlan reads the
+requested columns with .values(), fetches each nested relation with one
+more query for the whole page, and formats values with the serializer's
+own field objects, so the output is identical to the serializer's. Fields
+it cannot plan (e.g. a SerializerMethodField without a `values_sources`
+column) fall back to the regular serializer.
+"""
+from itertools import islice
+
+from django.db.models          import F
+from rest_framework            import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response   import Response
+
+from .pagination import STREAM_CONTENT_TYPES
+
+def _names(value):
+    return [n.strip() for n in value.split(',') if n.strip()] if value else []
+
+# ────────────────────────────────────────────────────────────────────────────────
+# SERIALIZER MIXIN
+# ────────────────────────────────────────────────────────────────────────────────
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin: `fields=[...]` keeps only those fields, `expand=[...]`
+    replaces a relation with the nested serializer from `expandable`
+    (name → factory taking expand=) or passes dotted names to a nested one.
+    """
+    expandable     = {}
+    # fast path: SerializerMethodField name → annotated column holding its value
+    values_sources = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        nested = {}
+        for name in expand:
+            head, _, tail = name.partition('.')
+            nested.setdefault(head, set()).update([tail] if tail else [])
+        for head, tails in nested.items():
+            if head in self.expandable:
+                self.fields[head] = self.expandable[head](expand=tails)
+            elif isinstance(self.fields.get(head), serializers.ListSerializer) and tails:
+                child = self.fields[head].child
+                self.fields[head] = type(child)(many=True, read_only=True, expand=tails)
+            elif isinstance(self.fields.get(head), serializers.BaseSerializer) and tails:
+                self.fields[head] = type(self.fields[head])(read_only=True, expand=tails)
+            else:
+                raise ValidationError({'expand': [f'Cannot expand {name!r}.']})
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}."]})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def values_queryset(cls):
+        """Base queryset for this serializer's rows when nested in a fast list."""
+        return cls.Meta.model._default_manager.all()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# .values() PLAN
+# ────────────────────────────────────────────────────────────────────────────────
+
+# exact field types whose to_representation() is the identity on DB values
+_VERBATIM = (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+             serializers.ChoiceField, serializers.PrimaryKeyRelatedField)
+
+class ValuesPlan:
+    """
+    How to produce a serializer's output from .values() rows; build with
+    ValuesPlan.of(serializer), which returns None if some field can't be.
+    """
+
+    def __init__(self, serializer):
+        self.model   = serializer.Meta.model
+        self.pk      = self.model._meta.pk.attname
+        self.base    = serializer.values_queryset
+        self.columns = {self.pk: F(self.pk)}   # values() alias → expression
+        self.output  = []                      # (name, alias, format | None)
+        self.nested  = []                      # (name, plan, link alias, reverse fk | None, many)
+
+    @classmethod
+    def of(cls, serializer):
+        plan = cls(serializer)
+        for name, field in serializer.fields.items():
+            if not plan._add(name, field, serializer):
+                return None
+        return plan
+
+    def _add(self, name, field, serializer):
+        alias = f'_{name}'
+        if isinstance(field, serializers.ListSerializer):
+            child = ValuesPlan.of(field.child) if isinstance(field.child, SparseFieldsMixin) else None
+            relation = self.model._meta.get_field(field.source) if child else None
+            if relation is None or not relation.one_to_many:
+                return False
+            self.nested.append((name, child, self.pk, relation.field.name, True))
+            return True
+        if isinstance(field, serializers.BaseSerializer):
+            child = ValuesPlan.of(field) if isinstance(field, SparseFieldsMixin) else None
+            if child is None:
+                return False
+            self.columns[alias] = F(field.source)
+            self.nested.append((name, child, alias, None, False))
+            return True
+        if isinstance(field, serializers.SerializerMethodField):
+            source = serializer.values_sources.get(name)
+            if source is None:
+                return False
+            self.columns[alias] = F(source)
+            self.output.append((name, alias, None))
+            return True
+        if '.' in field.source or field.source == '*':
+            return False
+        self.columns[alias] = F(field.source)
+        self.output.append((name, alias, None if type(field) in _VERBATIM else field.to_representation))
+        return True
+
+    def values(self, queryset, **extra):
+        """The .values() queryset to read; rows keep the pk under its own name."""
+        columns = {alias: expr for alias, expr in self.columns.items() if alias != self.pk}
+        return queryset.prefetch_related(None).values(self.pk, **columns, **extra)
+
+    def rows(self, rows):
+        """Serialized dicts for a list of values() rows (one query per nested relation)."""
+        rows = list(rows)
+        for name, child, link, reverse_fk, many in self.nested:
+            keys = {row[link] for row in rows if row[link] is not None}
+            if many:
+                items = list(child.values(child.base().filter(**{f'{reverse_fk}__in': keys}).order_by('pk'),
+                                          _parent=F(reverse_fk)))
+                found = {}
+                for item, rendered in zip(items, child.rows(items)):
+                    found.setdefault(item['_parent'], []).append(rendered)
+                for row in rows:
+                    row[name] = found.get(row[link], [])
+            else:
+                items = list(child.values(child.base().filter(pk__in=keys)))
+                found = {item[child.pk]: rendered for item, rendered in zip(items, child.rows(items))}
+                for row in rows:
+                    row[name] = found.get(row[link])
+        return [self._render(row) for row in rows]
+
+    def _render(self, row):
+        out = {}
+        for name, alias, fmt in self.output:
+            value = row[alias]
+            out[name] = fmt(value) if fmt is not None and value is not None else value
+        for name, *_ in self.nested:
+            out[name] = row[name]
+        return out
+
+# ────────────────────────────────────────────────────────────────────────────────
+# VIEWSET MIXIN
+# ────────────────────────────────────────────────────────────────────────────────
+
+class SparseFieldsViewMixin:
+    """
+    Passes ?fields= / ?expand= to the serializer on reads, and serves list
+    pages and streams from a ValuesPlan when the serializer allows it. Goes
+    after CachedResponseMixin (the cache key includes the query string) and
+    before StreamingListMixin, whose stream_rows it replaces.
+    """
+
+    def fieldset(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return {}
+        params = self.request.query_params
+        fields = _names(params.get('fields'))
+        return {'fields': fields or None, 'expand': _names(params.get('expand'))}
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **{**self.fieldset(), **kwargs})
+
+    def values_plan(self):
+        return ValuesPlan.of(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        streamed = request.query_params.get('stream') in STREAM_CONTENT_TYPES
+        plan     = None if streamed else self.values_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        values = plan.values(self.filter_queryset(self.get_queryset()))
+        page   = self.paginate_queryset(values)
+        if page is not None:
+            return self.get_paginated_response(plan.rows(page))
+        return Response(plan.rows(values))
+
+    def stream_rows(self, queryset):
+        plan = self.values_plan()
+        if plan is None:
+            yield from super().stream_rows(queryset)
+            return
+        rows = plan.values(queryset).iterator(chunk_size=self.stream_chunk_size)
+        while chunk := list(islice(rows, self.stream_chunk_size)):
+            yield from plan.rows(chunk)
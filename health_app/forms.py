@@ -1,9 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
-import requests
 from .models import Patient, Enrollment, Diagnosis
-
-API = 'http://127.0.0.1:8000/api'
+from .contacts import normalize_contact
+from . import services
 
 class PatientForm(forms.Form):
     name    = forms.CharField(max_length=100)
@@ -13,27 +12,32 @@ class PatientForm(forms.Form):
 
     def clean_contact(self):
         contact = self.cleaned_data['contact']
-        if Patient.objects.filter(contact=contact).exists():
+        key     = normalize_contact(contact)
+        if Patient.objects.filter(contact=contact).exists() or \
+                (key and Patient.objects.filter(contact_normalized=key).exists()):
             raise ValidationError('Patient with this contact already exists.')
         return contact  
 
 
 
 class EnrollmentForm(forms.Form):
-    patient       = forms.ChoiceField(choices=[])
+    # Search-as-you-type: the template fills a <datalist> from
+    # /api/patients/?search= instead of shipping every patient.
+    patient       = forms.IntegerField(widget=forms.TextInput(attrs={
+                        'list': 'patient-options', 'autocomplete': 'off',
+                        'placeholder': 'Type a name or contact…'}))
     program       = forms.ChoiceField(choices=[])
     date_enrolled = forms.DateField(widget=forms.DateInput(attrs={'type':'date'}))
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Load patients
-        r = requests.get(f"{API}/patients/")
-        if r.ok:
-            self.fields['patient'].choices = [(p['id'], p['name']) for p in r.json()]
-        # Load programs
-        r2 = requests.get(f"{API}/programs/")
-        if r2.ok:
-            self.fields['program'].choices = [(p['id'], p['name']) for p in r2.json()]
+        # in-process (services.py), from the shared cache when possible
+        self.fields['program'].choices = services.program_choices()
+
+    def clean_patient(self):
+        if not Patient.objects.filter(pk=self.cleaned_data['patient']).exists():
+            raise ValidationError('Select an existing patient.')
+        return self.cleaned_data['patient']
 
 class DiagnosisForm(forms.Form):
     enrollment      = forms.ChoiceField(choices=[])
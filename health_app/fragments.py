@@ -0,0 +1,133 @@
+"""
+Template fragment cache for the role pages, keyed on object versions.
+
+Every Patient, Program, Enrollment and Diagnosis has a version token in
+the response cache (response_cache.CACHE_ALIAS, shared by all workers).
+signals.py bumps an object's token on save/delete and the bulk paths that
+skip signals (services.dispense) bump theirs by hand. Tokens are created
+on first read.
+
+Before rendering, a view stamps each row with `fragment_version` (the ids and
+tokens of everything the row displays) and gets a section version that
+combines its rows. The template then wraps the section and each row in
+`{% fragment name version %}` (templatetags/fragment_cache.py):
+
+    section hit   one cache read for the whole table
+    row hit       unchanged rows are served from cache, changed ones re-rendered
+
+A changed object gets a new token, so its old fragments are never read again
+and expire after FRAGMENT_TTL. No fragment is ever deleted. Sections that
+summarize whole tables, like the admin overview, use the model versions from
+response_cache instead. settings.HEALTH_FRAGMENT_CACHE = False turns it
+all off: versions come back None and every fragment renders normally.
+"""
+import hashlib
+import uuid
+
+from django.conf        import settings
+from django.core.cache  import caches
+from django.db          import transaction
+from django.utils       import timezone, translation
+
+from .models import Patient, Program, Enrollment, Diagnosis
+from . import response_cache
+
+FRAGMENT_TTL = 3600
+
+def enabled():
+    return getattr(settings, 'HEALTH_FRAGMENT_CACHE', True)
+
+def _cache():
+    return caches[response_cache.CACHE_ALIAS]
+
+def _version_key(model, pk):
+    return f'health_app:object_version:{model._meta.label_lower}:{pk}'
+
+# ────────────────────────────────────────────────────────────────────────────────
+# OBJECT VERSIONS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _new_versions(keys):
+    _cache().set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+def bump(model, pks):
+    """New version tokens for these objects (again on commit, as in response_cache.bump)."""
+    keys = [_version_key(model, pk) for pk in pks]
+    if keys:
+        _new_versions(keys)
+        transaction.on_commit(lambda: _new_versions(keys))
+
+def versions(objects):
+    """{(model, pk): token} for [(model, pk), …], creating missing tokens."""
+    keys   = {obj: _version_key(*obj) for obj in objects}
+    found  = _cache().get_many(list(set(keys.values())))
+    absent = {key: uuid.uuid4().hex for key in keys.values() if key not in found}
+    if absent:
+        # add() keeps a token another request created meanwhile
+        for key, token in absent.items():
+            if not _cache().add(key, token, None):
+                token = _cache().get(key, token)
+            found[key] = token
+    return {obj: found[key] for obj, key in keys.items()}
+
+def _digest(*parts):
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+
+def _stamp(rows, depends_on):
+    """
+    Set row.fragment_version from depends_on(row) → [(model, pk), …] and
+    return the section version, or None with fragment caching off.
+    """
+    rows = list(rows)
+    if not enabled():
+        for row in rows:
+            row.fragment_version = None
+        return None
+    deps   = [depends_on(row) for row in rows]
+    tokens = versions({obj for row_deps in deps for obj in row_deps if obj[1] is not None})
+    for row, row_deps in zip(rows, deps):
+        row.fragment_version = _digest(*(f'{model._meta.model_name}:{pk}:{tokens.get((model, pk))}'
+                                         for model, pk in row_deps))
+    return _digest(*(row.fragment_version for row in rows))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PAGES
+# ────────────────────────────────────────────────────────────────────────────────
+
+def stamp_diagnoses(diagnoses):
+    """Pharmacy queue rows: the diagnosis, its patient and its program."""
+    return _stamp(diagnoses, lambda d: [(Diagnosis, d.pk), (Patient, d.enrollment.patient_id),
+                                        (Program, d.enrollment.program_id)])
+
+def stamp_program_patients(patients):
+    """Doctor patient rows: the patient, plus the enrollment the Diagnose link opens."""
+    def depends_on(patient):
+        first = patient.enrollments.all()[:1]     # prefetched by services.program_patients
+        return [(Patient, patient.pk), (Enrollment, first[0].pk if first else None)]
+    return _stamp(patients, depends_on)
+
+def models_version(*models):
+    """One version for sections that summarize whole tables, or None."""
+    if not enabled():
+        return None
+    return _digest(*(token for token, _ in response_cache.versions(models)))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# FRAGMENTS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def fragment_key(name, version):
+    # rendered dates and text depend on the active time zone and language
+    return (f'health_app:fragment:{name}:'
+            f'{_digest(version, timezone.get_current_timezone_name(), translation.get_language())}')
+
+def cached(name, version, render):
+    """render()'s output, cached under (name, version); version None skips the cache."""
+    if version is None:
+        return render()
+    key  = fragment_key(name, version)
+    html = _cache().get(key)
+    if html is None:
+        html = render()
+        _cache().set(key, html, FRAGMENT_TTL)
+    return html
@@ -0,0 +1,262 @@
+"""
+Streaming bulk import of patients and enrollments.
+
+Rows are read lazily from CSV or NDJSON and handled in chunks. Each chunk is
+validated row by row with the import serializers. References and duplicates
+are resolved with one set-based query per chunk, and the valid rows are
+inserted with bulk_create in one transaction (which skips model signals,
+so the counters, the search index, the response cache and fragment
+versions and the patient timelines are updated here), so memory and query
+counts grow with the chunk size, not the file size.
+
+    report = import_patients(read_rows(open('patients.csv', newline=''), 'csv'))
+
+The report counts rows, created and failed and lists per-row errors,
+capped at MAX_REPORTED_ERRORS. Row numbers are 1-based data rows.
+
+An upload queued for a background import is written to upload storage
+(settings.HEALTH_UPLOAD_DIR) as it arrives; the job keeps only its name.
+
+An import can be resumed: checkpoint(report) is called inside each chunk's
+transaction with the report so far, and a later call given that report as
+`resume` skips the rows it covers and carries its counts on. The
+background import jobs (jobs.py) keep it on the job, so a retried or
+requeued job never inserts a chunk twice.
+"""
+import codecs
+import csv
+import json
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions  import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .contacts    import normalize_contact
+from .models      import Program, Patient, Enrollment
+from .serializers import PatientImportSerializer, EnrollmentImportSerializer
+from . import stats, search, response_cache, timeline, fragments, reports
+
+DEFAULT_CHUNK_SIZE  = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS             = ('csv', 'ndjson')
+
+# ────────────────────────────────────────────────────────────────────────────────
+# READERS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def read_rows(lines, fmt):
+    """
+    Yield (row number, dict) from an iterable of text or byte lines. A line
+    that is not valid NDJSON yields (row number, None) so it is reported
+    rather than aborting the import.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    if isinstance(first, bytes):
+        lines = codecs.iterdecode(lines, 'utf-8')
+        first = first.decode('utf-8-sig')
+    else:
+        first = first.lstrip('﻿')
+
+    def all_lines():
+        yield first
+        yield from lines
+
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(all_lines()), 1):
+            yield number, {k: v for k, v in row.items() if v not in (None, '')}
+    elif fmt == 'ndjson':
+        number = 0
+        for line in all_lines():
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unknown format {fmt!r}; expected one of {FORMATS}.')
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+# ────────────────────────────────────────────────────────────────────────────────
+# STORED UPLOADS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _storage():
+    return FileSystemStorage(location=settings.HEALTH_UPLOAD_DIR)
+
+def store_upload(content, fmt):
+    """Save `content` (a django File, written chunk by chunk) for a later import; returns its name."""
+    return _storage().save(f'{uuid.uuid4().hex}.{fmt}', content)
+
+def open_upload(name):
+    """A stored upload, opened for read_rows() (iterating it yields byte lines)."""
+    return _storage().open(name, 'rb')
+
+def delete_upload(name):
+    _storage().delete(name)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# IMPORT
+# ────────────────────────────────────────────────────────────────────────────────
+
+class _Report:
+    def __init__(self, resume=None):
+        resume = resume or {}
+        self.rows    = resume.get('rows', 0)
+        self.created = resume.get('created', 0)
+        self.failed  = resume.get('failed', 0)
+        self.errors  = list(resume.get('errors', []))
+
+    def error(self, number, detail):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': detail})
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created,
+                'failed': self.failed, 'errors': self.errors}
+
+def _validate(chunk, serializer_class, report):
+    # One serializer instance validates every row (as ListSerializer does),
+    # so its fields are built once per chunk rather than once per row.
+    validator, valid = serializer_class(), []
+    for number, row in chunk:
+        report.rows += 1
+        if row is None:
+            report.error(number, {'non_field_errors': ['Not a JSON object.']})
+            continue
+        try:
+            valid.append((number, validator.run_validation(row)))
+        except ValidationError as exc:
+            report.error(number, as_serializer_error(exc))
+    return valid
+
+DUPLICATE_CONTACT = 'Patient with this contact already exists.'
+
+def _new_patients(valid):
+    """
+    Split validated rows into (row number, Patient) pairs and duplicate-contact
+    row numbers. Earlier chunks are committed, so the lookup finds their
+    contacts; only this chunk's own rows are tracked here.
+    """
+    keys     = {number: normalize_contact(d['contact']) for number, d in valid}
+    existing = set(Patient.objects.filter(contact__in=[d['contact'] for _, d in valid])
+                   .values_list('contact', flat=True))
+    existing |= set(Patient.objects.filter(contact_normalized__in=[k for k in keys.values() if k])
+                    .values_list('contact_normalized', flat=True))
+    taken, new, duplicates = existing, [], []
+    for number, data in valid:
+        key = keys[number]
+        if data['contact'] in taken or key in taken:
+            duplicates.append(number)
+        else:
+            taken.update({data['contact'], key} - {None})
+            new.append((number, Patient(**data, contact_normalized=key)))   # bulk_create skips save()
+    return new, duplicates
+
+def _insert_patients(patients):
+    Patient.objects.bulk_create(patients)
+    stats.bump({'patients': len(patients)})
+    search.index_patients(patients)
+    response_cache.bump(Patient)
+    fragments.bump(Patient, [p.pk for p in patients])
+    timeline.add_patients(patients)
+
+def _save_each(new):
+    """Save (row number, Patient) pairs one by one; returns the saved ones and the clashing row numbers."""
+    saved, clashes = [], []
+    for number, patient in new:
+        patient.pk = None
+        try:
+            with transaction.atomic():
+                patient.save(force_insert=True)     # signals.py keeps the derived state
+        except IntegrityError:
+            clashes.append(number)
+        else:
+            saved.append((number, patient))
+    return saved, clashes
+
+def import_patients(rows, chunk_size=DEFAULT_CHUNK_SIZE, resume=None, checkpoint=None):
+    """Import patient rows; duplicates of existing or earlier contacts fail."""
+    report = _Report(resume)
+    for chunk in _chunks(islice(rows, report.rows, None), chunk_size):
+        valid = _validate(chunk, PatientImportSerializer, report)
+        new, duplicates = _new_patients(valid)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    _insert_patients([p for _, p in new])
+            except IntegrityError:
+                # A concurrent writer took some contacts after the lookup:
+                # insert row by row and report the rows that clash.
+                new, clashes = _save_each(new)
+                duplicates = sorted(duplicates + clashes)
+            report.created += len(new)
+            for number in duplicates:
+                report.error(number, {'contact': [DUPLICATE_CONTACT]})
+            if checkpoint is not None:
+                checkpoint(report.as_dict())
+    return report.as_dict()
+
+def import_enrollments(rows, chunk_size=DEFAULT_CHUNK_SIZE, resume=None, checkpoint=None):
+    """Import enrollment rows referencing patients (id/contact) and programs (id/name)."""
+    report = _Report(resume)
+    for chunk in _chunks(islice(rows, report.rows, None), chunk_size):
+        valid = _validate(chunk, EnrollmentImportSerializer, report)
+
+        patient_ids = set(Patient.objects.filter(id__in=[d['patient'] for _, d in valid if 'patient' in d])
+                          .values_list('id', flat=True))
+        by_contact  = dict(Patient.objects.filter(contact_normalized__in=[
+                               normalize_contact(d['contact']) for _, d in valid if 'contact' in d])
+                           .values_list('contact_normalized', 'id'))
+        programs    = Program.objects.filter(id__in=[d['program'] for _, d in valid if 'program' in d]) \
+                      | Program.objects.filter(name__in=[d['program_name'] for _, d in valid if 'program_name' in d])
+        program_ids = {}
+        for pid, name in programs.values_list('id', 'name'):
+            program_ids[pid] = program_ids[name] = pid
+
+        new, deltas = [], {}
+        for number, data in valid:
+            patient_id = data['patient'] if 'patient' in data else by_contact.get(normalize_contact(data['contact']))
+            program_id = program_ids.get(data['program'] if 'program' in data else data['program_name'])
+            if patient_id is None or ('patient' in data and patient_id not in patient_ids):
+                report.error(number, {'patient': ['Unknown patient.']})
+            elif program_id is None:
+                report.error(number, {'program': ['Unknown program.']})
+            else:
+                dated = {'enrolled_on': data['enrolled_on']} if 'enrolled_on' in data else {}
+                new.append(Enrollment(patient_id=patient_id, program_id=program_id, status=data['status'],
+                                      **dated))
+                key = stats.program_key(program_id)
+                deltas[key] = deltas.get(key, 0) + 1
+
+        with transaction.atomic():
+            new = Enrollment.objects.bulk_create(new)
+            stats.bump({'enrollments': len(new), **deltas})
+            response_cache.bump(Enrollment, Patient)
+            fragments.bump(Enrollment, [e.pk for e in new])
+            timeline.refresh(e.patient_id for e in new)
+            reports.add_backdated('enrollments', [(e.enrolled_on, e.program_id) for e in new])
+            # counted once inserted; a chunk that fails is counted by the rerun that inserts it
+            report.created += len(new)
+            if checkpoint is not None:
+                checkpoint(report.as_dict())
+    return report.as_dict()
+
+IMPORTERS = {
+    'patients':    import_patients,
+    'enrollments': import_enrollments,
+}
@@ -0,0 +1,252 @@
+"""
+Background jobs, kept in the Job table and run by `manage.py run_jobs`.
+
+A request handler enqueues the slow part of its work and returns at once;
+a worker picks the job up and calls the task registered under its name
+with the job's payload as keyword arguments:
+
+    @task('import_patients')
+    def import_patients(upload, fmt): …
+
+    job = enqueue('import_patients', {'upload': name, 'fmt': 'csv'}, key=…, user=request.user)
+
+enqueue() inserts in the caller's transaction, so a rolled-back write
+leaves no job behind and a worker never sees a job before its data. A key
+makes the enqueue idempotent: a second enqueue with the same key returns
+the first job instead of queueing another (a retried upload is imported
+once, and its client can poll the one job).
+
+Workers claim a job with a conditional `UPDATE … WHERE status = 'queued'`,
+as services.dispense claims diagnoses, so of any number of workers in any
+number of processes exactly one runs it. A failed run is retried after an
+exponential backoff with jitter until max_attempts, then marked failed
+with its traceback. A job running longer than settings.HEALTH_JOB_TIMEOUT
+is taken to have lost its worker and is requeued. Either way a task can
+run more than once, so tasks must be safe to repeat — or, like the
+imports, resumable: a task registered with bind=True is passed its Job,
+and checkpoint(job, progress) stores progress on it inside the task's own
+transaction, so a rerun starts from the last committed checkpoint. A
+worker whose job was requeued meanwhile gets LeaseLost from checkpoint()
+and its uncommitted work is rolled back.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf                 import settings
+from django.contrib.auth         import get_user_model
+from django.db                   import IntegrityError, close_old_connections, connection, transaction
+from django.db.models            import Avg, Count, F, Min
+from django.utils.timezone       import now
+
+from .models import Job
+from . import importer, services
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ATTEMPTS = 5
+BACKOFF_BASE     = 10       # seconds before the first retry, doubled for each later one
+BACKOFF_MAX      = 3600
+CLAIM_SCAN       = 20       # due jobs tried per claim before giving up to the other workers
+STATS_WINDOW     = timedelta(hours=1)
+
+TASKS = {}
+
+def task(name, max_attempts=DEFAULT_ATTEMPTS, bind=False):
+    """
+    Register the decorated function as the task run for jobs named `name`;
+    with bind=True it is also passed the Job as `job`.
+    """
+    def register(func):
+        TASKS[name] = (func, max_attempts, bind)
+        return func
+    return register
+
+class LeaseLost(Exception):
+    """The job was requeued or reclaimed while this worker was running it."""
+
+# ────────────────────────────────────────────────────────────────────────────────
+# QUEUEING
+# ────────────────────────────────────────────────────────────────────────────────
+
+def enqueue(name, payload=None, key=None, user=None, delay=0):
+    """
+    Queue a run of task `name` with the JSON-serializable keyword
+    arguments `payload`, due in `delay` seconds. Returns the Job; with a
+    key already used, the job queued under it.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Unknown task {name!r}.')
+    fields = {
+        'name':         name,
+        'payload':      payload or {},
+        'max_attempts': TASKS[name][1],
+        'run_after':    now() + timedelta(seconds=delay),
+        'created_by':   user if user is not None and user.is_authenticated else None,
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(key=key, **fields)
+    except IntegrityError:
+        return Job.objects.get(key=key)
+
+def backoff(attempt):
+    """Delay before retrying a job whose `attempt`-th run failed."""
+    delay = min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# RUNNING
+# ────────────────────────────────────────────────────────────────────────────────
+
+def worker_name():
+    """host:pid:thread, recorded on the jobs this thread claims."""
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'[:100]
+
+def claim(worker):
+    """The next due job, marked running for `worker`; None if nothing is due."""
+    stamp = now()
+    due   = Job.objects.filter(status='queued', run_after__lte=stamp) \
+        .order_by('run_after', 'pk').values_list('pk', flat=True)
+    for pk in due[:CLAIM_SCAN]:
+        if Job.objects.filter(pk=pk, status='queued').update(
+                status='running', started_on=stamp, worker=worker, attempts=F('attempts') + 1):
+            return Job.objects.get(pk=pk)
+    return None
+
+def _leased(job):
+    return Job.objects.filter(pk=job.pk, status='running', started_on=job.started_on)
+
+def checkpoint(job, progress):
+    """
+    Store `progress` as the result of running `job`, in the caller's
+    transaction; raise LeaseLost if the job is no longer this worker's.
+    """
+    if not _leased(job).update(result=progress):
+        raise LeaseLost(f'Job #{job.pk} was requeued or reclaimed meanwhile.')
+    job.result = progress
+
+def run(job):
+    """Run a claimed job and record the outcome: done, queued for a retry, or failed."""
+    func, _, bind = TASKS.get(job.name, (None, None, False))
+    try:
+        if func is None:
+            raise LookupError(f'No task is registered as {job.name!r}.')
+        result = func(job=job, **job.payload) if bind else func(**job.payload)
+    except Exception:
+        logger.exception('Job #%s (%s) failed on attempt %s of %s.',
+                         job.pk, job.name, job.attempts, job.max_attempts)
+        if job.attempts < job.max_attempts:
+            outcome = {'status': 'queued', 'run_after': now() + backoff(job.attempts)}
+        else:
+            outcome = {'status': 'failed', 'finished_on': now()}
+        outcome['error'] = traceback.format_exc()
+    else:
+        outcome = {'status': 'done', 'finished_on': now(), 'result': result, 'error': ''}
+    # unless the lease expired meanwhile and the job was requeued or reclaimed
+    _leased(job).update(**outcome)
+
+def requeue_stale():
+    """
+    Requeue jobs running for longer than HEALTH_JOB_TIMEOUT (or fail
+    them, if that was their last attempt). Returns how many there were.
+    """
+    stamp = now()
+    stale = Job.objects.filter(status='running',
+                               started_on__lt=stamp - timedelta(seconds=settings.HEALTH_JOB_TIMEOUT))
+    error = f'Still running after {settings.HEALTH_JOB_TIMEOUT}s; the worker was presumed lost.'
+    failed = stale.filter(attempts__gte=F('max_attempts')) \
+        .update(status='failed', finished_on=stamp, error=error)
+    return failed + stale.update(status='queued', run_after=stamp, error=error)
+
+def work(stop, poll=1.0, drain=False):
+    """
+    Claim and run jobs until `stop` (a threading.Event) is set, waiting
+    `poll` seconds whenever nothing is due; with drain=True, return as
+    soon as nothing is due instead. Returns the number of jobs run.
+    """
+    worker, done = worker_name(), 0
+    while not stop.is_set():
+        # as between requests: honour CONN_MAX_AGE and drop broken connections
+        # (not when called inside a transaction, e.g. a test's)
+        if not connection.in_atomic_block:
+            close_old_connections()
+        job = claim(worker)
+        if job is None:
+            requeue_stale()
+            if drain:
+                break
+            stop.wait(poll)
+            continue
+        run(job)
+        done += 1
+    return done
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ADMIN
+# ────────────────────────────────────────────────────────────────────────────────
+
+def queue_stats():
+    """
+    Queue depth and latency: queued, due, running and failed counts, how
+    long the oldest due job has waited (seconds), and for jobs finished
+    within STATS_WINDOW their number, mean wait before starting and mean
+    run time (seconds, None if there were none).
+    """
+    stamp  = now()
+    counts = dict(Job.objects.filter(status__in=('queued', 'running', 'failed'))
+                  .values_list('status').annotate(Count('pk')).order_by())
+    due    = Job.objects.filter(status='queued', run_after__lte=stamp) \
+        .aggregate(due=Count('pk'), oldest=Min('run_after'))
+    recent = Job.objects.filter(finished_on__gte=stamp - STATS_WINDOW, status='done') \
+        .aggregate(finished=Count('pk'), wait=Avg(F('started_on') - F('run_after')),
+                   runtime=Avg(F('finished_on') - F('started_on')))
+    seconds = lambda delta: round(delta.total_seconds(), 3) if delta is not None else None
+    return {
+        'queued':      counts.get('queued', 0),
+        'due':         due['due'],
+        'running':     counts.get('running', 0),
+        'failed':      counts.get('failed', 0),
+        'oldest_wait': seconds(stamp - due['oldest'] if due['oldest'] else None),
+        'finished':    recent['finished'],
+        'mean_wait':   seconds(recent['wait']),
+        'mean_run':    seconds(recent['runtime']),
+    }
+
+# ────────────────────────────────────────────────────────────────────────────────
+# TASKS
+# ────────────────────────────────────────────────────────────────────────────────
+
+# The imports insert rows, so they resume from their last checkpoint (the
+# report so far, kept as the job's result) rather than start over.
+
+def _import(run_import, job, rows, upload, fmt):
+    # rows: [[row number, row], …] inline; upload: a stored upload's name
+    # (importer.store_upload), deleted once every row is in
+    progress = lambda report: checkpoint(job, report)
+    if upload is None:
+        return run_import(map(tuple, rows), resume=job.result, checkpoint=progress)
+    with importer.open_upload(upload) as lines:
+        report = run_import(importer.read_rows(lines, fmt), resume=job.result, checkpoint=progress)
+    importer.delete_upload(upload)
+    return report
+
+@task('import_patients', bind=True)
+def import_patients(job, rows=None, upload=None, fmt=None):
+    """Import an upload's rows (given inline or as a stored upload); returns the import report."""
+    return _import(importer.import_patients, job, rows, upload, fmt)
+
+@task('import_enrollments', bind=True)
+def import_enrollments(job, rows=None, upload=None, fmt=None):
+    return _import(importer.import_enrollments, job, rows, upload, fmt)
+
+@task('dispense')
+def dispense(diagnosis_ids, user_id=None):
+    """services.dispense as `user_id`; rows already dispensed come back as conflicts."""
+    return services.dispense(diagnosis_ids, get_user_model().objects.filter(pk=user_id).first())
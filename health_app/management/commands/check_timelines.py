@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from health_app import timeline
+
+
+class Command(BaseCommand):
+    help = 'Compare the patient timeline documents with the source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Rewrite missing and stale documents.')
+
+    def handle(self, *args, fix=False, **options):
+        result = timeline.check(fix=fix)
+        for kind in ('missing', 'stale'):
+            ids = result[kind]
+            if ids:
+                shown = ', '.join(map(str, ids[:20])) + (' …' if len(ids) > 20 else '')
+                self.stdout.write(f'{kind}: {len(ids)} ({shown})')
+        verb = 'Fixed' if fix else 'Found'
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {result['checked']} patient(s). {verb} "
+            f"{len(result['missing']) + len(result['stale'])} inconsistent timeline(s)."))
@@ -0,0 +1,71 @@
+import datetime
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from health_app import exports
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'{value!r} is not a YYYY-MM-DD date.')
+
+
+class Command(BaseCommand):
+    help = 'Stream enrollments, diagnoses or dispense history into a CSV or Parquet file (or CSV to stdout).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('path', help='File to write, or - for stdout (CSV only).')
+        parser.add_argument('--format', choices=exports.FORMATS,
+                            help='Defaults to the file extension (.csv / .parquet).')
+        parser.add_argument('--program', type=int, help='Only this program (id).')
+        parser.add_argument('--start', type=_date, help='First date included (YYYY-MM-DD).')
+        parser.add_argument('--end', type=_date, help='Last date included (YYYY-MM-DD).')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, dataset, path, format=None, program=None, start=None, end=None, chunk_size=None, **options):
+        fmt = format or {'.csv': 'csv', '.parquet': 'parquet'}.get(os.path.splitext(path)[1].lower())
+        if path == '-':
+            fmt = fmt or 'csv'
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+        if fmt == 'parquet' and (path == '-' or not exports.parquet_available()):
+            raise CommandError('Parquet needs pyarrow (pip install pyarrow) and a file path.')
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end.')
+
+        started = time.perf_counter()
+        rows    = exports.export_rows(dataset, program, start, end, chunk_size=chunk_size)
+        counted = _Counter(rows)
+        if fmt == 'parquet':
+            exports.write_parquet(dataset, counted, path, chunk_size=chunk_size)
+        else:
+            out = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+            try:
+                for text in exports.write_csv(dataset, counted, chunk_size=chunk_size):
+                    out.write(text)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        elapsed = time.perf_counter() - started
+
+        self.stderr.write(self.style.SUCCESS(
+            f'{counted.count} {dataset} row(s) exported '
+            f'({counted.count / elapsed if elapsed else 0:,.0f} rows/s).'
+        ))
+
+
+class _Counter:
+    """Pass rows through, counting them."""
+    def __init__(self, rows):
+        self.rows, self.count = rows, 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
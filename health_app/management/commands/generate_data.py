@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from health_app import synthetic
+
+
+class Command(BaseCommand):
+    help = ('Insert a reproducible synthetic dataset (programs, patients, enrollments, '
+            'diagnoses and bench-* role users) for benchmarks and load tests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--programs', type=int, default=8)
+        parser.add_argument('--enrollments-per-patient', type=float, default=1.6,
+                            help='Mean enrollments per patient (at least 1 each).')
+        parser.add_argument('--diagnosed', type=float, default=0.6,
+                            help='Share of enrollments with a diagnosis.')
+        parser.add_argument('--dispensed', type=float, default=0.85,
+                            help='Share of diagnoses already dispensed.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread enrollment dates over this many past days.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--password',
+                            help='Password for the bench-* users (default: none, no password login).')
+
+    def handle(self, *args, **options):
+        if options['patients'] < 0 or options['programs'] < 1:
+            raise CommandError('Need --patients >= 0 and --programs >= 1.')
+        for name in ('diagnosed', 'dispensed'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f'--{name} must be between 0 and 1.')
+        result = synthetic.generate(
+            patients=options['patients'],
+            programs=options['programs'],
+            enrollments_per_patient=options['enrollments_per_patient'],
+            diagnosed_ratio=options['diagnosed'],
+            dispensed_ratio=options['dispensed'],
+            days=options['days'],
+            seed=options['seed'],
+            password=options['password'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(result['programs'])} program(s), {result['patients']} patient(s), "
+            f"{result['enrollments']} enrollment(s), {result['diagnoses']} diagnosis(es) "
+            f"({result['dispensed']} dispensed)."))
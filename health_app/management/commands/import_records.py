@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from health_app import importer
+
+
+class Command(BaseCommand):
+    help = 'Stream patients or enrollments from a CSV/NDJSON file (or - for stdin) into the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path', help='File to import, or - for stdin.')
+        parser.add_argument('--format', choices=importer.FORMATS,
+                            help='Defaults to the file extension (.csv / .ndjson, .jsonl).')
+        parser.add_argument('--chunk-size', type=int, default=importer.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, kind, path, format=None, chunk_size=None, **options):
+        fmt = format or {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'} \
+            .get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.perf_counter()
+        try:
+            report = importer.IMPORTERS[kind](importer.read_rows(stream, fmt), chunk_size=chunk_size)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.perf_counter() - started
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(f"… {report['failed'] - len(report['errors'])} more error(s) not shown")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} of {report['rows']} {kind} imported, {report['failed']} failed "
+            f"({report['rows'] / elapsed if elapsed else 0:,.0f} rows/s)."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from health_app import reports
+
+
+class Command(BaseCommand):
+    help = 'Recompute the report rollups for closed periods from the source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=list(reports.PERIODS), action='append',
+                            help='Only this period kind (repeatable; default: all).')
+
+    def handle(self, *args, period=None, **options):
+        counts = reports.rebuild(tuple(period or reports.PERIODS))
+        for name, rows in counts.items():
+            self.stdout.write(f'{name}: {rows} row(s)')
+        self.stdout.write(self.style.SUCCESS('Rebuilt report rollups.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from health_app import search
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the patient search index from the Patient table.'
+
+    def handle(self, *args, **options):
+        kind = search.backend()
+        if kind != 'fts5':
+            self.stdout.write(f'Search backend is {kind!r}; it indexes the table itself, nothing to rebuild.')
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} patient(s).'))
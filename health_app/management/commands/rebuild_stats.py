@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from health_app import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized overview counters from the source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report counters that drifted; change nothing.')
+
+    def handle(self, *args, check=False, **options):
+        if check:
+            current = dict(stats.StatCounter.objects.values_list('name', 'value'))
+            actual  = stats.compute()
+            drift   = {n: (current.get(n, 0), actual.get(n, 0)) for n in current.keys() | actual.keys()
+                       if current.get(n, 0) != actual.get(n, 0)}
+            for name, (have, want) in sorted(drift.items()):
+                self.stdout.write(f'{name}: stored {have}, actual {want}')
+            self.stdout.write(self.style.SUCCESS(f'{len(drift)} counter(s) drifted.'))
+            return
+        values = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(values)} counter(s).'))
@@ -0,0 +1,76 @@
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from health_app import jobs
+
+
+def _serve(threads, poll, drain, stop):
+    """Run `threads` worker loops in this process until stop is set (or, with drain, nothing is due)."""
+    counts = []
+
+    def loop():
+        try:
+            counts.append(jobs.work(stop, poll=poll, drain=drain))
+        finally:
+            connections.close_all()     # this thread's connections
+
+    pool = [threading.Thread(target=loop, name=f'worker-{i}') for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(counts)
+
+def _child(threads, poll, drain):
+    django.setup()                      # a no-op when forked, needed when spawned
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT,  lambda *_: stop.set())
+    _serve(threads, poll, drain, stop)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (see health_app/jobs.py) until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes (default 1: run in this process).')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Worker threads per process (default 4).')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds to wait when no job is due (default 1).')
+        parser.add_argument('--drain', action='store_true',
+                            help='Exit once no job is due instead of waiting for more.')
+
+    def handle(self, *args, processes=1, threads=4, poll=1.0, drain=False, **options):
+        if processes < 1 or threads < 1:
+            raise CommandError('--processes and --threads must be at least 1.')
+        stop = threading.Event()
+        # SIGTERM/SIGINT: finish the jobs in hand, then exit
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT,  lambda *_: stop.set())
+        self.stdout.write(f'Running jobs with {processes} process(es) × {threads} thread(s).')
+
+        if processes == 1:
+            done = _serve(threads, poll, drain, stop)
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} job(s).'))
+            return
+
+        connections.close_all()         # children must not share the parent's sockets
+        children = [multiprocessing.Process(target=_child, args=(threads, poll, drain), name=f'jobs-{i}')
+                    for i in range(processes)]
+        for child in children:
+            child.start()
+        while any(child.is_alive() for child in children) and not stop.wait(poll):
+            pass
+        for child in children:
+            if child.is_alive():
+                child.terminate()       # SIGTERM: the child stops after its current jobs
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
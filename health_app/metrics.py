@@ -0,0 +1,325 @@
+"""
+Per-view request metrics, kept in process memory.
+
+MetricsMiddleware (first in settings.MIDDLEWARE) measures every request:
+wall time, SQL queries and time spent in them, and outbound HTTP calls made
+with `requests`. Samples are filed under the URL name that served the
+request (`health_app:pharmacy_queue`, `health_app:patient-list`, …;
+`<unmatched>` for 404s) and exported by GET /api/metrics/ (staff only) in
+the Prometheus text format:
+
+    health_requests_total{view,method,status}          counter
+    health_request_duration_seconds{view}              histogram (cumulative)
+    health_request_latency_seconds{view,quantile}      summary over the last WINDOW requests
+    health_db_queries{view}                            histogram of queries per request
+    health_db_duration_seconds{view}                   histogram of SQL time per request
+    health_outbound_requests_total{view}               counter
+    health_outbound_duration_seconds_total{view}       counter
+
+Queries are counted by a database execute wrapper installed on every
+connection, outbound calls by a wrapper around requests' HTTPAdapter.send,
+which every Session (and requests.get & co.) sends through. Both look up
+the current request through a context variable, so they also see work
+that async views run in sync_to_async threads.
+Counters are per process: with several workers, scrape each one or sum
+them. A streamed response is timed up to its first byte.
+
+With settings.HEALTH_SLOW_REQUEST_MS set, requests at least that slow are
+logged (logger `health_app.metrics`) with their SQL statements and
+timings. Parameters are left out, so patient data stays out of the logs.
+"""
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync            import iscoroutinefunction, markcoroutinefunction
+from django.conf             import settings
+from django.db               import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+WINDOW          = 1000       # recent requests per view for the latency summary
+QUANTILES       = (0.5, 0.9, 0.95, 0.99)
+SLOW_SQL_LIMIT  = 50         # statements kept per request for the slow log
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS    = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNMATCHED        = '<unmatched>'
+# any other method a client sends is counted as 'other', so the label set stays bounded
+METHODS          = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PER-REQUEST SAMPLE
+# ────────────────────────────────────────────────────────────────────────────────
+
+class Sample:
+    """
+    What one request did; filled in by the DB and HTTP wrappers, from the
+    request's thread and from any thread it hands work to (sync_to_async,
+    a copied context), hence the lock.
+    """
+    __slots__ = ('queries', 'db_seconds', 'outbound', 'outbound_seconds', 'sql', 'lock')
+
+    def __init__(self, capture_sql=False):
+        self.lock             = threading.Lock()
+        self.queries          = 0
+        self.db_seconds       = 0.0
+        self.outbound         = 0
+        self.outbound_seconds = 0.0
+        self.sql              = [] if capture_sql else None
+
+_current = ContextVar('health_metrics_sample', default=None)
+
+def _db_wrapper(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        with sample.lock:
+            sample.queries    += 1
+            sample.db_seconds += elapsed
+            if sample.sql is not None and len(sample.sql) < SLOW_SQL_LIMIT:
+                sample.sql.append((elapsed, sql))
+
+def install(connection, **kwargs):
+    """Add the query wrapper to a database connection (idempotent)."""
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+connection_created.connect(install, dispatch_uid='health_app.metrics.install')
+
+def record_outbound(seconds):
+    """Count one outbound HTTP call against the current request, if any."""
+    sample = _current.get()
+    if sample is not None:
+        with sample.lock:
+            sample.outbound         += 1
+            sample.outbound_seconds += seconds
+
+def _timed_send(send):
+    @functools.wraps(send)
+    def wrapper(self, request, **kwargs):
+        if _current.get() is None:
+            return send(self, request, **kwargs)
+        start = time.perf_counter()
+        try:
+            return send(self, request, **kwargs)
+        finally:
+            record_outbound(time.perf_counter() - start)
+    wrapper.health_metrics = True
+    return wrapper
+
+def install_outbound():
+    """Time every `requests` call, retries included (idempotent; no-op without requests)."""
+    try:
+        from requests.adapters import HTTPAdapter
+    except ImportError:
+        return
+    if not getattr(HTTPAdapter.send, 'health_metrics', False):
+        HTTPAdapter.send = _timed_send(HTTPAdapter.send)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# AGGREGATES
+# ────────────────────────────────────────────────────────────────────────────────
+
+class Histogram:
+    """Cumulative Prometheus-style histogram (counts per upper bound)."""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot: +Inf
+        self.sum    = 0
+        self.count  = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum   += value
+        self.count += 1
+
+class ViewStats:
+    def __init__(self):
+        self.requests         = {}                      # (method, status) → count
+        self.duration         = Histogram(DURATION_BUCKETS)
+        self.recent           = deque(maxlen=WINDOW)    # wall times for the summary
+        self.queries          = Histogram(QUERY_BUCKETS)
+        self.db               = Histogram(DURATION_BUCKETS)
+        self.outbound         = 0
+        self.outbound_seconds = 0.0
+
+_views = {}
+_lock  = threading.Lock()
+
+def record(view, method, status, seconds, sample):
+    with _lock:
+        stats = _views.get(view)
+        if stats is None:
+            stats = _views[view] = ViewStats()
+        key = (method, status)
+        stats.requests[key] = stats.requests.get(key, 0) + 1
+        stats.duration.observe(seconds)
+        stats.recent.append(seconds)
+        stats.queries.observe(sample.queries)
+        stats.db.observe(sample.db_seconds)
+        stats.outbound         += sample.outbound
+        stats.outbound_seconds += sample.outbound_seconds
+
+def reset():
+    with _lock:
+        _views.clear()
+
+def snapshot():
+    """{view: {'requests', 'queries', 'db_seconds', 'outbound', 'seconds'}} totals."""
+    with _lock:
+        return {view: {
+            'requests':         sum(s.requests.values()),
+            'queries':          s.queries.sum,
+            'db_seconds':       s.db.sum,
+            'outbound':         s.outbound,
+            'seconds':          s.duration.sum,
+        } for view, s in _views.items()}
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PROMETHEUS TEXT FORMAT
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _histogram(lines, name, view, hist):
+    cumulative = 0
+    for bound, count in zip((*hist.bounds, '+Inf'), hist.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(view=view, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(view=view)} {_number(hist.sum)}')
+    lines.append(f'{name}_count{_labels(view=view)} {hist.count}')
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        views = sorted(_views.items())
+        lines = ['# HELP health_requests_total Requests served, by view, method and status.',
+                 '# TYPE health_requests_total counter']
+        for view, s in views:
+            for (method, status), count in sorted(s.requests.items()):
+                lines.append(f'health_requests_total{_labels(view=view, method=method, status=status)} {count}')
+
+        lines += ['# HELP health_request_duration_seconds Wall time per request.',
+                  '# TYPE health_request_duration_seconds histogram']
+        for view, s in views:
+            _histogram(lines, 'health_request_duration_seconds', view, s.duration)
+
+        lines += [f'# HELP health_request_latency_seconds Wall time over the last {WINDOW} requests.',
+                  '# TYPE health_request_latency_seconds summary']
+        for view, s in views:
+            ordered = sorted(s.recent)
+            for q in QUANTILES:
+                lines.append(f'health_request_latency_seconds{_labels(view=view, quantile=q)} '
+                             f'{_number(_quantile(ordered, q))}')
+            lines.append(f'health_request_latency_seconds_sum{_labels(view=view)} {_number(sum(ordered))}')
+            lines.append(f'health_request_latency_seconds_count{_labels(view=view)} {len(ordered)}')
+
+        lines += ['# HELP health_db_queries SQL queries per request.',
+                  '# TYPE health_db_queries histogram']
+        for view, s in views:
+            _histogram(lines, 'health_db_queries', view, s.queries)
+
+        lines += ['# HELP health_db_duration_seconds Time spent in SQL per request.',
+                  '# TYPE health_db_duration_seconds histogram']
+        for view, s in views:
+            _histogram(lines, 'health_db_duration_seconds', view, s.db)
+
+        lines += ['# HELP health_outbound_requests_total Outbound HTTP calls made while serving requests.',
+                  '# TYPE health_outbound_requests_total counter']
+        lines += [f'health_outbound_requests_total{_labels(view=view)} {s.outbound}' for view, s in views]
+        lines += ['# HELP health_outbound_duration_seconds_total Time spent in outbound HTTP calls.',
+                  '# TYPE health_outbound_duration_seconds_total counter']
+        lines += [f'health_outbound_duration_seconds_total{_labels(view=view)} {_number(s.outbound_seconds)}'
+                  for view, s in views]
+    return '\n'.join(lines) + '\n'
+
+class PrometheusRenderer(BaseRenderer):
+    """Text exposition format for the metrics endpoint (errors as plain lines)."""
+    media_type = 'text/plain'
+    format     = 'prometheus'
+    charset    = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data
+        return ''.join(f'# {k}: {v}\n' for k, v in (data or {}).items())
+
+# ────────────────────────────────────────────────────────────────────────────────
+# MIDDLEWARE
+# ────────────────────────────────────────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """Times each request and files its Sample under the view's URL name."""
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms      = getattr(settings, 'HEALTH_SLOW_REQUEST_MS', None)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        install_outbound()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, sample, start)
+        return response
+
+    async def __acall__(self, request):
+        sample, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, sample, start)
+        return response
+
+    def _start(self):
+        sample = Sample(capture_sql=self.slow_ms is not None)
+        return sample, _current.set(sample), time.perf_counter()
+
+    def _finish(self, request, response, sample, start):
+        seconds = time.perf_counter() - start
+        match   = getattr(request, 'resolver_match', None)
+        view    = match.view_name if match else UNMATCHED
+        method  = request.method if request.method in METHODS else 'other'
+        record(view, method, response.status_code, seconds, sample)
+        if self.slow_ms is not None and seconds * 1000 >= self.slow_ms:
+            statements = '\n'.join(f'  {elapsed * 1000:8.2f} ms  {sql}' for elapsed, sql in sample.sql)
+            logger.warning(
+                'Slow request: %s %s (%s) → %s in %.0f ms; %d queries, %.0f ms SQL; '
+                '%d outbound, %.0f ms%s', request.method, request.path, view, response.status_code,
+                seconds * 1000, sample.queries, sample.db_seconds * 1000, sample.outbound,
+                sample.outbound_seconds * 1000, f'\n{statements}' if statements else '',
+            )
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Patient     = apps.get_model('health_app', 'Patient')
+    Enrollment  = apps.get_model('health_app', 'Enrollment')
+    Diagnosis   = apps.get_model('health_app', 'Diagnosis')
+    StatCounter = apps.get_model('health_app', 'StatCounter')
+
+    values = {
+        'patients':    Patient.objects.count(),
+        'enrollments': Enrollment.objects.count(),
+        'diagnoses':   Diagnosis.objects.count(),
+        'dispensed':   Diagnosis.objects.filter(dispensed=True).count(),
+        'pending':     Diagnosis.objects.filter(dispensed=False).count(),
+    }
+    for row in Enrollment.objects.values('program_id').annotate(n=Count('id')):
+        values[f"program:{row['program_id']}"] = row['n']
+    for row in Diagnosis.objects.values('created_by_id').annotate(n=Count('id')):
+        values[f"doctor:{row['created_by_id'] if row['created_by_id'] is not None else 'none'}"] = row['n']
+    StatCounter.objects.bulk_create(StatCounter(name=n, value=v) for n, v in values.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Django compiles icontains on PostgreSQL to UPPER(col::text) LIKE UPPER(%s);
+# a trigram GIN index on that expression turns the scans into index lookups.
+# Other backends have no equivalent, so this step is PostgreSQL-only.
+TRIGRAM_COLUMNS = ('name', 'contact')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS patient_{column}_trgm_idx ON health_app_patient '
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS patient_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0002_statcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(condition=models.Q(('dispensed', False)), fields=['created_on'], name='diag_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(condition=models.Q(('dispensed', True)), fields=['-dispensed_on'], name='diag_dispensed_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['program', 'status'], name='enroll_program_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['enrolled_on'], name='enroll_enrolled_on_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,53 @@
+import re
+import unicodedata
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# frozen copies of what health_app.search had when this migration was written
+FTS_TABLE = 'health_app_patient_search'
+
+
+def normalize_text(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', value.casefold()))
+
+
+def digits(value):
+    # the index's contact column as this migration wrote it (0010 rewrites it)
+    return re.sub(r'\D', '', value or '')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, contact, tokenize='trigram')"
+        )
+    except OperationalError:
+        return  # SQLite built without FTS5: search falls back to LIKE scans
+    Patient = apps.get_model('health_app', 'Patient')
+    rows = [(pk, normalize_text(name), digits(contact))
+            for pk, name, contact in Patient.objects.values_list('id', 'name', 'contact').iterator()]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, contact) VALUES (%s, %s, %s)', rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
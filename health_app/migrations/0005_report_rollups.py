@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0004_patient_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('metric', models.CharField(choices=[('enrollments', 'Enrollments'), ('diagnoses', 'Diagnoses'), ('dispensed', 'Dispensed')], max_length=12)),
+                ('count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5, unique=True)),
+                ('rolled_until', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['created_on'], name='diag_created_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='reportrollup',
+            name='program',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='health_app.program'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'program', 'metric'), name='report_rollup_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0005_report_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientTimeline',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline', serialize=False, to='health_app.patient')),
+                ('document', models.JSONField()),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def refuse_duplicates(apps, schema_editor):
+    # Which of two diagnoses is the real one is a clinical decision, so
+    # duplicates are reported for someone to resolve rather than deleted.
+    Diagnosis = apps.get_model('health_app', 'Diagnosis')
+    duplicated = list(Diagnosis.objects.values('enrollment_id').annotate(n=Count('id'))
+                      .filter(n__gt=1).order_by('enrollment_id').values_list('enrollment_id', flat=True)[:50])
+    if duplicated:
+        raise RuntimeError(
+            'Enrollments with more than one diagnosis (first 50): '
+            f"{', '.join(map(str, duplicated))}. Delete or reassign the extra "
+            'diagnoses, then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0006_patient_timeline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(refuse_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='diagnosis',
+            constraint=models.UniqueConstraint(fields=('enrollment',), name='diagnosis_enrollment_unique'),
+        ),
+    ]
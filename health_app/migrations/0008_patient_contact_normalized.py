@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:12
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def normalize_contact(value):
+    # frozen copy of health_app.contacts.normalize_contact
+    value = (value or '').strip()
+    if re.fullmatch(r'[^@\s]+@[^@\s]+', value):
+        return value.lower()
+    if not re.fullmatch(r'\+?[\d\s().\-/]+', value):
+        return None
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return None
+    if digits.startswith('00'):
+        return digits[2:] or None
+    if digits.startswith('0'):
+        return getattr(settings, 'HEALTH_CONTACT_COUNTRY_CODE', '254') + digits[1:]
+    return digits
+
+
+def backfill(apps, schema_editor):
+    # Two patients whose contacts normalize to the same number are most
+    # likely one person registered twice; merging them is a decision for
+    # staff, so they are listed rather than changed.
+    Patient = apps.get_model('health_app', 'Patient')
+    seen, clashes, batch = {}, [], []
+    for patient in Patient.objects.only('id', 'contact').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        key = normalize_contact(patient.contact)
+        if key is not None:
+            if key in seen:
+                clashes.append(f'{seen[key]} & {patient.pk}')
+            seen[key] = patient.pk
+        patient.contact_normalized = key
+        batch.append(patient)
+        if len(batch) == BATCH_SIZE:
+            Patient.objects.bulk_update(batch, ['contact_normalized'])
+            batch = []
+    if clashes:
+        raise RuntimeError(
+            'Patients whose contacts are the same number (first 50 pairs of ids): '
+            f"{', '.join(clashes[:50])}. Merge or correct them, then migrate again."
+        )
+    Patient.objects.bulk_update(batch, ['contact_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0007_diagnosis_enrollment_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='contact_normalized',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='patient',
+            name='contact_normalized',
+            field=models.CharField(editable=False, max_length=100, null=True, unique=True),
+        ),
+    ]
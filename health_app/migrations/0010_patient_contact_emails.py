@@ -0,0 +1,37 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# the first version of 0008 reduced email addresses to their digits too
+contact_normalized = import_module('health_app.migrations.0008_patient_contact_normalized')
+# the search index table and text normalization, frozen with 0004
+search_index = import_module('health_app.migrations.0004_patient_search_index')
+
+BATCH_SIZE = 2000
+
+
+def renormalize(apps, schema_editor):
+    contact_normalized.backfill(apps, schema_editor)
+    if search_index.FTS_TABLE not in schema_editor.connection.introspection.table_names():
+        return
+    # the search index held digits only; it now holds the canonical form
+    Patient = apps.get_model('health_app', 'Patient')
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for pk, contact in Patient.objects.values_list('id', 'contact').iterator(chunk_size=BATCH_SIZE):
+            rows.append((contact_normalized.normalize_contact(contact) or search_index.normalize_text(contact), pk))
+            if len(rows) == BATCH_SIZE:
+                cursor.executemany(f'UPDATE {search_index.FTS_TABLE} SET contact = %s WHERE rowid = %s', rows)
+                rows = []
+        cursor.executemany(f'UPDATE {search_index.FTS_TABLE} SET contact = %s WHERE rowid = %s', rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0009_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_app', '0010_patient_contact_emails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollment',
+            name='enrolled_on',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
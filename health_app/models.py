@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from .contacts import normalize_contact
 
 class Program(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -11,14 +14,36 @@ class Patient(models.Model):
     age     = models.PositiveIntegerField()
     gender  = models.CharField(max_length=10, choices=GENDER_CHOICES)
     contact = models.CharField(max_length=100, unique=True)
+    # contacts.normalize_contact(contact), set on every save; what lookups match
+    contact_normalized = models.CharField(max_length=100, unique=True, null=True, editable=False)
+    def save(self, *args, **kwargs):
+        self.contact_normalized = normalize_contact(self.contact)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'contact' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'contact_normalized'}
+        super().save(*args, **kwargs)
     def __str__(self): return f"{self.name} ({self.contact})"
 
+class EnrollmentQuerySet(models.QuerySet):
+    def with_diagnosis_id(self):
+        """Annotate `first_diagnosis_id` in the same query (read by EnrollmentSerializer)."""
+        first = Diagnosis.objects.filter(enrollment=models.OuterRef('pk')).order_by('pk').values('pk')[:1]
+        return self.annotate(first_diagnosis_id=models.Subquery(first))
+
 class Enrollment(models.Model):
     patient     = models.ForeignKey(Patient, related_name='enrollments', on_delete=models.CASCADE)
     program     = models.ForeignKey(Program, on_delete=models.CASCADE)
-    enrolled_on = models.DateField(auto_now_add=True)
+    enrolled_on = models.DateField(default=timezone.localdate)   # imports may give an earlier date
     STATUS_CHOICES = [('registered','Registered'),('consulted','Consulted'),('dispensed','Medicated')]
     status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='registered')
+    objects = EnrollmentQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            # doctor diagnosis form: program=… AND status='registered'
+            models.Index(fields=['program', 'status'], name='enroll_program_status_idx'),
+            # patient API date/year filters (year becomes a BETWEEN range)
+            models.Index(fields=['enrolled_on'], name='enroll_enrolled_on_idx'),
+        ]
     def __str__(self): return f"{self.patient.name} → {self.program.name}"
 
 class DoctorProfile(models.Model):
@@ -39,4 +64,85 @@ class Diagnosis(models.Model):
     dispensed_by    = models.ForeignKey(settings.AUTH_USER_MODEL,
                                       null=True, blank=True, on_delete=models.SET_NULL,
                                       related_name='dispensations')
+    class Meta:
+        indexes = [
+            # pharmacy work queue: only the (small) pending set, oldest first
+            models.Index(fields=['created_on'], condition=models.Q(dispensed=False),
+                         name='diag_pending_created_idx'),
+            # dispensed history, newest first
+            models.Index(fields=['-dispensed_on'], condition=models.Q(dispensed=True),
+                         name='diag_dispensed_on_idx'),
+            # reports: diagnoses per period (see reports.py)
+            models.Index(fields=['created_on'], name='diag_created_on_idx'),
+        ]
+        constraints = [
+            # one diagnosis per enrollment, enforced by the database so two
+            # doctors submitting at once cannot both insert (services.diagnose)
+            models.UniqueConstraint(fields=['enrollment'], name='diagnosis_enrollment_unique'),
+        ]
     def __str__(self): return f"Diagnosis #{self.id} for {self.enrollment.patient.name}"
+
+class StatCounter(models.Model):
+    """Precomputed dashboard total, kept current by stats.py."""
+    name  = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    def __str__(self): return f"{self.name} = {self.value}"
+
+class ReportRollup(models.Model):
+    """Count of one metric for one program over one closed period (see reports.py)."""
+    PERIOD_CHOICES = [('day','Day'),('week','Week'),('month','Month')]
+    METRIC_CHOICES = [('enrollments','Enrollments'),('diagnoses','Diagnoses'),('dispensed','Dispensed')]
+    period       = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    program      = models.ForeignKey(Program, on_delete=models.CASCADE)
+    metric       = models.CharField(max_length=12, choices=METRIC_CHOICES)
+    count        = models.PositiveIntegerField()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'program', 'metric'],
+                                    name='report_rollup_unique'),
+        ]
+    def __str__(self): return f"{self.period} {self.period_start} {self.program_id} {self.metric} = {self.count}"
+
+class ReportRollupState(models.Model):
+    """How far ReportRollup covers a period kind: every period before `rolled_until`."""
+    period       = models.CharField(max_length=5, choices=ReportRollup.PERIOD_CHOICES, unique=True)
+    rolled_until = models.DateField()
+    def __str__(self): return f"{self.period} rolled up until {self.rolled_until}"
+
+class PatientTimeline(models.Model):
+    """One patient's profile, diagnoses and events as a JSON document (see timeline.py)."""
+    patient    = models.OneToOneField(Patient, primary_key=True, on_delete=models.CASCADE,
+                                      related_name='timeline')
+    document   = models.JSONField()
+    updated_on = models.DateTimeField(auto_now=True)
+    def __str__(self): return f"Timeline of patient #{self.patient_id}"
+
+class Job(models.Model):
+    """One unit of background work, run by `manage.py run_jobs` (see jobs.py)."""
+    STATUS_CHOICES = [('queued','Queued'),('running','Running'),('done','Done'),('failed','Failed')]
+    name         = models.CharField(max_length=100)
+    payload      = models.JSONField(default=dict)
+    key          = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status       = models.CharField(max_length=7, choices=STATUS_CHOICES, default='queued')
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after    = models.DateTimeField()
+    created_on   = models.DateTimeField(auto_now_add=True)
+    created_by   = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True,
+                                     on_delete=models.SET_NULL, related_name='jobs')
+    started_on   = models.DateTimeField(null=True, blank=True)
+    finished_on  = models.DateTimeField(null=True, blank=True)
+    worker       = models.CharField(max_length=100, blank=True)
+    result       = models.JSONField(null=True, blank=True)
+    error        = models.TextField(blank=True)
+    class Meta:
+        indexes = [
+            # what workers claim next: only the queued set, earliest due first
+            models.Index(fields=['run_after'], condition=models.Q(status='queued'), name='job_ready_idx'),
+            # leases to expire (jobs.requeue_stale)
+            models.Index(fields=['started_on'], condition=models.Q(status='running'), name='job_running_idx'),
+            # recent latency (jobs.queue_stats)
+            models.Index(fields=['-finished_on'], name='job_finished_on_idx'),
+        ]
+    def __str__(self): return f"Job #{self.id} {self.name} ({self.status})"
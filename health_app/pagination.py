@@ -0,0 +1,114 @@
+"""
+Keyset pagination and opt-in streaming for the large API list endpoints,
+and a bounded-count paginator for the admin changelists.
+"""
+import json
+
+from django.core.paginator           import Paginator
+from django.http                     import StreamingHttpResponse
+from django.utils.functional         import cached_property
+from rest_framework.pagination       import CursorPagination, PageNumberPagination
+from rest_framework.utils.encoders   import JSONEncoder
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CURSOR (KEYSET) PAGINATION
+# ────────────────────────────────────────────────────────────────────────────────
+
+class PatientCursorPagination(CursorPagination):
+    """
+    ?cursor= pages over patients in id order; each page is a
+    `WHERE id > last_seen ORDER BY id LIMIT n` seek, never an OFFSET scan.
+    """
+    page_size             = 50
+    page_size_query_param = 'page_size'
+    max_page_size         = 500
+    ordering              = 'id'
+
+class EnrollmentCursorPagination(PatientCursorPagination):
+    """
+    Most recently recorded enrollments first. Ordering by id alone keeps the
+    keyset exact even when thousands of rows share a date; it is not
+    enrolled_on order, since imported history carries earlier dates.
+    """
+    ordering = '-id'
+
+class PatientSearchPagination(PageNumberPagination):
+    """
+    ?search= results in rank order, ?page= at a time. Ranked results have no
+    keyset to seek on; the matches are capped at search.SEARCH_LIMIT, so
+    the count and the OFFSET stay bounded.
+    """
+    page_size             = PatientCursorPagination.page_size
+    page_size_query_param = 'page_size'
+    max_page_size         = PatientCursorPagination.max_page_size
+
+# ────────────────────────────────────────────────────────────────────────────────
+# STREAMING LIST RESPONSES
+# ────────────────────────────────────────────────────────────────────────────────
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json':   'application/json',
+}
+
+class StreamingListMixin:
+    """
+    Viewset mixin: `?stream=ndjson` (one object per line) or `?stream=json`
+    (a chunked JSON array) returns the whole filtered list through a
+    generator, reading `stream_chunk_size` rows at a time, so memory stays
+    flat however large the table is. Without ?stream= the regular paginated
+    list is returned.
+    """
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        fmt = request.query_params.get('stream')
+        if fmt not in STREAM_CONTENT_TYPES:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        rows     = self.stream_rows(queryset)
+        chunks   = self._ndjson(rows) if fmt == 'ndjson' else self._json_array(rows)
+        return StreamingHttpResponse(chunks, content_type=STREAM_CONTENT_TYPES[fmt])
+
+    def stream_rows(self, queryset):
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            yield self.get_serializer(obj).data
+
+    @staticmethod
+    def _ndjson(rows):
+        for row in rows:
+            yield json.dumps(row, cls=JSONEncoder) + '\n'
+
+    @staticmethod
+    def _json_array(rows):
+        yield '['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + json.dumps(row, cls=JSONEncoder)
+        yield ']'
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ADMIN CHANGELISTS
+# ────────────────────────────────────────────────────────────────────────────────
+
+class CountedPaginator(Paginator):
+    """
+    Paginator that never runs a full COUNT(*) over a large table.
+
+    An unfiltered list of a model with a stats.py total (`patients`,
+    `enrollments`, `diagnoses`) takes its count from that counter. Any
+    other list is counted up to `count_limit` rows only, a
+    `SELECT COUNT(*) FROM (… LIMIT n)` whose cost is bounded however big the
+    table is. Past the limit, later pages are reached by narrowing the filters.
+    """
+    count_limit = 10000
+    totals      = {'patient': 'patients', 'enrollment': 'enrollments', 'diagnosis': 'diagnoses'}
+
+    @cached_property
+    def count(self):
+        from . import stats
+        queryset = self.object_list
+        counter  = self.totals.get(queryset.model._meta.model_name)
+        if counter and not queryset.query.where:
+            return stats.total(counter)
+        return queryset.order_by()[:self.count_limit].count()
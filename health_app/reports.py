@@ -0,0 +1,224 @@
+"""
+Enrollment, diagnosis and dispense counts per program, bucketed by day,
+week (Monday) or month.
+
+Counts are grouped in the database (Trunc* + GROUP BY); the three metrics
+come back from one UNION ALL query. Periods that have ended are computed
+once and stored in ReportRollup, so a report only aggregates the raw rows
+of the still-open period and reads history from the rollup:
+
+    report('week', date(2024, 1, 1), date(2024, 3, 31))
+    → [{'period_start': date, 'program_id', 'program', 'enrollments',
+        'diagnoses', 'dispensed'}, …]   (periods with activity only)
+
+Rollups record what had happened when the period closed. Imports of
+historical enrollments add to them (add_backdated); after deleting or
+back-dating records otherwise, `manage.py rebuild_reports` recomputes them.
+"""
+import csv
+import datetime
+import io
+from collections import Counter, defaultdict
+
+from django.db              import IntegrityError, transaction
+from django.db.models       import Count, DateField, F, Value
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils.timezone  import localdate, make_aware
+from rest_framework.renderers import BaseRenderer
+
+from .models import Program, Enrollment, Diagnosis, ReportRollup, ReportRollupState
+
+PERIODS = {
+    'day':   TruncDay,
+    'week':  TruncWeek,
+    'month': TruncMonth,
+}
+METRICS = ('enrollments', 'diagnoses', 'dispensed')
+
+# metric → (model, date field, program path, extra filter)
+SOURCES = {
+    'enrollments': (Enrollment, 'enrolled_on',  'program_id',            {}),
+    'diagnoses':   (Diagnosis,  'created_on',   'enrollment__program_id', {}),
+    'dispensed':   (Diagnosis,  'dispensed_on', 'enrollment__program_id', {'dispensed': True}),
+}
+
+# default window and the most periods one request may span
+DEFAULT_SPAN = {'day': 30, 'week': 12, 'month': 12}
+MAX_SPAN     = {'day': 366, 'week': 260, 'month': 120}
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PERIOD ARITHMETIC
+# ────────────────────────────────────────────────────────────────────────────────
+
+def period_start(period, day):
+    """Start of the period containing `day`."""
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+def shift(period, start, n=1):
+    """Start of the period n periods after the one starting at `start`."""
+    if period == 'week':
+        return start + datetime.timedelta(weeks=n)
+    if period == 'month':
+        months = start.year * 12 + start.month - 1 + n
+        return datetime.date(months // 12, months % 12 + 1, 1)
+    return start + datetime.timedelta(days=n)
+
+def default_range(period, today=None):
+    """(start, end) covering the last DEFAULT_SPAN periods up to today."""
+    end = today or localdate()
+    return shift(period, period_start(period, end), 1 - DEFAULT_SPAN[period]), end
+
+def span(period, start, end):
+    """Number of periods from start's period to end's, inclusive."""
+    first, last = period_start(period, start), period_start(period, end)
+    if period == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days // (7 if period == 'week' else 1) + 1
+
+# ────────────────────────────────────────────────────────────────────────────────
+# AGGREGATION
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _bound(model, field, day):
+    # date bounds become local midnights on the datetime columns
+    if model._meta.get_field(field).get_internal_type() == 'DateTimeField':
+        return make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return day
+
+def aggregate(period, start=None, end=None, program_id=None):
+    """
+    {(period_start, program_id, metric): count} for dates in [start, end)
+    (either bound may be None), grouped in the database in one query.
+    """
+    trunc, parts = PERIODS[period], []
+    for metric in METRICS:
+        model, field, program_path, extra = SOURCES[metric]
+        qs = model.objects.filter(**extra)
+        if start is not None:
+            qs = qs.filter(**{f'{field}__gte': _bound(model, field, start)})
+        if end is not None:
+            qs = qs.filter(**{f'{field}__lt': _bound(model, field, end)})
+        if program_id is not None:
+            qs = qs.filter(**{program_path: program_id})
+        parts.append(qs.annotate(
+            metric=Value(metric),
+            bucket=trunc(field, output_field=DateField()),
+            pid=F(program_path),
+        ).values('metric', 'bucket', 'pid').annotate(n=Count('pk')).order_by())
+    rows = parts[0].union(*parts[1:], all=True)
+    return {(r['bucket'], r['pid'], r['metric']): r['n'] for r in rows}
+
+def roll_up(period, today=None):
+    """
+    Store counts for every closed period not rolled up yet; returns the
+    start of the open period (everything before it is in ReportRollup).
+    """
+    open_start = period_start(period, today or localdate())
+    if ReportRollupState.objects.filter(period=period, rolled_until__gte=open_start).exists():
+        return open_start
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                state = ReportRollupState.objects.select_for_update().filter(period=period).first()
+                if state and state.rolled_until >= open_start:
+                    return open_start
+                counts = aggregate(period, state.rolled_until if state else None, open_start)
+                ReportRollup.objects.bulk_create(
+                    (ReportRollup(period=period, period_start=bucket, program_id=pid, metric=metric, count=n)
+                     for (bucket, pid, metric), n in counts.items()),
+                    batch_size=1000, ignore_conflicts=True,
+                )
+                ReportRollupState.objects.update_or_create(period=period, defaults={'rolled_until': open_start})
+            return open_start
+        except IntegrityError:
+            # With no state row yet there is nothing to lock, so two first
+            # roll-ups can race to insert it; the loser looks again and
+            # finds the winner's (identical) rollups.
+            if attempt:
+                raise
+
+def add_backdated(metric, rows):
+    """
+    Count rows inserted with dates in periods already rolled up (imported
+    history) into those rollups, in the caller's transaction. `rows` are
+    (date, program_id) pairs of `metric`. The rollup states are locked, so
+    a concurrent roll_up() cannot count the same rows again.
+    """
+    states = ReportRollupState.objects.select_for_update().values_list('period', 'rolled_until')
+    for period, until in states:
+        counts = Counter((period_start(period, day), pid) for day, pid in rows if day < until)
+        if not counts:
+            continue
+        existing = {(r.period_start, r.program_id): r for r in ReportRollup.objects.filter(
+            period=period, metric=metric, period_start__in={b for b, _ in counts},
+            program_id__in={pid for _, pid in counts})}
+        for key, rollup in existing.items():
+            rollup.count += counts.get(key, 0)
+        ReportRollup.objects.bulk_update(existing.values(), ['count'], batch_size=1000)
+        ReportRollup.objects.bulk_create(
+            (ReportRollup(period=period, period_start=bucket, program_id=pid, metric=metric, count=n)
+             for (bucket, pid), n in counts.items() if (bucket, pid) not in existing),
+            batch_size=1000,
+        )
+
+def rebuild(periods=tuple(PERIODS)):
+    """Drop and recompute the rollups; returns rows stored per period."""
+    with transaction.atomic():
+        ReportRollup.objects.filter(period__in=periods).delete()
+        ReportRollupState.objects.filter(period__in=periods).delete()
+        for period in periods:
+            roll_up(period)
+    return {p: ReportRollup.objects.filter(period=p).count() for p in periods}
+
+def report(period, start, end, program_id=None):
+    """
+    Rows per (period, program) with activity, for every period that overlaps
+    start..end; periods are always counted whole.
+    """
+    first      = period_start(period, start)
+    open_start = roll_up(period)
+
+    counts = defaultdict(int)
+    closed = ReportRollup.objects.filter(period=period, period_start__gte=first, period_start__lte=end)
+    if program_id is not None:
+        closed = closed.filter(program_id=program_id)
+    for bucket, pid, metric, n in closed.values_list('period_start', 'program', 'metric', 'count'):
+        counts[bucket, pid, metric] += n
+    if end >= open_start:
+        live = aggregate(period, max(first, open_start), shift(period, period_start(period, end)), program_id)
+        for key, n in live.items():
+            counts[key] += n
+
+    names, rows = dict(Program.objects.values_list('id', 'name')), {}
+    for (bucket, pid, metric), n in counts.items():
+        row = rows.setdefault((bucket, pid), {
+            'period_start': bucket, 'program_id': pid, 'program': names.get(pid),
+            **{m: 0 for m in METRICS},
+        })
+        row[metric] = n
+    return [rows[key] for key in sorted(rows)]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CSV EXPORT
+# ────────────────────────────────────────────────────────────────────────────────
+
+class ReportCSVRenderer(BaseRenderer):
+    """?format=csv (or Accept: text/csv) for the report endpoint's rows."""
+    media_type = 'text/csv'
+    format     = 'csv'
+    charset    = 'utf-8'
+    columns    = ('period_start', 'program_id', 'program', *METRICS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        out    = io.StringIO()
+        writer = csv.writer(out)
+        if isinstance(data, dict) and 'results' in data:
+            writer.writerow(self.columns)
+            writer.writerows([row[c] for c in self.columns] for row in data['results'])
+        else:   # errors
+            writer.writerows([[k, v] for k, v in (data or {}).items()])
+        return out.getvalue()
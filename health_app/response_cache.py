@@ -0,0 +1,149 @@
+"""
+Versioned response cache with ETag / Last-Modified for the API's GETs.
+
+Each model the API serves has a version token (and the time it last
+changed) in the cache; signals.py bumps it on every save/delete, and bulk
+writes that skip signals call bump() themselves. A cached GET response is
+keyed on the request plus the versions of the models it reads, so a write
+simply makes the old entries unreachable — nothing is invalidated by hand.
+
+    If-None-Match / If-Modified-Since  → 304 before any query or serializer
+    cache hit                          → stored data, serializer skipped
+    miss                               → normal view, data stored
+
+The backend is the HEALTH_RESPONSE_CACHE alias in CACHES (local memory,
+file or Redis; see settings.py). Hit/miss/304 counters are served at
+/api/cache-stats/ and each response carries X-Cache.
+"""
+import functools
+import hashlib
+import time
+import uuid
+
+from django.conf        import settings
+from django.core.cache  import caches
+from django.db          import transaction
+from django.utils.http  import http_date, parse_http_date_safe, quote_etag
+from rest_framework          import status
+from rest_framework.response import Response
+
+CACHE_ALIAS   = getattr(settings, 'HEALTH_RESPONSE_CACHE', 'default')
+RESPONSE_TTL  = 3600
+COUNTERS      = ('hits', 'misses', 'not_modified')
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+def _version_key(model):
+    return f'health_app:version:{model._meta.label_lower}'
+
+# ────────────────────────────────────────────────────────────────────────────────
+# MODEL VERSIONS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _new_versions(models):
+    stamp = (uuid.uuid4().hex, int(time.time()))
+    _cache().set_many({_version_key(m): stamp for m in models}, None)
+
+def bump(*models):
+    """
+    Mark models as changed: new version token, Last-Modified = now.
+
+    Bumped again on commit: a reader that caches the not-yet-committed state
+    in between does so under a token nobody will ask for afterwards.
+    """
+    _new_versions(models)
+    transaction.on_commit(lambda: _new_versions(models))
+
+def versions(models):
+    """[(token, last-modified epoch), …] for models, creating missing ones."""
+    keys   = [_version_key(m) for m in models]
+    found  = _cache().get_many(keys)
+    absent = [m for m, k in zip(models, keys) if k not in found]
+    if absent:
+        _new_versions(absent)
+        found.update(_cache().get_many([_version_key(m) for m in absent]))
+    return [found[k] for k in keys]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# STATS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _count(name):
+    key = f'health_app:response_cache:{name}'
+    try:
+        _cache().incr(key)
+    except ValueError:
+        _cache().add(key, 0, None)
+        _cache().incr(key)
+
+def counters():
+    """{'hits': n, 'misses': n, 'not_modified': n} since the cache was created."""
+    keys = {f'health_app:response_cache:{n}': n for n in COUNTERS}
+    got  = _cache().get_many(list(keys))
+    return {name: got.get(key, 0) for key, name in keys.items()}
+
+# ────────────────────────────────────────────────────────────────────────────────
+# VIEW DECORATOR
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _etag(request, tokens):
+    raw = '|'.join([request.get_full_path(), request.accepted_media_type or '', *tokens])
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [t.strip() for t in if_none_match.split(',')] or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and last_modified <= since
+
+def cached_response(method):
+    """
+    Wrap a viewset GET handler. The viewset lists the models the response
+    depends on in `cache_models`, and may define cache_vary(request) for
+    anything else the response depends on (e.g. today's date). Streamed
+    lists (?stream=) are not cached.
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if 'stream' in request.query_params:
+            return method(self, request, *args, **kwargs)
+
+        stamps        = versions(self.cache_models)
+        vary          = self.cache_vary(request) if hasattr(self, 'cache_vary') else ''
+        etag          = _etag(request, [vary, *(token for token, _ in stamps)])
+        last_modified = max(ts for _, ts in stamps)
+        headers       = {'ETag': etag, 'Last-Modified': http_date(last_modified),
+                         'Cache-Control': 'no-cache'}
+
+        if _not_modified(request, etag, last_modified):
+            _count('not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={**headers, 'X-Cache': 'HIT'})
+
+        key    = f'health_app:response:{etag}'
+        cached = _cache().get(key)
+        if cached is not None:
+            _count('hits')
+            return Response(cached, headers={**headers, 'X-Cache': 'HIT'})
+
+        _count('misses')
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            _cache().set(key, response.data, RESPONSE_TTL)
+            for name, value in {**headers, 'X-Cache': 'MISS'}.items():
+                response[name] = value
+        return response
+    return wrapper
+
+class CachedResponseMixin:
+    """Cache list and retrieve; decorate extra GET actions with cached_response."""
+    cache_models = ()
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
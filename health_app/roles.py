@@ -0,0 +1,71 @@
+"""
+Cached role resolution.
+
+A user's group names and (for doctors) their program are loaded with one
+query, kept on the user object for the rest of the request and in the
+response cache (response_cache.CACHE_ALIAS) across requests. Any change
+to group membership, groups, doctor profiles or programs bumps a
+generation counter (see signals.py), which invalidates every cached entry
+at once: when the change is made, and again when its transaction commits,
+so an entry another worker loaded from the not yet committed state is
+dropped too. The bump reaches every worker once HEALTH_CACHE names a
+shared backend (file or redis); the locmem default is per process.
+"""
+from django.core.cache import caches
+from django.db         import transaction
+from django.http       import Http404
+
+from .models import DoctorProfile
+from . import response_cache
+
+ROLE_CACHE_TIMEOUT = 300
+GENERATION_KEY     = 'health_app:roles:generation'
+
+def _cache():
+    return caches[response_cache.CACHE_ALIAS]
+
+def _generation():
+    return _cache().get_or_set(GENERATION_KEY, 1, None)
+
+def _bump():
+    cache = _cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+def invalidate_roles():
+    """Drop every cached role entry (called from the membership signals)."""
+    _bump()
+    transaction.on_commit(_bump)
+
+def _load(user):
+    profile = DoctorProfile.objects.select_related('program').filter(user=user).first()
+    return {
+        'roles':   frozenset(user.groups.values_list('name', flat=True)),
+        'program': profile.program if profile else None,
+    }
+
+def _entry(user):
+    entry = getattr(user, '_health_roles', None)
+    if entry is None:
+        key   = f'health_app:roles:{_generation()}:{user.pk}'
+        entry = _cache().get(key)
+        if entry is None:
+            entry = _load(user)
+            _cache().set(key, entry, ROLE_CACHE_TIMEOUT)
+        user._health_roles = entry
+    return entry
+
+def get_roles(user):
+    """Frozenset of the user's group names (empty for anonymous users)."""
+    if not user.is_authenticated:
+        return frozenset()
+    return _entry(user)['roles']
+
+def doctor_program(user):
+    """The Program of the user's DoctorProfile; Http404 if they have none."""
+    program = _entry(user)['program'] if user.is_authenticated else None
+    if program is None:
+        raise Http404('No DoctorProfile matches the given query.')
+    return program
@@ -0,0 +1,216 @@
+"""
+Patient search index.
+
+Names and contacts are normalized (case-folded and accents stripped;
+contacts in their canonical form, see contacts.py) and matched by substring, prefix and — when nothing
+matches exactly — fuzzily on shared trigrams, best matches first.
+
+Backends, picked per database connection:
+
+    fts5     SQLite: the health_app_patient_search FTS5 table (trigram
+             tokenizer, bm25 ranking), kept in sync by signals.py and
+             index_patients() for bulk inserts.
+    trigram  PostgreSQL: the pg_trgm GIN indexes from 0003, ranked by
+             similarity(); fuzzy matches use the % operator.
+    like     anything else: icontains scans (unindexed).
+
+`manage.py rebuild_search_index` repopulates the FTS5 table.
+"""
+import re
+import unicodedata
+
+from django.db        import connection
+from django.db.models import Case, When, Q, F, Func, Value, FloatField, Lookup, CharField
+from django.db.models.functions import Greatest
+from rest_framework.filters import BaseFilterBackend
+
+from .contacts import normalize_contact
+from .models   import Patient
+
+FTS_TABLE        = 'health_app_patient_search'
+SEARCH_LIMIT     = 1000   # candidates considered per query
+MIN_GRAM         = 3      # the trigram tokenizer cannot match shorter terms
+COLUMNS          = ('name', 'contact')
+
+# ────────────────────────────────────────────────────────────────────────────────
+# NORMALIZATION
+# ────────────────────────────────────────────────────────────────────────────────
+
+def normalize_text(value):
+    """Lower-case, accent-free, single-spaced."""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', value.casefold()))
+
+def index_contact(value):
+    """A contact as the index stores it: canonical, or as text if it has no canonical form."""
+    return normalize_contact(value) or normalize_text(value)
+
+def _terms(q, columns=COLUMNS):
+    terms = normalize_text(q).split()
+    if 'contact' in columns:
+        # typed numbers in the stored form: '0712' → '254712'
+        terms = [normalize_contact(t) or t if t.isdigit() else t for t in terms]
+    return terms
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BACKEND SELECTION
+# ────────────────────────────────────────────────────────────────────────────────
+
+def backend():
+    """'fts5', 'trigram' or 'like' for the default connection."""
+    cached = getattr(connection, '_health_search_backend', None)
+    if cached is None:
+        if connection.vendor == 'sqlite':
+            cached = 'fts5' if FTS_TABLE in connection.introspection.table_names() else 'like'
+        elif connection.vendor == 'postgresql':
+            cached = 'trigram'
+        else:
+            cached = 'like'
+        connection._health_search_backend = cached
+    return cached
+
+# ────────────────────────────────────────────────────────────────────────────────
+# INDEX MAINTENANCE (fts5 only; the other backends index the table itself)
+# ────────────────────────────────────────────────────────────────────────────────
+
+def index_patients(patients):
+    """Add or refresh index rows for saved Patient instances."""
+    if backend() != 'fts5':
+        return
+    rows = [(p.pk, normalize_text(p.name), index_contact(p.contact)) for p in patients]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(r[0],) for r in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, contact) VALUES (%s, %s, %s)', rows)
+
+def unindex_patients(patient_ids):
+    if backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in patient_ids])
+
+def rebuild_index(batch_size=2000):
+    """Repopulate the whole FTS5 table from Patient; returns rows indexed."""
+    if backend() != 'fts5':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    count, batch = 0, []
+    for patient in Patient.objects.only('id', 'name', 'contact').iterator(chunk_size=batch_size):
+        batch.append(patient)
+        if len(batch) == batch_size:
+            index_patients(batch)
+            count, batch = count + len(batch), []
+    index_patients(batch)
+    return count + len(batch)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# QUERIES
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def _fts_ids(expression, limit, queryset):
+    # the queryset's filters go into the same statement, ahead of the LIMIT,
+    # so the top `limit` ids are the best matches *within* it
+    sql, params = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+    if queryset.query.where:
+        subquery, sub_params = queryset.order_by().values('pk').query.sql_with_params()
+        sql, params = f'{sql} AND rowid IN ({subquery})', params + list(sub_params)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} ORDER BY bm25({FTS_TABLE}) LIMIT %s', params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+def _fts_search(terms, columns, limit, queryset):
+    """Ranked ids from `queryset`, or None if no term is long enough for the index."""
+    scope = '' if columns == COLUMNS else '{' + ' '.join(columns) + '} : '
+    long_terms = [t for t in terms if len(t) >= MIN_GRAM]
+    if not long_terms:
+        return None
+    ids = _fts_ids(' AND '.join(scope + _fts_phrase(t) for t in long_terms), limit, queryset)
+    if not ids:
+        # fuzzy: any shared trigram, most shared first
+        grams = {t[i:i + MIN_GRAM] for t in long_terms for i in range(len(t) - MIN_GRAM + 1)}
+        ids = _fts_ids(' OR '.join(scope + _fts_phrase(g) for g in sorted(grams)), limit, queryset)
+    return ids
+
+@CharField.register_lookup
+class TrigramSimilar(Lookup):
+    """pg_trgm's `%` operator on UPPER(col), matching the 0003 GIN indexes."""
+    lookup_name = 'health_trgm_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'UPPER({lhs}::text) %% UPPER({rhs})', lhs_params + rhs_params
+
+def _ordered(queryset, ids):
+    if not ids:
+        return queryset.none()
+    order = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)])
+    return queryset.filter(pk__in=ids).order_by(order)
+
+def _like_filter(terms, columns):
+    condition = Q()
+    for term in terms:
+        term_q = Q()
+        for column in columns:
+            term_q |= Q(**{f'{column}__icontains': term})
+            if column == 'contact':     # typed numbers are canonical (_terms)
+                term_q |= Q(contact_normalized__icontains=term)
+        condition &= term_q
+    return condition
+
+def _similarity(q, columns):
+    # pg_trgm similarity to whichever searched column matches best
+    scores = [Func(F(column), Value(q), function='similarity', output_field=FloatField())
+              for column in columns]
+    return Greatest(*scores) if len(scores) > 1 else scores[0]
+
+def search_patients(q, queryset=None, columns=COLUMNS, limit=SEARCH_LIMIT):
+    """
+    Patients from `queryset` (default: all) matching every term of `q` in
+    any of `columns`, best match first. An empty query returns `queryset`.
+    """
+    queryset = Patient.objects.all() if queryset is None else queryset
+    terms    = _terms(q, columns)
+    if not terms:
+        return queryset
+
+    kind = backend()
+    if kind == 'fts5':
+        short    = [t for t in terms if len(t) < MIN_GRAM]
+        filtered = queryset.filter(_like_filter(short, columns))
+        ids = _fts_search(terms, columns, limit, filtered)
+        if ids is not None:
+            return _ordered(filtered, ids)
+    elif kind == 'trigram':
+        exact = queryset.filter(_like_filter(terms, columns))
+        rank  = _similarity(q, columns)
+        if exact.exists():
+            return exact.annotate(search_rank=rank).order_by('-search_rank', 'pk')
+        fuzzy = Q()
+        for column in columns:
+            fuzzy |= Q(**{f'{column}__health_trgm_similar': q})
+        ids = queryset.filter(fuzzy).annotate(search_rank=rank) \
+            .order_by('-search_rank', 'pk').values_list('pk', flat=True)[:limit]
+        return _ordered(queryset, list(ids))
+
+    return queryset.filter(_like_filter(terms, columns))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DRF FILTER BACKEND
+# ────────────────────────────────────────────────────────────────────────────────
+
+class PatientSearchFilter(BaseFilterBackend):
+    """?search= through the index, in place of DRF's SearchFilter (LIKE scans)."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        q = request.query_params.get(self.search_param, '')
+        if not q.strip():
+            return queryset
+        return search_patients(q, queryset)
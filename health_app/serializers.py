@@ -1,27 +1,148 @@
 from rest_framework import serializers
-from .models import Program, Patient, Enrollment, Diagnosis
+from django.utils.timezone import localdate
+from .models import Program, Patient, Enrollment, Diagnosis, Job
+from .contacts import normalize_contact
+from .fieldsets import SparseFieldsMixin
+from . import reports
 
-class ProgramSerializer(serializers.ModelSerializer):
+# ?fields= / ?expand= and the .values() list path come from SparseFieldsMixin
+# (see fieldsets.py); `expandable` maps a relation to its nested serializer.
+
+class ProgramSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Program
         fields = '__all__'
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     diagnosis_id = serializers.SerializerMethodField()
+    expandable = {
+        'patient': lambda **kw: PatientSerializer(read_only=True, fields=PATIENT_SUMMARY, **kw),
+        'program': lambda **kw: ProgramSerializer(read_only=True, **kw),
+    }
+    values_sources = {'diagnosis_id': 'first_diagnosis_id'}
     class Meta:
         model = Enrollment
         fields = '__all__'
+        # set on insert; only the importer may give an earlier date (it keeps the report rollups right)
+        read_only_fields = ['enrolled_on']
+    @classmethod
+    def values_queryset(cls):
+        return Enrollment.objects.with_diagnosis_id()
     def get_diagnosis_id(self, obj):
+        # Bulk-annotated by Enrollment.objects.with_diagnosis_id(); fall back
+        # to a per-row lookup only for instances loaded without it.
+        if hasattr(obj, 'first_diagnosis_id'):
+            return obj.first_diagnosis_id
         diag = obj.diagnosis_set.first()
         return diag.id if diag else None
 
-class PatientSerializer(serializers.ModelSerializer):
+PATIENT_SUMMARY = ['id','name','age','gender','contact']
+
+class PatientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     enrollments = EnrollmentSerializer(many=True, read_only=True)
     class Meta:
         model = Patient
-        fields = ['id','name','age','gender','contact','enrollments']
+        fields = PATIENT_SUMMARY + ['enrollments']
+    def validate_contact(self, value):
+        # the same number written differently ('+254 712…' / '0712…') is taken too
+        key   = normalize_contact(value)
+        clash = Patient.objects.filter(contact_normalized=key)
+        if self.instance is not None:
+            clash = clash.exclude(pk=self.instance.pk)
+        if key and clash.exists():
+            raise serializers.ValidationError('patient with this contact already exists.')
+        return value
 
-class DiagnosisSerializer(serializers.ModelSerializer):
+class DiagnosisSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable = {
+        'enrollment': lambda **kw: EnrollmentSerializer(read_only=True, **kw),
+    }
     class Meta:
         model = Diagnosis
         fields = '__all__'
+
+class DiagnosisEntrySerializer(serializers.Serializer):
+    """One entry of a batch diagnosis (see services.diagnose)."""
+    enrollment      = serializers.IntegerField()
+    diagnosis       = serializers.CharField()
+    recommendations = serializers.CharField()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BULK IMPORT ROWS (see importer.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+class PatientImportSerializer(serializers.ModelSerializer):
+    """One import row; contact uniqueness is checked per chunk, not per row."""
+    contact = serializers.CharField(max_length=100)
+    class Meta:
+        model = Patient
+        fields = ['name','age','gender','contact']
+
+class EnrollmentImportSerializer(serializers.Serializer):
+    """One import row; patient/program references are resolved per chunk."""
+    patient      = serializers.IntegerField(required=False)
+    contact      = serializers.CharField(required=False, max_length=100)
+    program      = serializers.IntegerField(required=False)
+    program_name = serializers.CharField(required=False, max_length=100)
+    status       = serializers.ChoiceField(choices=Enrollment.STATUS_CHOICES, default='registered')
+    enrolled_on  = serializers.DateField(required=False)     # historical rows; default today
+
+    def validate_enrolled_on(self, value):
+        if value > localdate():
+            raise serializers.ValidationError('Cannot be in the future.')
+        return value
+
+    def validate(self, attrs):
+        if 'patient' not in attrs and 'contact' not in attrs:
+            raise serializers.ValidationError('Give patient (id) or contact.')
+        if 'program' not in attrs and 'program_name' not in attrs:
+            raise serializers.ValidationError('Give program (id) or program_name.')
+        return attrs
+
+# ────────────────────────────────────────────────────────────────────────────────
+# REPORTS (see reports.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+class ReportQuerySerializer(serializers.Serializer):
+    """Query parameters of GET /api/reports/; start/end default to a recent window."""
+    period  = serializers.ChoiceField(choices=list(reports.PERIODS), default='month')
+    start   = serializers.DateField(required=False)
+    end     = serializers.DateField(required=False)
+    program = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        start, end = reports.default_range(attrs['period'])
+        attrs.setdefault('end', end)
+        attrs.setdefault('start', min(start, attrs['end']))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        limit = reports.MAX_SPAN[attrs['period']]
+        if reports.span(attrs['period'], attrs['start'], attrs['end']) > limit:
+            raise serializers.ValidationError(f"At most {limit} {attrs['period']}s per request.")
+        return attrs
+
+# ────────────────────────────────────────────────────────────────────────────────
+# EXPORTS (see exports.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Query parameters of GET /api/exports/…; the dates are inclusive."""
+    program = serializers.IntegerField(required=False)
+    start   = serializers.DateField(required=False)
+    end     = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return attrs
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BACKGROUND JOBS (see jobs.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+class JobSerializer(serializers.ModelSerializer):
+    """A queued job as GET /api/jobs/{pk}/ reports it; tracebacks stay in the admin."""
+    class Meta:
+        model  = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'created_on',
+                  'run_after', 'started_on', 'finished_on', 'result']
@@ -0,0 +1,338 @@
+"""
+In-process service layer shared by the DRF viewsets and the HTML views.
+
+The HTML views used to reach the API over HTTP (127.0.0.1:8000/api/), which
+costs a second round trip per page and can deadlock a single-worker server.
+Both sides now call these functions directly; writes still go through the
+API serializers so validation and the response shape stay identical.
+"""
+from datetime import timedelta
+
+from django.contrib.auth          import get_user_model
+from django.core.cache            import caches
+from django.db                    import IntegrityError, transaction
+from django.db.models             import Q, F, Exists, OuterRef, Prefetch
+from django.urls                  import reverse
+from django.utils.dateparse       import parse_date
+from django.utils.timezone        import now
+from rest_framework.exceptions    import ValidationError
+
+from .models      import Program, Patient, Enrollment, Diagnosis
+from .serializers import PatientSerializer, EnrollmentSerializer, DiagnosisSerializer
+from .contacts    import normalize_contact
+from . import stats, search, response_cache, timeline, fragments
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PATIENTS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def patient_queryset(params=None):
+    """
+    Patients with nested enrollments, narrowed by the API query filters
+    (contact, date, month, year, program_id). The enrollment filters are
+    one EXISTS subquery (a patient matches if one enrollment satisfies all
+    of them), so no join fan-out and no DISTINCT over the result.
+    """
+    params = params or {}
+    qs = Patient.objects.prefetch_related(Prefetch(
+        'enrollments',
+        queryset=Enrollment.objects.select_related('program').with_diagnosis_id(),
+    ))
+
+    contact    = params.get('contact')
+    date       = params.get('date')
+    month      = params.get('month')
+    year       = params.get('year')
+    program_id = params.get('program_id')
+
+    if contact:
+        # exact, in canonical form (contacts.py); fuzzy matching is ?search='s
+        key = normalize_contact(contact)
+        qs  = qs.filter(contact_normalized=key) if key else qs.none()
+
+    enrollment = {}
+    if date:
+        try:
+            enrollment['enrolled_on'] = parse_date(date)
+        except ValueError:
+            pass
+    if month:
+        enrollment['enrolled_on__month'] = month
+    if year:
+        enrollment['enrolled_on__year'] = year
+    if program_id:
+        enrollment['program_id'] = program_id
+    if enrollment:
+        qs = qs.filter(Exists(Enrollment.objects.filter(patient=OuterRef('pk'), **enrollment)))
+    return qs
+
+def search_patients(q=''):
+    """
+    Same matching as the API's ?search= (see search.py), best match first.
+    """
+    return search.search_patients(q, patient_queryset())
+
+def program_patients(program, q=''):
+    """
+    Patients enrolled in `program`, searched by name, each with its
+    enrollments in that program prefetched (oldest first).
+    """
+    qs = Patient.objects.filter(enrollments__program=program).distinct().prefetch_related(Prefetch(
+        'enrollments',
+        queryset=Enrollment.objects.filter(program=program).order_by('id'),
+    ))
+    return search.search_patients(q, qs, columns=('name',))
+
+def lookup_patient(contact):
+    """
+    The timeline document (see timeline.py) of the patient with this
+    contact in any of its written forms, with program_name on each
+    enrollment and event and by_name on events; None if nobody matches.
+    One indexed read plus the names of the programs and users it refers to.
+    """
+    document = timeline.get_by_contact(contact) if contact else None
+    if document is None:
+        return None
+    programs = dict(Program.objects.filter(id__in={e['program'] for e in document['enrollments']})
+                    .values_list('id', 'name'))
+    by       = {e['by'] for e in document['events'] if e.get('by')}
+    users    = dict(get_user_model().objects.filter(id__in=by).values_list('id', 'username')) if by else {}
+    for entry in (*document['enrollments'], *document['events']):
+        entry['program_name'] = programs.get(entry['program'])
+    for event in document['events']:
+        event['by_name'] = users.get(event.get('by'))
+    return document
+
+def get_patient(pk):
+    """Serialized patient (as GET /api/patients/{pk}/ returns it), or None."""
+    patient = patient_queryset().filter(pk=pk).first()
+    return PatientSerializer(patient).data if patient else None
+
+def create_patient(data):
+    """
+    Validate and save a patient; returns the serialized row.
+    Raises rest_framework.exceptions.ValidationError on bad input.
+    """
+    serializer = PatientSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return serializer.data
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PROGRAMS
+# ────────────────────────────────────────────────────────────────────────────────
+
+PROGRAMS_CACHE = 'health_app:programs'
+PROGRAMS_TTL   = 600
+
+def _cache():
+    return caches[response_cache.CACHE_ALIAS]
+
+def program_choices():
+    """
+    [(id, name), …] of every program, for form choices. Kept in the shared
+    cache until a Program is saved or deleted (signals.py).
+    """
+    choices = _cache().get(PROGRAMS_CACHE)
+    if choices is None:
+        choices = list(Program.objects.order_by('id').values_list('id', 'name'))
+        _cache().set(PROGRAMS_CACHE, choices, PROGRAMS_TTL)
+    return choices
+
+def _drop_programs():
+    _cache().delete(PROGRAMS_CACHE)
+
+def invalidate_programs():
+    """Drop the cached list now and again on commit (as roles.invalidate_roles)."""
+    _drop_programs()
+    transaction.on_commit(_drop_programs)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ENROLLMENTS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def enrollment_queryset(q=''):
+    """Enrollments with patient/program joined, optionally searched by name."""
+    qs = Enrollment.objects.select_related('patient', 'program').with_diagnosis_id()
+    for term in q.split():
+        qs = qs.filter(Q(patient__name__icontains=term) | Q(program__name__icontains=term))
+    return qs
+
+def create_enrollment(data):
+    """Validate and save an enrollment; returns the serialized row."""
+    serializer = EnrollmentSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return serializer.data
+
+def update_enrollment(enrollment, data, partial=True):
+    """Validate and apply changes to an enrollment; returns the serialized row."""
+    serializer = EnrollmentSerializer(enrollment, data=data, partial=partial)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return serializer.data
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DIAGNOSES
+# ────────────────────────────────────────────────────────────────────────────────
+
+ALREADY_DIAGNOSED = 'This enrollment already has a diagnosis.'
+MAX_DIAGNOSIS_BATCH = 200
+
+def _consult(enrollment_id):
+    # the diagnosis moves a registered enrollment on; later states stay.
+    # QuerySet.update() skips signals: the Diagnosis insert that follows
+    # refreshes the timeline and bumps the response cache.
+    Enrollment.objects.filter(pk=enrollment_id, status='registered').update(status='consulted')
+
+def create_diagnosis(data):
+    """
+    Validate and save a diagnosis and mark its enrollment consulted, in one
+    transaction; returns the serialized row. A second diagnosis for the same
+    enrollment is refused by the diagnosis_enrollment_unique constraint.
+    """
+    serializer = DiagnosisSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        with transaction.atomic():
+            _consult(serializer.validated_data['enrollment'].pk)
+            serializer.save()
+    except IntegrityError:   # lost a race the serializer's pre-check could not see
+        raise ValidationError({'enrollment': [ALREADY_DIAGNOSED]})
+    response_cache.bump(Enrollment)
+    return serializer.data
+
+def diagnose(entries, user, program=None):
+    """
+    Diagnose a batch of enrollments in one transaction.
+
+    entries are validated DiagnosisEntrySerializer rows ({enrollment,
+    diagnosis, recommendations}). Each diagnosis is inserted together with
+    its enrollment's move to consulted inside a savepoint, in ascending
+    enrollment order: if the unique constraint rejects it (diagnosed
+    already, by this batch or a concurrent request) only that entry is
+    rolled back. With `program`, enrollments of other programs count as
+    missing.
+
+    Returns {'created': [...serialized diagnoses], 'conflicts': [...], 'missing': [...]}
+    (enrollment ids).
+    """
+    result  = {'created': [], 'conflicts': [], 'missing': []}
+    entries = sorted(entries, key=lambda e: e['enrollment'])
+    ids     = {e['enrollment'] for e in entries}
+
+    with transaction.atomic():
+        enrollments = Enrollment.objects.filter(pk__in=ids).order_by('pk')
+        if program is not None:
+            enrollments = enrollments.filter(program=program)
+        # locks the rows where supported, so they cannot be deleted meanwhile
+        found = set(enrollments.select_for_update().values_list('pk', flat=True))
+        for entry in entries:
+            eid = entry['enrollment']
+            if eid not in found:
+                result['missing'].append(eid)
+                continue
+            try:
+                with transaction.atomic():
+                    _consult(eid)
+                    diagnosis = Diagnosis.objects.create(
+                        enrollment_id=eid, diagnosis=entry['diagnosis'],
+                        recommendations=entry['recommendations'], created_by=user,
+                    )
+            except IntegrityError:
+                result['conflicts'].append(eid)
+            else:
+                result['created'].append(DiagnosisSerializer(diagnosis).data)
+        if result['created']:
+            response_cache.bump(Enrollment)
+    return result
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PHARMACY QUEUE
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Re-send changes this far before the client's `since`, so rows whose
+# transaction committed after their timestamp was taken are not missed.
+# Clients de-duplicate by id.
+QUEUE_POLL_OVERLAP = timedelta(seconds=5)
+
+def pending_queue():
+    """Undispensed diagnoses, oldest first (served by diag_pending_created_idx)."""
+    return Diagnosis.objects.filter(dispensed=False) \
+        .select_related('enrollment__patient', 'enrollment__program') \
+        .order_by('created_on', 'id')
+
+def dispensed_history(since):
+    """Diagnoses dispensed at or after `since`, newest first."""
+    return Diagnosis.objects.filter(dispensed=True, dispensed_on__gte=since) \
+        .select_related('enrollment__patient', 'enrollment__program') \
+        .order_by('-dispensed_on', '-id')
+
+def _queue_rows(qs):
+    rows = qs.values(
+        'id', 'enrollment_id', 'created_on', 'dispensed_on',
+        patient=F('enrollment__patient__name'),
+        program=F('enrollment__program__name'),
+    )
+    for row in rows:
+        row['dispense_url'] = reverse('health_app:dispense', args=[row['id'], row['enrollment_id']])
+        yield row
+
+def queue_changes(since):
+    """
+    Queue deltas since a timestamp: newly pending diagnoses and ones that
+    have been dispensed. Both lookups are range scans on the partial
+    indexes, so the cost tracks the number of changes, not the table size.
+    """
+    since = since - QUEUE_POLL_OVERLAP
+    return {
+        'pending':   list(_queue_rows(Diagnosis.objects.filter(dispensed=False, created_on__gt=since)
+                                      .order_by('created_on', 'id'))),
+        'dispensed': list(_queue_rows(Diagnosis.objects.filter(dispensed=True, dispensed_on__gt=since)
+                                      .order_by('dispensed_on', 'id'))),
+    }
+
+MAX_DISPENSE_BATCH = 200
+
+def dispense(diagnosis_ids, user):
+    """
+    Dispense a batch of diagnoses in one transaction.
+
+    Each row is claimed with a conditional `UPDATE … WHERE dispensed = false`,
+    so of several pharmacists racing for the same item exactly one wins —
+    on PostgreSQL the row lock makes the loser wait and then match nothing,
+    on SQLite the write lock serializes the statements. Ids are claimed in
+    ascending order so concurrent batches cannot deadlock.
+
+    Returns {'dispensed': [...], 'conflicts': [...], 'missing': [...]} where
+    conflicts were already dispensed and missing do not exist. Ids must be
+    ints: anything else (a string, a float, a bool) raises TypeError.
+    """
+    ids = list(diagnosis_ids)
+    if any(type(pk) is not int for pk in ids):
+        raise TypeError('Diagnosis ids must be integers.')
+    ids    = sorted(set(ids))
+    stamp  = now()
+    result = {'dispensed': [], 'conflicts': [], 'missing': []}
+
+    with transaction.atomic():
+        for pk in ids:
+            claimed = Diagnosis.objects.filter(pk=pk, dispensed=False) \
+                .update(dispensed=True, dispensed_on=stamp, dispensed_by=user)
+            result['dispensed' if claimed else 'conflicts'].append(pk)
+
+        if result['conflicts']:
+            existing = set(Diagnosis.objects.filter(pk__in=result['conflicts'])
+                           .values_list('pk', flat=True))
+            result['missing']   = [pk for pk in result['conflicts'] if pk not in existing]
+            result['conflicts'] = [pk for pk in result['conflicts'] if pk in existing]
+
+        won = result['dispensed']
+        if won:
+            Enrollment.objects.filter(diagnosis__in=won).update(status='dispensed')
+            # QuerySet.update() bypasses the counter signals.
+            stats.bump({'dispensed': len(won), 'pending': -len(won)})
+            response_cache.bump(Diagnosis, Enrollment, Patient)
+            fragments.bump(Diagnosis, won)
+            timeline.refresh_for_diagnoses(won)
+    return result
@@ -0,0 +1,163 @@
+from django.contrib.auth         import get_user_model
+from django.contrib.auth.models  import Group
+from django.db.models.signals    import post_init, post_save, pre_delete, post_delete, m2m_changed
+from django.db.models            import Q
+from django.dispatch             import receiver
+
+from .models import Program, Patient, Enrollment, Diagnosis, DoctorProfile, StatCounter
+from .roles  import invalidate_roles
+from . import stats, search, services, response_cache, timeline, fragments
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ROLE CACHE INVALIDATION
+# ────────────────────────────────────────────────────────────────────────────────
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def groups_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_roles()
+
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=DoctorProfile)
+@receiver([post_save, post_delete], sender=Program)
+def role_source_changed(sender, **kwargs):
+    invalidate_roles()
+
+@receiver([post_save, post_delete], sender=Program)
+def program_changed(sender, **kwargs):
+    services.invalidate_programs()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# MATERIALIZED COUNTERS (see stats.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_init, sender=Enrollment)
+@receiver(post_init, sender=Diagnosis)
+def remember_counted_state(sender, instance, **kwargs):
+    # The values the counters currently reflect, to diff against on save.
+    # Read from __dict__ so deferred fields are not fetched.
+    values = instance.__dict__
+    if sender is Enrollment:
+        instance._stats_state = values.get('program_id')
+    else:
+        instance._stats_state = (values.get('dispensed'), values.get('created_by_id'))
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump({'patients': 1})
+
+@receiver(post_delete, sender=Patient)
+def patient_deleted(sender, instance, **kwargs):
+    stats.bump({'patients': -1})
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, **kwargs):
+    old = instance._stats_state
+    new = instance.program_id
+    if created:
+        stats.bump({'enrollments': 1, stats.program_key(new): 1})
+    elif old != new:
+        stats.bump({stats.program_key(old): -1, stats.program_key(new): 1})
+    instance._stats_state = new
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    stats.bump({'enrollments': -1, stats.program_key(instance._stats_state): -1})
+
+@receiver(post_save, sender=Diagnosis)
+def diagnosis_saved(sender, instance, created, **kwargs):
+    new = (instance.dispensed, instance.created_by_id)
+    if created:
+        stats.bump(stats.diagnosis_deltas(*new))
+    elif instance._stats_state != new:
+        stats.bump(stats.merge(stats.diagnosis_deltas(*instance._stats_state, sign=-1),
+                               stats.diagnosis_deltas(*new)))
+    instance._stats_state = new
+
+@receiver(post_delete, sender=Diagnosis)
+def diagnosis_deleted(sender, instance, **kwargs):
+    stats.bump(stats.diagnosis_deltas(*instance._stats_state, sign=-1))
+
+@receiver(pre_delete, sender=get_user_model())
+def doctor_deleted(sender, instance, **kwargs):
+    # created_by is SET_NULL through a bulk UPDATE (no save signals), so move
+    # the doctor's count to the 'none' bucket here.
+    counter = StatCounter.objects.filter(name=stats.doctor_key(instance.pk)).first()
+    if counter and counter.value:
+        stats.bump({counter.name: -counter.value, stats.doctor_key(None): counter.value})
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PATIENT SEARCH INDEX (see search.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Patient)
+def patient_indexed(sender, instance, **kwargs):
+    search.index_patients([instance])
+
+@receiver(post_delete, sender=Patient)
+def patient_unindexed(sender, instance, **kwargs):
+    search.unindex_patients([instance.pk])
+
+# ────────────────────────────────────────────────────────────────────────────────
+# RESPONSE CACHE VERSIONS (see response_cache.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+@receiver([post_save, post_delete], sender=Program)
+@receiver([post_save, post_delete], sender=Patient)
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Diagnosis)
+def api_model_changed(sender, **kwargs):
+    response_cache.bump(sender)
+
+@receiver(pre_delete, sender=get_user_model())
+def diagnosis_users_changed(sender, **kwargs):
+    # created_by / dispensed_by are nulled by a bulk UPDATE.
+    response_cache.bump(Diagnosis)
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, update_fields=None, **kwargs):
+    # usernames appear in the admin overview; logins only touch last_login
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        response_cache.bump(sender)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# FRAGMENT CACHE OBJECT VERSIONS (see fragments.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+@receiver([post_save, post_delete], sender=Program)
+@receiver([post_save, post_delete], sender=Patient)
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Diagnosis)
+def object_changed(sender, instance, **kwargs):
+    fragments.bump(sender, [instance.pk])
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PATIENT TIMELINES (see timeline.py)
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _patient_deleted(origin):
+    # rows cascading from a patient deletion: its timeline goes with it
+    return isinstance(origin, Patient) or getattr(origin, 'model', None) is Patient
+
+@receiver(post_save, sender=Patient)
+def patient_timeline(sender, instance, **kwargs):
+    timeline.refresh([instance.pk])
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_timeline(sender, instance, origin=None, **kwargs):
+    if not _patient_deleted(origin):
+        timeline.refresh([instance.patient_id])
+
+@receiver([post_save, post_delete], sender=Diagnosis)
+def diagnosis_timeline(sender, instance, origin=None, **kwargs):
+    if not _patient_deleted(origin):
+        timeline.refresh(Enrollment.objects.filter(pk=instance.enrollment_id)
+                         .values_list('patient_id', flat=True))
+
+@receiver(pre_delete, sender=get_user_model())
+def user_timelines(sender, instance, **kwargs):
+    # created_by / dispensed_by are nulled by a bulk UPDATE during the delete
+    patient_ids = set(Diagnosis.objects.filter(Q(created_by=instance) | Q(dispensed_by=instance))
+                      .values_list('enrollment__patient_id', flat=True))
+    timeline.refresh(patient_ids)
@@ -0,0 +1,118 @@
+"""
+Materialized counters for the admin overview and dashboard.
+
+Each figure lives in one StatCounter row:
+
+    patients, enrollments, diagnoses, dispensed, pending
+    program:<program_id>   enrollments per program
+    doctor:<user_id>       diagnoses per doctor ('doctor:none' if unknown)
+
+The signal receivers in signals.py apply deltas inside the writing
+transaction, so a rolled-back write never moves a counter. Bulk writes
+that skip model signals (bulk_create, QuerySet.update) must call bump()
+themselves. `manage.py rebuild_stats` recomputes everything to fix drift.
+"""
+from django.contrib.auth import get_user_model
+from django.db           import IntegrityError, transaction
+from django.db.models    import Count, F
+
+from .models import Program, Patient, Enrollment, Diagnosis, StatCounter
+
+TOTALS = ('patients', 'enrollments', 'diagnoses', 'dispensed', 'pending')
+
+def program_key(program_id):
+    return f'program:{program_id}'
+
+def doctor_key(user_id):
+    return f'doctor:{user_id if user_id is not None else "none"}'
+
+def diagnosis_deltas(dispensed, created_by_id, sign=1):
+    """Counter deltas for adding (sign=1) or removing (sign=-1) one diagnosis."""
+    return {
+        'diagnoses':                sign,
+        'dispensed' if dispensed else 'pending': sign,
+        doctor_key(created_by_id):  sign,
+    }
+
+def bump(deltas):
+    """Apply {counter name: delta}; missing counters are created."""
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        if StatCounter.objects.filter(name=name).update(value=F('value') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                StatCounter.objects.create(name=name, value=delta)
+        except IntegrityError:
+            StatCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+def merge(*deltas):
+    """Sum several delta dicts into one."""
+    total = {}
+    for d in deltas:
+        for name, delta in d.items():
+            total[name] = total.get(name, 0) + delta
+    return total
+
+# ────────────────────────────────────────────────────────────────────────────────
+# FULL REBUILD
+# ────────────────────────────────────────────────────────────────────────────────
+
+def compute():
+    """Every counter recomputed from the source tables."""
+    values = {
+        'patients':    Patient.objects.count(),
+        'enrollments': Enrollment.objects.count(),
+        'diagnoses':   Diagnosis.objects.count(),
+        'dispensed':   Diagnosis.objects.filter(dispensed=True).count(),
+        'pending':     Diagnosis.objects.filter(dispensed=False).count(),
+    }
+    for row in Enrollment.objects.values('program_id').annotate(n=Count('id')):
+        values[program_key(row['program_id'])] = row['n']
+    for row in Diagnosis.objects.values('created_by_id').annotate(n=Count('id')):
+        values[doctor_key(row['created_by_id'])] = row['n']
+    return values
+
+@transaction.atomic
+def rebuild():
+    """Replace all counters with freshly computed values; returns them."""
+    values = compute()
+    StatCounter.objects.all().delete()
+    StatCounter.objects.bulk_create(StatCounter(name=n, value=v) for n, v in values.items())
+    return values
+
+# ────────────────────────────────────────────────────────────────────────────────
+# READS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def total(name):
+    """One counter's current value (0 if it was never bumped)."""
+    return StatCounter.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+def overview():
+    """
+    Totals plus per-program and per-doctor breakdowns, shaped like the old
+    values()/annotate() rows the templates iterate.
+    """
+    counters = dict(StatCounter.objects.values_list('name', 'value'))
+    data     = {name: counters.get(name, 0) for name in TOTALS}
+
+    by_program = {int(n.split(':', 1)[1]): v for n, v in counters.items()
+                  if n.startswith('program:') and v}
+    by_doctor  = {n.split(':', 1)[1]: v for n, v in counters.items()
+                  if n.startswith('doctor:') and v}
+
+    programs = Program.objects.in_bulk(list(by_program))
+    users    = get_user_model().objects.in_bulk([int(k) for k in by_doctor if k != 'none'])
+
+    data['programs_summary'] = [
+        {'program__name': programs[pid].name, 'count': v}
+        for pid, v in by_program.items() if pid in programs
+    ]
+    data['doctor_diagnoses'] = [
+        {'created_by__username': users[int(k)].username if k != 'none' and int(k) in users else None,
+         'count': v}
+        for k, v in by_doctor.items()
+    ]
+    return data
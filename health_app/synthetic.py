@@ -0,0 +1,186 @@
+"""
+Synthetic data for benchmarks and load tests.
+
+generate() bulk-inserts a reproducible dataset (same seed, same rows):
+
+    programs     Zipf-sized: a couple of large programs and a long tail
+    patients     adult-skewed ages, mixed genders, unique contacts
+    enrollments  1 + geometric per patient in distinct programs, dated
+                 over the last `days` days with more recent activity
+    diagnoses    for a share of enrollments, a few days after enrolment,
+                 by the program's doctor; most dispensed within two days
+                 by a pharmacist, older ones first. Enrollment status
+                 follows (registered → consulted → dispensed).
+    users        bench-receptionist, bench-pharmacist, bench-admin (staff)
+                 and bench-doctor-<program id> per program
+
+Inserts bypass signals, so the derived state is rebuilt at the end
+(counters, search index, response cache versions, the cached program
+list; timelines are built on first read). Rows dated into report periods
+already rolled up are added to those rollups (reports.add_backdated).
+Running it again adds another batch.
+"""
+import datetime
+import random
+from itertools import chain, count as itertools_count
+
+from django.contrib.auth        import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db                  import transaction
+from django.utils               import timezone
+
+from .contacts import normalize_contact
+from .models import Program, Patient, Enrollment, Diagnosis, DoctorProfile
+from . import stats, search, response_cache, reports, services
+
+BATCH_SIZE = 2000
+
+FIRST_NAMES = ('Amina', 'Brian', 'Faith', 'John', 'Grace', 'Peter', 'Mary', 'Kevin', 'Esther',
+               'David', 'Wanjiru', 'Otieno', 'Achieng', 'Mwangi', 'Njeri', 'Kiprop', 'Halima', 'Musa')
+LAST_NAMES  = ('Odhiambo', 'Kamau', 'Wambui', 'Mutua', 'Chebet', 'Omondi', 'Njoroge', 'Kariuki',
+               'Atieno', 'Kiplagat', 'Mohamed', 'Wekesa', 'Nyambura', 'Ochieng', 'Korir', 'Ali')
+PROGRAM_NAMES = ('HIV', 'TB', 'Malaria', 'Diabetes', 'Hypertension', 'Maternal Health',
+                 'Nutrition', 'Mental Health', 'Immunization', 'Family Planning')
+DIAGNOSES = ('Acute infection', 'Follow-up, stable', 'Medication adjustment', 'Side effects',
+             'Routine review', 'Worsening symptoms')
+GENDERS   = (('Female', 52), ('Male', 46), ('Other', 2))
+
+ROLE_USERS = {'bench-receptionist': 'Receptionist', 'bench-pharmacist': 'Pharmacist'}
+
+# ────────────────────────────────────────────────────────────────────────────────
+# USERS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _users(programs, password):
+    """One user per role plus a doctor per program; returns (doctors, pharmacist)."""
+    User   = get_user_model()
+    hashed = make_password(password)   # None → unusable password
+    groups = {name: Group.objects.get_or_create(name=name)[0]
+              for name in ('Receptionist', 'Doctor', 'Pharmacist')}
+
+    def user(username, group=None, **extra):
+        obj, created = User.objects.get_or_create(username=username, defaults={'password': hashed, **extra})
+        if group:
+            obj.groups.add(groups[group])
+        return obj
+
+    for username, group in ROLE_USERS.items():
+        user(username, group)
+    user('bench-admin', is_staff=True, is_superuser=True)
+    doctors = {}
+    for program in programs:
+        doctors[program.pk] = user(f'bench-doctor-{program.pk}', 'Doctor')
+        DoctorProfile.objects.get_or_create(user=doctors[program.pk], defaults={'program': program})
+    return doctors, User.objects.get(username='bench-pharmacist')
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ROWS
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _programs(count):
+    taken = set(Program.objects.values_list('name', flat=True))
+    names = (name for name in chain(PROGRAM_NAMES, (f'Program {i}' for i in itertools_count(1)))
+             if name not in taken)
+    return Program.objects.bulk_create([Program(name=next(names)) for _ in range(count)])
+
+def _patients(rng, start, count):
+    patients = []
+    for i in range(start, start + count):
+        age = min(95, max(0, round(rng.gauss(38, 17))))
+        patients.append(Patient(
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            age=age,
+            gender=rng.choices([g for g, _ in GENDERS], [w for _, w in GENDERS])[0],
+            contact=f'07{i:08d}',
+            contact_normalized=normalize_contact(f'07{i:08d}'),   # bulk_create skips save()
+        ))
+    return Patient.objects.bulk_create(patients)
+
+def _enrollments(rng, patients, programs, weights, mean, days, today):
+    p, enrollments = 1 / max(mean, 1), []
+    for patient in patients:
+        count = 1
+        while count < len(programs) and rng.random() > p:
+            count += 1
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(rng.choices(range(len(programs)), weights)[0])
+        for index in chosen:
+            enrollments.append(Enrollment(patient=patient, program=programs[index]))
+    # back-dated, skewed to recent days
+    for e in enrollments:
+        e.enrolled_on = today - datetime.timedelta(days=int(rng.triangular(0, days, 0)))
+    Enrollment.objects.bulk_create(enrollments)
+    return enrollments
+
+def _diagnoses(rng, enrollments, doctors, pharmacist, diagnosed_ratio, dispensed_ratio, now):
+    diagnoses = []
+    for e in enrollments:
+        if rng.random() >= diagnosed_ratio:
+            continue
+        enrolled = timezone.make_aware(datetime.datetime.combine(e.enrolled_on, datetime.time(8)))
+        created  = min(now, enrolled + datetime.timedelta(hours=rng.expovariate(1 / 72)))
+        d = Diagnosis(enrollment=e, diagnosis=rng.choice(DIAGNOSES), recommendations='Review in 4 weeks.',
+                      created_by=doctors[e.program_id])
+        d.created_on = created
+        dispensed_on = created + datetime.timedelta(hours=rng.uniform(1, 48))
+        if dispensed_on < now and rng.random() < dispensed_ratio:
+            d.dispensed, d.dispensed_on, d.dispensed_by = True, dispensed_on, pharmacist
+        e.status = 'dispensed' if d.dispensed else 'consulted'
+        diagnoses.append(d)
+    stamps = [d.created_on for d in diagnoses]
+    Diagnosis.objects.bulk_create(diagnoses)
+    for d, stamp in zip(diagnoses, stamps):   # created_on is auto_now_add as well
+        d.created_on = stamp
+    Diagnosis.objects.bulk_update(diagnoses, ['created_on'], batch_size=BATCH_SIZE)
+    return diagnoses
+
+def _add_backdated(enrollments, diagnoses):
+    # a second run dates rows into periods the first run's reports closed
+    program = {e.pk: e.program_id for e in enrollments}
+    reports.add_backdated('enrollments', [(e.enrolled_on, e.program_id) for e in enrollments])
+    reports.add_backdated('diagnoses', [(timezone.localdate(d.created_on), program[d.enrollment_id])
+                                        for d in diagnoses])
+    reports.add_backdated('dispensed', [(timezone.localdate(d.dispensed_on), program[d.enrollment_id])
+                                        for d in diagnoses if d.dispensed])
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ENTRY POINT
+# ────────────────────────────────────────────────────────────────────────────────
+
+def generate(patients=10000, programs=8, enrollments_per_patient=1.6, diagnosed_ratio=0.6,
+             dispensed_ratio=0.85, days=365, seed=42, password=None):
+    """
+    Insert the dataset described in the module docstring; returns
+    {'programs': [Program, …], 'patients', 'enrollments', 'diagnoses', 'dispensed'}
+    (counts for this run). password=None leaves the bench users unable to
+    log in with a password (tests and in-process benchmarks use force_login).
+    """
+    rng     = random.Random(seed)
+    today   = timezone.localdate()
+    now     = timezone.now()
+    weights = [1 / rank for rank in range(1, programs + 1)]
+    counts  = {'patients': 0, 'enrollments': 0, 'diagnoses': 0, 'dispensed': 0}
+
+    with transaction.atomic():
+        progs               = _programs(programs)
+        doctors, pharmacist = _users(progs, password)
+        start = Patient.objects.count()
+        for offset in range(0, patients, BATCH_SIZE):
+            batch       = _patients(rng, start + offset, min(BATCH_SIZE, patients - offset))
+            enrollments = _enrollments(rng, batch, progs, weights, enrollments_per_patient, days, today)
+            diagnoses   = _diagnoses(rng, enrollments, doctors, pharmacist,
+                                     diagnosed_ratio, dispensed_ratio, now)
+            Enrollment.objects.bulk_update(enrollments, ['status'], batch_size=BATCH_SIZE)
+            _add_backdated(enrollments, diagnoses)
+            counts['patients']    += len(batch)
+            counts['enrollments'] += len(enrollments)
+            counts['diagnoses']   += len(diagnoses)
+            counts['dispensed']   += sum(d.dispensed for d in diagnoses)
+
+    stats.rebuild()   # bulk_create skips the counter and search-index signals
+    search.rebuild_index()
+    response_cache.bump(Program, Patient, Enrollment, Diagnosis)
+    services.invalidate_programs()
+    return {'programs': progs, **counts}
@@ -0,0 +1,29 @@
+"""
+{% fragment name version %}…{% endfragment %}: cache the enclosed output
+under (name, version), see health_app/fragments.py. A None version renders
+the block uncached.
+"""
+from django import template
+
+from health_app import fragments
+
+register = template.Library()
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, version):
+        self.nodelist = nodelist
+        self.name     = name
+        self.version  = version
+
+    def render(self, context):
+        return fragments.cached(self.name, self.version.resolve(context),
+                                lambda: self.nodelist.render(context))
+
+@register.tag('fragment')
+def do_fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a version")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, bits[1], parser.compile_filter(bits[2]))
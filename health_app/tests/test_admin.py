@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from health_app import services, stats
+from health_app.models import Patient, Program, Enrollment, Diagnosis
+from health_app.pagination import CountedPaginator
+
+
+class AdminTestCase(TestCase):
+    """
+    Admin changelists: fixed query counts, counter-backed totals,
+    index-backed search and the mass-dispense action.
+    """
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(self.admin)
+        self.program = Program.objects.create(name='HIV')
+        self.diagnoses = []
+        for i in range(6):
+            patient    = Patient.objects.create(name=f'Patient {i}', age=30, gender='Female', contact=f'07{i:02}')
+            enrollment = Enrollment.objects.create(patient=patient, program=self.program)
+            self.diagnoses.append(Diagnosis.objects.create(enrollment=enrollment, diagnosis='x',
+                                                           recommendations='y'))
+        Patient.objects.create(name='Wanjiru Kamau', age=40, gender='Female', contact='0799')
+
+    def changelist_queries(self, path):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(captured)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        paths = ('/admin/health_app/patient/', '/admin/health_app/enrollment/',
+                 '/admin/health_app/diagnosis/', '/admin/health_app/diagnosis/?dispensed__exact=0')
+        before = [self.changelist_queries(p) for p in paths]
+        for patient in Patient.objects.all():
+            for _ in range(3):
+                Diagnosis.objects.create(enrollment=Enrollment.objects.create(patient=patient, program=self.program),
+                                         diagnosis='x', recommendations='y')
+        self.assertEqual([self.changelist_queries(p) for p in paths], before)
+
+    def test_unfiltered_count_comes_from_the_counter(self):
+        stats.bump({'patients': 1000})       # stand-in for a large table
+        response = self.client.get('/admin/health_app/patient/')
+        self.assertEqual(response.context['cl'].result_count, 1007)
+        response = self.client.get('/admin/health_app/patient/?q=Wanjiru')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'Wanjiru Kamau')
+
+    def test_filtered_count_is_bounded(self):
+        paginator = CountedPaginator(Patient.objects.filter(age=30).order_by('pk'), 2)
+        paginator.count_limit = 4
+        self.assertEqual(paginator.count, 4)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_search_enrollments_by_patient(self):
+        response = self.client.get('/admin/health_app/enrollment/?q=Patient 3')
+        self.assertEqual([e.patient.name for e in response.context['cl'].result_list], ['Patient 3'])
+
+    def test_mass_dispense(self):
+        services.dispense([self.diagnoses[0].pk], self.admin)
+        response = self.client.post('/admin/health_app/diagnosis/', {
+            'action': 'dispense_selected', '_selected_action': [d.pk for d in self.diagnoses],
+        }, follow=True)
+        self.assertContains(response, 'Dispensed 5 diagnoses.')
+        self.assertFalse(Diagnosis.objects.filter(dispensed=False).exists())
+        self.assertEqual(set(Enrollment.objects.values_list('status', flat=True)), {'dispensed'})
+        self.assertEqual(stats.overview()['pending'], 0)
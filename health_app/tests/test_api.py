@@ -0,0 +1,60 @@
+import json
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils.timezone import localdate
+from health_app.models import Patient, Program, Enrollment
+
+
+class PatientApiPaginationTestCase(TestCase):
+    """
+    Cursor pagination and streaming on the patient and enrollment APIs.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.program = Program.objects.create(name='HIV')
+        for i in range(7):
+            patient = Patient.objects.create(name=f'Patient {i}', age=30, gender='Female',
+                                             contact=f'0700{i:06d}')
+            Enrollment.objects.create(patient=patient, program=self.program)
+
+    def test_cursor_pages_cover_every_patient_once(self):
+        url, seen = '/api/patients/?page_size=3', []
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(p['id'] for p in data['results'])
+            url = data['next']
+        self.assertEqual(seen, sorted(Patient.objects.values_list('id', flat=True)))
+
+    def test_enrollments_newest_first(self):
+        data = self.client.get('/api/enrollments/?page_size=2').json()
+        ids  = list(Enrollment.objects.order_by('-id').values_list('id', flat=True)[:2])
+        self.assertEqual([e['id'] for e in data['results']], ids)
+
+    def test_ndjson_stream(self):
+        response = self.client.get('/api/patients/?stream=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(json.loads(lines[0])['name'], 'Patient 0')
+
+    def test_json_array_stream_honours_filters(self):
+        response = self.client.get('/api/patients/?stream=json&contact=0700000003')
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([r['name'] for r in rows], ['Patient 3'])
+
+    def test_enrolled_on_is_not_writable(self):
+        patient = Patient.objects.get(name='Patient 0')
+        for day in ('2025-01-15', '2099-01-15'):
+            response = self.client.post('/api/enrollments/', {'patient': patient.pk, 'program': self.program.pk,
+                                                              'enrolled_on': day})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['enrolled_on'], localdate().isoformat())
+        enrollment = Enrollment.objects.first()
+        response = self.client.patch(f'/api/enrollments/{enrollment.pk}/', {'enrolled_on': '2025-01-15'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.enrolled_on, localdate())
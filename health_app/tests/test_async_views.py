@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase, AsyncRequestFactory
+from health_app import async_views
+from health_app.models import Patient, Program, Enrollment, Diagnosis, DoctorProfile
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    The async role pages render the same data as their sync counterparts.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        for name in ('Receptionist', 'Doctor', 'Pharmacist'):
+            self.user.groups.add(Group.objects.create(name=name))
+        self.program = Program.objects.create(name='HIV')
+        DoctorProfile.objects.create(user=self.user, program=self.program)
+        patient = Patient.objects.create(name='Baraka', age=41, gender='Male', contact='0722')
+        self.enrollment = Enrollment.objects.create(patient=patient, program=self.program)
+        Diagnosis.objects.create(enrollment=self.enrollment, diagnosis='x', recommendations='y')
+
+    async def get(self, view, path, **params):
+        request = AsyncRequestFactory().get(path, params)
+        async def auser():
+            return self.user
+        request.user, request.auser = self.user, auser
+        return await view(request)
+
+    async def test_pages_render(self):
+        pages = [
+            (async_views.list_patients,    '/patients/',        'Baraka'),
+            (async_views.list_enrollments, '/enrollments/',     'Baraka'),
+            (async_views.doctor_patients,  '/doctor/patients/', f'?enrollment={self.enrollment.pk}'),
+            (async_views.pharmacy_queue,   '/pharmacy/queue/',  'Pending (1)'),
+        ]
+        for view, path, expected in pages:
+            response = await self.get(view, path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertIn(expected, response.content.decode(), path)
+
+    async def test_overview_runs_lookups_together(self):
+        response = await self.get(async_views.admin_overview, '/overview/', contact='0722')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Enrolled: 1', response.content.decode())
+
+    async def test_role_is_enforced(self):
+        await Group.objects.filter(name='Pharmacist').adelete()
+        response = await self.get(async_views.pharmacy_queue, '/pharmacy/queue/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_sync_doctor_page_prefetches_enrollments(self):
+        self.client.force_login(self.user)
+        for i in range(5):
+            patient = Patient.objects.create(name=f'P{i}', age=30, gender='Male', contact=f'07{i}')
+            Enrollment.objects.create(patient=patient, program=self.program)
+        self.client.get('/doctor/patients/')
+        with self.assertNumQueries(4):   # session, user, patients, enrollments
+            self.client.get('/doctor/patients/')
@@ -0,0 +1,116 @@
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from health_app import importer, search, services
+from health_app.contacts import normalize_contact
+from health_app.forms import PatientForm
+from health_app.models import Patient, Program, Enrollment
+
+backfill    = import_module('health_app.migrations.0008_patient_contact_normalized').backfill
+renormalize = import_module('health_app.migrations.0010_patient_contact_emails').renormalize
+
+
+class ContactNormalizationTestCase(TestCase):
+    """
+    Contacts are matched in one canonical form, whatever way they were
+    written, through the unique Patient.contact_normalized column.
+    """
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.program = Program.objects.create(name='HIV')
+            self.patient = Patient.objects.create(name='Amina', age=30, gender='Female', contact='0712 345 678')
+            Enrollment.objects.create(patient=self.patient, program=self.program)
+
+    def test_written_forms(self):
+        for contact in ('+254 712 345 678', '0712-345678', '254712345678', '00254712345678'):
+            self.assertEqual(normalize_contact(contact), '254712345678')
+        self.assertIsNone(normalize_contact(' - '))
+        self.assertIsNone(normalize_contact(None))
+        self.assertIsNone(normalize_contact('ext 12'))
+        self.assertEqual(normalize_contact(' Jane85@Gmail.com '), 'jane85@gmail.com')
+        self.assertNotEqual(normalize_contact('jane85@gmail.com'), normalize_contact('bob85@yahoo.com'))
+        with override_settings(HEALTH_CONTACT_COUNTRY_CODE='256'):
+            self.assertEqual(normalize_contact('0712345678'), '256712345678')
+        self.assertEqual(self.patient.contact_normalized, '254712345678')
+
+    def test_save_with_update_fields(self):
+        self.patient.contact = '0799000000'
+        self.patient.save(update_fields=['contact'])
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.contact_normalized, '254799000000')
+
+    def test_lookup(self):
+        with self.assertNumQueries(2):    # the timeline document, the program names
+            document = services.lookup_patient('+254 712 345 678')
+        self.assertEqual(document['id'], self.patient.pk)
+        self.assertEqual(document['enrollments'][0]['program_name'], 'HIV')
+        self.assertIsNone(services.lookup_patient('0700000000'))
+
+        user = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(user)
+        self.assertContains(self.client.get('/patients/lookup/', {'contact': '254712345678'}), 'Amina')
+        response = self.client.get('/overview/', {'contact': '+254712345678'})
+        self.assertContains(response, 'Contact: 0712 345 678')
+        self.assertContains(response, 'Enrolled: 1')
+
+    def test_duplicates_rejected(self):
+        form = PatientForm(data={'name': 'Twin', 'age': 30, 'gender': 'Female', 'contact': '+254712345678'})
+        self.assertIn('contact', form.errors)
+
+        user = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(user)
+        response = self.client.post('/api/patients/', {'name': 'Twin', 'age': 30, 'gender': 'Female',
+                                                       'contact': '254 712 345 678'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('contact', response.json())
+        response = self.client.patch(f'/api/patients/{self.patient.pk}/', {'contact': '+254712345678'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        rows = 'name,age,gender,contact\nTwin,30,Female,+254712345678\nNew,20,Male,0700 111 222\nAgain,20,Male,0700111222\n'
+        report = importer.import_patients(importer.read_rows(StringIO(rows), 'csv'))
+        self.assertEqual((report['created'], report['failed']), (1, 2))
+        self.assertEqual(Patient.objects.get(name='New').contact_normalized, '254700111222')
+
+    def test_emails(self):
+        user = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(user)
+        for name, contact in (('Jane', 'jane85@gmail.com'), ('Bob', 'bob85@yahoo.com')):
+            response = self.client.post('/api/patients/', {'name': name, 'age': 30, 'gender': 'Female',
+                                                           'contact': contact})
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/patients/', {'name': 'Jane', 'age': 30, 'gender': 'Female',
+                                                       'contact': 'JANE85@gmail.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(services.lookup_patient('Bob85@Yahoo.com')['name'], 'Bob')
+        self.assertEqual([p.name for p in search.search_patients('yahoo')], ['Bob'])
+
+    def test_migration_backfill(self):
+        other = Patient.objects.create(name='Baraka', age=40, gender='Male', contact='0700 111 222')
+        Patient.objects.update(contact_normalized=None)
+        backfill(apps, None)
+        other.refresh_from_db()
+        self.assertEqual(other.contact_normalized, '254700111222')
+
+        Patient.objects.filter(pk=other.pk).update(contact='+254712345678', contact_normalized=None)
+        with self.assertRaisesMessage(RuntimeError, f'{self.patient.pk} & {other.pk}'):
+            backfill(apps, None)
+
+    def test_migration_renormalizes_emails(self):
+        email = Patient.objects.create(name='Jane', age=30, gender='Female', contact='jane85@gmail.com')
+        Patient.objects.filter(pk=email.pk).update(contact_normalized='85')
+        with connection.cursor() as cursor:     # the index as 0004 wrote it
+            cursor.execute(f'UPDATE {search.FTS_TABLE} SET contact = %s WHERE rowid = %s',
+                           ['0712345678', self.patient.pk])
+        renormalize(apps, SimpleNamespace(connection=connection))
+        email.refresh_from_db()
+        self.assertEqual(email.contact_normalized, 'jane85@gmail.com')
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT contact FROM {search.FTS_TABLE} WHERE rowid = %s', [self.patient.pk])
+            self.assertEqual(cursor.fetchone(), ('254712345678',))
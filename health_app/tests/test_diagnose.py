@@ -0,0 +1,126 @@
+import threading
+
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase, TransactionTestCase
+from health_app import services, stats, timeline
+from health_app.models import Patient, Program, Enrollment, Diagnosis, DoctorProfile
+
+
+class DiagnoseTestCase(TestCase):
+    """
+    Creating a diagnosis and moving its enrollment to consulted is one
+    atomic step; duplicates are refused by the unique constraint.
+    """
+
+    def setUp(self):
+        self.doctor = get_user_model().objects.create_user('doc', password='pw')
+        self.doctor.groups.add(Group.objects.create(name='Doctor'))
+        self.program, other = Program.objects.create(name='HIV'), Program.objects.create(name='TB')
+        DoctorProfile.objects.create(user=self.doctor, program=self.program)
+        self.client.force_login(self.doctor)
+        patient = Patient.objects.create(name='Wanjiku', age=33, gender='Female', contact='0755')
+        self.enrollments = [Enrollment.objects.create(patient=patient, program=self.program)
+                            for _ in range(3)]
+        self.foreign = Enrollment.objects.create(patient=patient, program=other)
+
+    def post_form(self, enrollment):
+        return self.client.post('/doctor/diagnose/', {'enrollment': enrollment.pk, 'diagnosis': 'Flu',
+                                                      'recommendations': 'Rest'})
+
+    def test_form_creates_and_consults(self):
+        enrollment = self.enrollments[0]
+        response = self.post_form(enrollment)
+        self.assertContains(response, 'Diagnosis Created')
+        self.assertEqual(Enrollment.objects.get(pk=enrollment.pk).status, 'consulted')
+        diagnosis = Diagnosis.objects.get(enrollment=enrollment)
+        self.assertEqual(diagnosis.created_by, self.doctor)
+        self.assertEqual(timeline.get(enrollment.patient_id)['enrollments'][0]['status'], 'consulted')
+
+        response = self.post_form(enrollment)
+        self.assertEqual(response.context['error'], 'Diagnosis already exists for this enrollment.')
+        self.assertEqual(Diagnosis.objects.filter(enrollment=enrollment).count(), 1)
+
+        response = self.post_form(self.foreign)
+        self.assertEqual(response.context['error'], 'That enrollment is not in your program.')
+        self.assertFalse(Diagnosis.objects.filter(enrollment=self.foreign).exists())
+
+    def test_conflict_rolls_back_the_status_change(self):
+        enrollment = self.enrollments[0]
+        Diagnosis.objects.create(enrollment=enrollment, diagnosis='x', recommendations='y')
+        entry = {'enrollment': enrollment.pk, 'diagnosis': 'Flu', 'recommendations': 'Rest'}
+        result = services.diagnose([entry], self.doctor)
+        self.assertEqual(result['conflicts'], [enrollment.pk])
+        self.assertEqual(Enrollment.objects.get(pk=enrollment.pk).status, 'registered')
+
+    def test_batch(self):
+        first, second, third = self.enrollments
+        self.post_form(first)
+        rows = [{'enrollment': e.pk, 'diagnosis': 'Malaria', 'recommendations': 'ACT'}
+                for e in (third, first, second, self.foreign)] + [
+               {'enrollment': 9999, 'diagnosis': 'x', 'recommendations': 'y'}]
+        data = self.client.post('/doctor/diagnose/batch/', {'diagnoses': rows},
+                                content_type='application/json').json()
+        self.assertEqual([d['enrollment'] for d in data['created']], [second.pk, third.pk])
+        self.assertEqual(data['conflicts'], [first.pk])
+        self.assertEqual(data['missing'], [self.foreign.pk, 9999])
+        self.assertEqual(set(Enrollment.objects.filter(program=self.program)
+                             .values_list('status', flat=True)), {'consulted'})
+        self.assertEqual(stats.overview()['pending'], 3)
+
+        response = self.client.post('/doctor/diagnose/batch/', {'diagnoses': [{'enrollment': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('diagnosis', response.json()['errors']['0'])
+
+    def test_api(self):
+        enrollment = self.enrollments[0]
+        payload = {'enrollment': enrollment.pk, 'diagnosis': 'Flu', 'recommendations': 'Rest'}
+        self.assertEqual(self.client.post('/api/diagnoses/', payload).status_code, 201)
+        self.assertEqual(Enrollment.objects.get(pk=enrollment.pk).status, 'consulted')
+        self.assertEqual(self.client.post('/api/diagnoses/', payload).status_code, 400)
+
+        rows = [{**payload, 'enrollment': e.pk} for e in self.enrollments]
+        data = self.client.post('/api/diagnoses/batch/', rows, content_type='application/json').json()
+        self.assertEqual(len(data['created']), 2)
+        self.assertEqual(data['conflicts'], [enrollment.pk])
+
+
+class DiagnoseContentionTestCase(TransactionTestCase):
+    """
+    Several doctors diagnosing the same enrollments at once: each
+    enrollment ends up with exactly one diagnosis.
+    """
+
+    def test_concurrent_batches(self):
+        doctors = [get_user_model().objects.create_user(f'doc{i}') for i in range(6)]
+        patient = Patient.objects.create(name='Duma', age=50, gender='Male', contact='0744')
+        program = Program.objects.create(name='HIV')
+        ids = [Enrollment.objects.create(patient=patient, program=program).pk for _ in range(15)]
+        entries = [{'enrollment': pk, 'diagnosis': 'x', 'recommendations': 'y'} for pk in ids]
+
+        barrier = threading.Barrier(len(doctors))
+        results, errors = [], []
+
+        def worker(user):
+            try:
+                barrier.wait()
+                results.append(services.diagnose(entries, user))
+            except Exception as exc:  # surfaced by the assertions below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(d,)) for d in doctors]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        created = sorted(d['enrollment'] for r in results for d in r['created'])
+        self.assertEqual(created, ids)
+        self.assertEqual(Diagnosis.objects.count(), 15)
+        self.assertEqual(stats.overview()['pending'], 15)
+        self.assertFalse(Enrollment.objects.filter(status='registered').exists())
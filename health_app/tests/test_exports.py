@@ -0,0 +1,100 @@
+import csv
+import datetime
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import make_aware
+from health_app import exports, services
+from health_app.models import Patient, Program, Enrollment, Diagnosis
+
+
+class ExportTestCase(TestCase):
+    """
+    Full extracts of enrollments, diagnoses and dispense history, streamed
+    through one chunked query, as CSV (or Parquet with pyarrow).
+    """
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user('auditor', password='pw', is_staff=True)
+        self.hiv, self.tb = Program.objects.create(name='HIV'), Program.objects.create(name='TB')
+        self.diagnoses = []
+        for i, program in enumerate([self.hiv, self.hiv, self.tb]):
+            patient    = Patient.objects.create(name=f'Patient {i}', age=30, gender='Female', contact=f'07{i}')
+            enrollment = Enrollment.objects.create(patient=patient, program=program)
+            self.diagnoses.append(Diagnosis.objects.create(enrollment=enrollment, diagnosis=f'finding, {i}',
+                                                           recommendations='rest', created_by=self.staff))
+        Diagnosis.objects.filter(pk=self.diagnoses[0].pk).update(
+            created_on=make_aware(datetime.datetime(2024, 1, 31, 23, 0)))
+        services.dispense([self.diagnoses[1].pk], self.staff)
+
+    def download(self, path, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_csv(self):
+        rows = self.download('/api/exports/diagnoses.csv')
+        self.assertEqual([r['diagnosis_id'] for r in rows], [str(d.pk) for d in self.diagnoses])
+        self.assertEqual(rows[0]['diagnosis'], 'finding, 0')
+        self.assertEqual(rows[0]['created_on'], '2024-01-31T23:00:00+00:00')
+        self.assertEqual((rows[1]['dispensed'], rows[1]['dispensed_by']), ('True', 'auditor'))
+        self.assertEqual(rows[2]['program'], 'TB')
+
+        rows = self.download('/api/exports/dispensed.csv')
+        self.assertEqual([r['diagnosis_id'] for r in rows], [str(self.diagnoses[1].pk)])
+        rows = self.download('/api/exports/enrollments.csv', program=self.tb.pk)
+        self.assertEqual([r['patient_name'] for r in rows], ['Patient 2'])
+
+    def test_date_range_is_inclusive(self):
+        rows = self.download('/api/exports/diagnoses.csv', start='2024-01-01', end='2024-01-31')
+        self.assertEqual([r['diagnosis_id'] for r in rows], [str(self.diagnoses[0].pk)])
+        rows = self.download('/api/exports/diagnoses.csv', start='2024-02-01')
+        self.assertEqual(len(rows), 2)
+
+    def test_one_query_in_chunks(self):
+        with self.assertNumQueries(1):
+            chunks = list(exports.write_csv('diagnoses', exports.export_rows('diagnoses', chunk_size=1),
+                                            chunk_size=1))
+        self.assertEqual(len(chunks), 4)                # header + one per row
+
+    def test_refused(self):
+        self.client.force_login(get_user_model().objects.create_user('clerk', password='pw'))
+        self.assertEqual(self.client.get('/api/exports/diagnoses.csv').status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/api/exports/patients.csv').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/diagnoses.xlsx').status_code, 404)
+        response = self.client.get('/api/exports/diagnoses.csv', {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    @unittest.skipIf(exports.parquet_available(), 'pyarrow is installed')
+    def test_parquet_needs_pyarrow(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/api/exports/diagnoses.parquet').status_code, 400)
+
+    @unittest.skipUnless(exports.parquet_available(), 'needs pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/exports/diagnoses.parquet', {'program': self.hiv.pk})
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('diagnosis_id').to_pylist(), [d.pk for d in self.diagnoses[:2]])
+        self.assertEqual(table.column('dispensed').to_pylist(), [False, True])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'enrollments.csv')
+            call_command('export_data', 'enrollments', path, '--program', str(self.hiv.pk), stderr=io.StringIO())
+            with open(path, newline='', encoding='utf-8') as f:
+                self.assertEqual([r['program'] for r in csv.DictReader(f)], ['HIV', 'HIV'])
+        out = io.StringIO()
+        with mock.patch('sys.stdout', out):
+            call_command('export_data', 'dispensed', '-', stderr=io.StringIO())
+        self.assertEqual(out.getvalue().splitlines()[0], ','.join(exports.headers('dispensed')))
@@ -0,0 +1,78 @@
+import json
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from health_app.models import Patient, Program, Enrollment, Diagnosis
+from health_app.serializers import ProgramSerializer, PatientSerializer, EnrollmentSerializer, DiagnosisSerializer
+from health_app.fieldsets import ValuesPlan
+from health_app import services
+
+
+class SparseFieldsTestCase(TestCase):
+    """
+    ?fields= / ?expand= on the API, and the .values() list path matching
+    the serializers' output exactly.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.hiv, self.tb = Program.objects.create(name='HIV'), Program.objects.create(name='TB')
+        for i in range(4):
+            patient = Patient.objects.create(name=f'Patient {i}', age=30 + i, gender='Female',
+                                             contact=f'0700{i:06d}')
+            enrollment = Enrollment.objects.create(patient=patient, program=self.hiv)
+            if i % 2:
+                Enrollment.objects.create(patient=patient, program=self.tb)
+                Diagnosis.objects.create(enrollment=enrollment, diagnosis='Flu',
+                                         recommendations='Rest', created_by=self.user)
+
+    def test_fields_limits_keys_and_skips_nesting(self):
+        with self.assertNumQueries(3):   # session, user, one patient query
+            data = self.client.get('/api/patients/?fields=id,name').json()
+        self.assertEqual([set(p) for p in data['results']], [{'id', 'name'}] * 4)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/patients/?fields=id,ssn')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ssn', str(response.json()['fields']))
+
+    def test_expand_relations(self):
+        data = self.client.get('/api/enrollments/?expand=program,patient&fields=id,program,patient').json()
+        first = data['results'][0]
+        self.assertEqual(first['program'], ProgramSerializer(self.tb).data)
+        self.assertNotIn('enrollments', first['patient'])
+        self.assertEqual(first['patient']['name'], 'Patient 3')
+
+        data = self.client.get('/api/patients/?expand=enrollments.program').json()
+        self.assertEqual(data['results'][1]['enrollments'][1]['program']['name'], 'TB')
+        self.assertEqual(self.client.get('/api/patients/?expand=age').status_code, 400)
+
+    def test_values_path_matches_serializers(self):
+        for path, serializer, queryset in [
+            ('/api/patients/',    PatientSerializer,    services.patient_queryset({}).order_by('id')),
+            ('/api/enrollments/', EnrollmentSerializer, services.enrollment_queryset().order_by('-id')),
+            ('/api/diagnoses/',   DiagnosisSerializer,  Diagnosis.objects.order_by('id')),
+        ]:
+            with self.subTest(path=path):
+                self.assertIsNotNone(ValuesPlan.of(serializer()))
+                data = self.client.get(path).json()
+                rows = data['results'] if isinstance(data, dict) else data
+                self.assertEqual(rows, json.loads(json.dumps(serializer(queryset, many=True).data)))
+
+    def test_stream_honours_fields(self):
+        response = self.client.get('/api/enrollments/?stream=json&fields=id,diagnosis_id')
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({tuple(r) for r in rows}, {('id', 'diagnosis_id')})
+        self.assertEqual(sum(r['diagnosis_id'] is not None for r in rows), 2)
+
+    def test_detail_and_writes(self):
+        patient = Patient.objects.first()
+        data = self.client.get(f'/api/patients/{patient.pk}/?fields=name').json()
+        self.assertEqual(data, {'name': patient.name})
+        # ?fields= only shapes reads; a write still validates every field
+        response = self.client.put(f'/api/programs/{self.tb.pk}/?fields=id',
+                                   {'name': 'TB-2'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'TB-2')
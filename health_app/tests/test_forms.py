@@ -0,0 +1,39 @@
+from unittest import mock
+
+from requests.adapters import HTTPAdapter
+
+from django.core.cache import caches
+from django.test import TestCase
+from health_app.forms import EnrollmentForm
+from health_app.models import Patient, Program
+
+
+class EnrollmentFormTestCase(TestCase):
+    """
+    EnrollmentForm loads programs in-process from the shared cache and
+    validates the patient with a single lookup; it makes no HTTP calls.
+    """
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.hiv     = Program.objects.create(name='HIV')
+        self.patient = Patient.objects.create(name='Amina', age=30, gender='Female', contact='0711')
+        self.http    = mock.patch.object(HTTPAdapter, 'send', side_effect=AssertionError('HTTP call'))
+        self.http.start()
+        self.addCleanup(self.http.stop)
+
+    def test_programs_are_cached_until_a_program_changes(self):
+        EnrollmentForm()
+        with self.assertNumQueries(0):
+            self.assertEqual(EnrollmentForm().fields['program'].choices, [(self.hiv.pk, 'HIV')])
+        with self.captureOnCommitCallbacks(execute=True):
+            tb = Program.objects.create(name='TB')
+        self.assertEqual(EnrollmentForm().fields['program'].choices, [(self.hiv.pk, 'HIV'), (tb.pk, 'TB')])
+
+    def test_bound_form_validates_patient_by_id(self):
+        data = {'patient': str(self.patient.pk), 'program': str(self.hiv.pk), 'date_enrolled': '2026-01-05'}
+        form = EnrollmentForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        form = EnrollmentForm(dict(data, patient=str(self.patient.pk + 1)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('patient', form.errors)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from health_app import fragments, response_cache, services
+from health_app.models import Patient, Program, Enrollment, Diagnosis, DoctorProfile
+
+
+class FragmentCacheTestCase(TestCase):
+    """
+    Role pages cache their rows and sections under object versions: a
+    repeat render is served from cache and a write re-renders only what
+    it touched.
+    """
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        for name in ('Doctor', 'Pharmacist'):
+            self.user.groups.add(Group.objects.create(name=name))
+        self.program = Program.objects.create(name='HIV')
+        DoctorProfile.objects.create(user=self.user, program=self.program)
+        self.client.force_login(self.user)
+        self.patients, self.diagnoses = [], []
+        for i in range(3):
+            patient    = Patient.objects.create(name=f'Patient {i}', age=30, gender='Female', contact=f'07{i}')
+            enrollment = Enrollment.objects.create(patient=patient, program=self.program)
+            self.patients.append(patient)
+            self.diagnoses.append(Diagnosis.objects.create(enrollment=enrollment, diagnosis='x',
+                                                           recommendations='y'))
+
+    def renders(self, path):
+        """Fragment names rendered (cache misses) while serving path."""
+        rendered = []
+        real = fragments.cached
+        def spy(name, version, render):
+            return real(name, version, lambda: rendered.append(name) or render())
+        with mock.patch.object(fragments, 'cached', spy):
+            response = self.client.get(path)
+        return response, rendered
+
+    def test_queue_rows(self):
+        response, rendered = self.renders('/pharmacy/queue/')
+        self.assertEqual(rendered.count('queue_pending_row'), 3)
+        self.assertContains(response, 'Patient 1')
+
+        response, rendered = self.renders('/pharmacy/queue/')
+        self.assertEqual(rendered, [])
+        self.assertContains(response, 'Patient 1')
+
+        patient = self.patients[1]
+        patient.name = 'Renamed'
+        patient.save()
+        response, rendered = self.renders('/pharmacy/queue/')
+        self.assertEqual(rendered.count('queue_pending_row'), 1)
+        self.assertContains(response, 'Renamed')
+        self.assertNotContains(response, 'Patient 1')
+
+        services.dispense([self.diagnoses[0].pk], self.user)     # bulk UPDATE, bumped by hand
+        response, rendered = self.renders('/pharmacy/queue/')
+        self.assertEqual(rendered.count('queue_pending_row'), 0)
+        self.assertEqual(rendered.count('queue_dispensed_row'), 1)
+
+    def test_doctor_patients(self):
+        self.renders('/doctor/patients/')
+        self.assertEqual(self.renders('/doctor/patients/')[1], [])
+        Patient.objects.create(name='Newcomer', age=5, gender='Male', contact='0799')   # other program
+        self.assertEqual(self.renders('/doctor/patients/')[1], [])
+
+        Enrollment.objects.create(patient=Patient.objects.get(contact='0799'), program=self.program)
+        response, rendered = self.renders('/doctor/patients/')
+        self.assertEqual(rendered, ['doctor_patients', 'doctor_patient_row'])
+        self.assertContains(response, 'Newcomer')
+
+    def test_overview_summary_skips_the_counters_when_cached(self):
+        self.client.get('/overview/')
+        with self.assertNumQueries(2):    # session and user only
+            response = self.client.get('/overview/')
+        self.assertContains(response, 'Patients: 3')
+
+        Patient.objects.create(name='Newcomer', age=5, gender='Male', contact='0799')
+        self.assertContains(self.client.get('/overview/'), 'Patients: 4')
+
+    @override_settings(HEALTH_FRAGMENT_CACHE=False)
+    def test_disabled(self):
+        self.renders('/pharmacy/queue/')
+        self.assertEqual(self.renders('/pharmacy/queue/')[1].count('queue_pending_row'), 3)
@@ -0,0 +1,123 @@
+import datetime
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils.timezone import localdate
+from health_app import importer, reports, stats
+from health_app.models import Patient, Program, Enrollment
+
+PATIENTS_CSV = """name,age,gender,contact
+Amina,30,Female,0711
+Baraka,abc,Male,0722
+Chebet,29,Female,0711
+Duma,50,Male,0700
+"""
+
+
+class BulkImportTestCase(TestCase):
+    """
+    Chunked CSV/NDJSON import with set-based dedupe and per-row errors.
+    """
+
+    def setUp(self):
+        Patient.objects.create(name='Existing', age=60, gender='Other', contact='0700')
+        self.program = Program.objects.create(name='HIV')
+
+    def test_patients_csv(self):
+        report = importer.import_patients(importer.read_rows(StringIO(PATIENTS_CSV), 'csv'), chunk_size=2)
+        self.assertEqual((report['rows'], report['created'], report['failed']), (4, 1, 3))
+        self.assertEqual([e['row'] for e in report['errors']], [2, 3, 4])
+        self.assertIn('age', report['errors'][0]['errors'])
+        self.assertEqual(stats.overview()['patients'], 2)
+
+    def import_queries(self, n, start):
+        rows = ''.join(f'P{i},20,Male,07{i:08d}\n' for i in range(start, start + n))
+        with CaptureQueriesContext(connection) as ctx:
+            report = importer.import_patients(
+                importer.read_rows(StringIO('name,age,gender,contact\n' + rows), 'csv'), chunk_size=100)
+        self.assertEqual(report['created'], n)
+        return len(ctx.captured_queries)
+
+    def test_queries_per_chunk_not_per_row(self):
+        self.assertEqual(self.import_queries(5, 0), self.import_queries(80, 100))
+
+    def test_bulk_api_ndjson_and_json(self):
+        self.client.force_login(get_user_model().objects.create_superuser('a', 'a@x.io', 'pw'))
+        body = '{"name": "Eko", "age": 3, "gender": "Male", "contact": "0755"}\nnot json\n'
+        report = self.client.post('/api/patients/bulk/', body, content_type='application/x-ndjson').json()
+        self.assertEqual((report['created'], report['failed']), (1, 1))
+
+        rows = [{'contact': '0755', 'program_name': 'HIV'}, {'patient': 999, 'program': self.program.pk},
+                {'contact': '0700', 'program': 999}]
+        report = self.client.post('/api/enrollments/bulk/', rows, content_type='application/json').json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([list(e['errors']) for e in report['errors']], [['patient'], ['program']])
+        self.assertEqual(Enrollment.objects.get().patient.contact, '0755')
+        self.assertEqual(stats.overview()['programs_summary'], [{'program__name': 'HIV', 'count': 1}])
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'patients.csv')
+            with open(path, 'w') as f:
+                f.write(PATIENTS_CSV)
+            out, err = StringIO(), StringIO()
+            call_command('import_records', 'patients', path, stdout=out, stderr=err)
+        self.assertIn('1 of 4 patients imported, 3 failed', out.getvalue())
+        self.assertIn('row 2:', err.getvalue())
+
+    def test_concurrent_contact_is_reported_not_raised(self):
+        lookup = importer._new_patients
+        def racing(valid):
+            result = lookup(valid)
+            if not Patient.objects.filter(name='Racer').exists():
+                Patient.objects.create(name='Racer', age=40, gender='Male', contact='0733')
+            return result
+        rows = 'name,age,gender,contact\nAmina,30,Female,0711\nChebet,29,Female,0733\nDuma,50,Male,0744\n'
+        with mock.patch.object(importer, '_new_patients', racing):
+            report = importer.import_patients(importer.read_rows(StringIO(rows), 'csv'))
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'], [{'row': 2, 'errors': {'contact': [importer.DUPLICATE_CONTACT]}}])
+        self.assertEqual(stats.overview()['patients'], 4)
+
+    def test_failed_enrollment_chunk_is_not_counted(self):
+        patient = Patient.objects.get()
+        rows    = [(n, {'patient': patient.pk, 'program': self.program.pk}) for n in (1, 2, 3)]
+        insert, checkpoints = Enrollment.objects.bulk_create, []
+        def failing(objs, *args, **kwargs):
+            if len(checkpoints) == 1:
+                raise IntegrityError('patient deleted meanwhile')
+            return insert(objs, *args, **kwargs)
+        with mock.patch.object(Enrollment.objects, 'bulk_create', side_effect=failing):
+            with self.assertRaises(IntegrityError):
+                importer.import_enrollments(iter(rows), chunk_size=1, checkpoint=checkpoints.append)
+        self.assertEqual((checkpoints[-1]['rows'], checkpoints[-1]['created']), (1, 1))
+
+        report = importer.import_enrollments(iter(rows), chunk_size=1, resume=checkpoints[-1])
+        self.assertEqual((report['rows'], report['created']), (3, 3))
+        self.assertEqual(Enrollment.objects.count(), 3)
+
+    def test_historical_enrollments(self):
+        patient = Patient.objects.get()
+        today   = localdate()
+        last_year = today.replace(year=today.year - 1, day=1)
+        reports.roll_up('month')
+        rows = [{'patient': patient.pk, 'program': self.program.pk, 'enrolled_on': last_year.isoformat()},
+                {'patient': patient.pk, 'program': self.program.pk},
+                {'patient': patient.pk, 'program': self.program.pk,
+                 'enrolled_on': (today + datetime.timedelta(days=1)).isoformat()}]
+        report = importer.import_enrollments(enumerate(rows, 1))
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertIn('enrolled_on', report['errors'][0]['errors'])
+        self.assertEqual(sorted(Enrollment.objects.values_list('enrolled_on', flat=True)), [last_year, today])
+
+        # the closed month was rolled up before the import and still counts it
+        rows = reports.report('month', last_year, today)
+        self.assertEqual([(r['period_start'], r['enrollments']) for r in rows],
+                         [(last_year, 1), (today.replace(day=1), 1)])
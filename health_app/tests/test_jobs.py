@@ -0,0 +1,189 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+from health_app import admin as health_admin, jobs
+from health_app.models import Job, Patient, Program, Enrollment, Diagnosis
+
+
+def drain():
+    return jobs.work(threading.Event(), drain=True)
+
+
+class JobQueueTestCase(TestCase):
+    """
+    Database-backed background jobs: idempotent enqueue, exclusive claims,
+    retries with backoff, expired leases, and the views that enqueue.
+    """
+
+    def setUp(self):
+        self.calls = []
+        def flaky(fail=0):
+            self.calls.append(fail)
+            if len(self.calls) <= fail:
+                raise RuntimeError('boom')
+            return {'calls': len(self.calls)}
+        jobs.task('flaky', max_attempts=3)(flaky)
+        self.addCleanup(jobs.TASKS.pop, 'flaky')
+
+    def test_run(self):
+        job = jobs.enqueue('flaky')
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(drain(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), ('done', 1, {'calls': 1}))
+        with self.assertRaises(ValueError):
+            jobs.enqueue('no-such-task')
+
+    def test_idempotency_key(self):
+        first = jobs.enqueue('flaky', key='upload-1')
+        self.assertEqual(jobs.enqueue('flaky', key='upload-1').pk, first.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_enqueue_rolls_back_with_the_write(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            jobs.enqueue('flaky')
+            raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_claimed_once(self):
+        jobs.enqueue('flaky')
+        self.assertIsNotNone(jobs.claim('a'))
+        self.assertIsNone(jobs.claim('b'))
+
+    def test_retries_with_backoff(self):
+        job = jobs.enqueue('flaky', {'fail': 5})
+        with self.assertLogs('health_app.jobs', 'ERROR'):
+            drain()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertGreaterEqual(job.run_after, now() + timedelta(seconds=jobs.BACKOFF_BASE / 2 - 1))
+        self.assertEqual(drain(), 0)                    # not due yet
+
+        for _ in range(2):
+            Job.objects.filter(pk=job.pk).update(run_after=now())
+            with self.assertLogs('health_app.jobs', 'ERROR'):
+                drain()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(self.calls)), ('failed', 3, 3))
+        self.assertLessEqual(jobs.backoff(30), timedelta(seconds=jobs.BACKOFF_MAX))
+
+    @override_settings(HEALTH_JOB_TIMEOUT=60)
+    def test_stale_lease_is_requeued(self):
+        job = jobs.enqueue('flaky')
+        jobs.claim('lost')
+        Job.objects.filter(pk=job.pk).update(started_on=now() - timedelta(minutes=5))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(drain(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+
+    def uploads(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(HEALTH_UPLOAD_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return directory
+
+    def test_async_bulk_import(self):
+        uploads = self.uploads()
+        user = get_user_model().objects.create_user('clerk', password='pw')
+        self.client.force_login(user)
+        rows = [{'name': 'Amina', 'age': 30, 'gender': 'Female', 'contact': '0711000001'},
+                {'name': 'Baraka', 'age': 'abc', 'gender': 'Male', 'contact': '0711000002'}]
+        post = lambda: self.client.post('/api/patients/bulk/?async=1', rows, content_type='application/json',
+                                        headers={'Idempotency-Key': 'batch-7'})
+        response = post()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['id']
+        self.assertEqual(response['Location'], f'/api/jobs/{job_id}/')
+        self.assertEqual(post().json()['id'], job_id)
+        self.assertFalse(Patient.objects.exists())
+        payload = Job.objects.get(pk=job_id).payload
+        self.assertEqual(set(payload), {'upload', 'fmt'})
+        self.assertEqual(os.listdir(uploads), [payload['upload']])   # the retry's copy is gone
+
+        drain()
+        self.assertEqual(os.listdir(uploads), [])
+        status = self.client.get(f'/api/jobs/{job_id}/').json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual((status['result']['created'], status['result']['failed']), (1, 1))
+        self.assertEqual(status['result']['errors'][0]['row'], 2)
+
+        other = get_user_model().objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').status_code, 404)
+
+    def test_async_csv_import_is_stored_as_sent(self):
+        uploads = self.uploads()
+        self.client.force_login(get_user_model().objects.create_user('clerk', password='pw'))
+        body = 'name,age,gender,contact\nAmina,30,Female,0711000001\nBaraka,41,Male,0711000002\n'
+        job_id = self.client.post('/api/patients/bulk/?async=1', body, content_type='text/csv').json()['id']
+        upload = Job.objects.get(pk=job_id).payload['upload']
+        with open(os.path.join(uploads, upload)) as f:
+            self.assertEqual(f.read(), body)
+        drain()
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').json()['result']['created'], 2)
+        self.assertEqual(Patient.objects.count(), 2)
+
+    def test_admin_queues_large_dispenses(self):
+        admin = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(admin)
+        program = Program.objects.create(name='HIV')
+        for i in range(3):
+            patient = Patient.objects.create(name=f'P{i}', age=30, gender='Female', contact=f'070{i}')
+            Diagnosis.objects.create(enrollment=Enrollment.objects.create(patient=patient, program=program),
+                                     diagnosis='x', recommendations='y')
+        with mock.patch.object(health_admin, 'DISPENSE_CHUNK', 2):
+            response = self.client.post('/admin/health_app/diagnosis/', {
+                'action': 'dispense_selected',
+                '_selected_action': list(Diagnosis.objects.values_list('pk', flat=True)),
+            }, follow=True)
+        self.assertContains(response, 'Queued 3 diagnoses for dispensing in 2 background jobs.')
+        self.assertEqual([len(job.payload['diagnosis_ids']) for job in Job.objects.order_by('pk')], [2, 1])
+        self.assertEqual(Diagnosis.objects.filter(dispensed=False).count(), 3)
+
+        response = self.client.get('/admin/health_app/job/')
+        self.assertContains(response, '2 queued (2 due')
+        drain()
+        self.assertFalse(Diagnosis.objects.filter(dispensed=False).exists())
+        self.assertEqual(set(Diagnosis.objects.values_list('dispensed_by', flat=True)), {admin.pk})
+        self.assertContains(self.client.get('/admin/health_app/job/'), 'Last hour: 2 finished')
+
+    def test_import_resumes_from_its_checkpoint(self):
+        program = Program.objects.create(name='HIV')
+        patients = [Patient.objects.create(name=f'P{i}', age=30, gender='Female', contact=f'070{i}')
+                    for i in range(3)]
+        rows = [[i + 1, {'patient': p.pk, 'program': program.pk}] for i, p in enumerate(patients)]
+        job = jobs.enqueue('import_enrollments', {'rows': rows})
+        # an earlier attempt committed the first two rows, then its worker was lost
+        Enrollment.objects.bulk_create([Enrollment(patient=p, program=program) for p in patients[:2]])
+        Job.objects.filter(pk=job.pk).update(result={'rows': 2, 'created': 2, 'failed': 0, 'errors': []})
+        drain()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result['rows'], job.result['created']), ('done', 3, 3))
+        self.assertEqual(Enrollment.objects.count(), 3)
+
+    @override_settings(HEALTH_JOB_TIMEOUT=60)
+    def test_requeued_import_rolls_back(self):
+        program = Program.objects.create(name='HIV')
+        patient = Patient.objects.create(name='P', age=30, gender='Female', contact='0700')
+        jobs.enqueue('import_enrollments', {'rows': [[1, {'patient': patient.pk, 'program': program.pk}]]})
+        job = jobs.claim('lost')
+        Job.objects.filter(pk=job.pk).update(started_on=now() - timedelta(minutes=5))
+        jobs.requeue_stale()
+        self.assertTrue(jobs.claim('new'))
+        with self.assertLogs('health_app.jobs', 'ERROR') as logs:
+            jobs.run(job)                               # the lost worker wakes up
+        self.assertIn('LeaseLost', logs.output[0])
+        self.assertFalse(Enrollment.objects.exists())
+        self.assertEqual(Job.objects.get(pk=job.pk).worker, 'new')
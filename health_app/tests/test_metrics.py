@@ -0,0 +1,129 @@
+import contextvars
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import path, include
+from health_app.models import Program, Patient, Enrollment, Diagnosis
+from health_app import metrics
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'[]')
+
+    def log_message(self, *args):
+        pass
+
+def _fetch_upstream(request):
+    base = request.GET['upstream']
+    with requests.Session() as session:
+        session.get(f'{base}/a', timeout=5)
+    requests.get(f'{base}/b', timeout=5)
+    return HttpResponse('ok')
+
+urlpatterns = [
+    path('fetch/', _fetch_upstream, name='fetch_upstream'),
+    path('', include('health_system.urls')),
+]
+
+
+class MetricsTestCase(TestCase):
+    """
+    MetricsMiddleware: per-view timings, query counts, outbound calls, the
+    Prometheus endpoint and the slow-request log.
+    """
+
+    def setUp(self):
+        metrics.reset()
+        self.staff = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.pharmacist = get_user_model().objects.create_user('ph', password='pw')
+        self.pharmacist.groups.add(Group.objects.create(name='Pharmacist'))
+        program = Program.objects.create(name='HIV')
+        patient = Patient.objects.create(name='Ann', age=30, gender='Female', contact='0700')
+        enrollment = Enrollment.objects.create(patient=patient, program=program)
+        Diagnosis.objects.create(enrollment=enrollment, diagnosis='Flu', recommendations='Rest')
+
+    def test_records_queries_per_url_name(self):
+        self.client.force_login(self.pharmacist)
+        self.client.get('/pharmacy/queue/')
+        self.client.get('/pharmacy/queue/')
+        self.client.get('/no-such-page/')
+        stats = metrics.snapshot()
+        queue = stats['health_app:pharmacy_queue']
+        self.assertEqual(queue['requests'], 2)
+        self.assertGreater(queue['queries'], 2)
+        self.assertGreater(queue['seconds'], 0)
+        self.assertEqual(stats[metrics.UNMATCHED]['requests'], 1)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_outbound_calls_are_credited_to_the_request(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Upstream)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        upstream = f'http://127.0.0.1:{server.server_port}'
+
+        self.assertEqual(self.client.get('/fetch/', {'upstream': upstream}).status_code, 200)
+        requests.get(f'{upstream}/outside-a-request', timeout=5)
+        stats = metrics.snapshot()
+        self.assertEqual(stats['fetch_upstream']['outbound'], 2)
+        self.assertEqual(sum(s['outbound'] for s in stats.values()), 2)
+
+    def test_sample_counts_from_many_threads(self):
+        sample = metrics.Sample()
+        def call():
+            for _ in range(2000):
+                metrics.record_outbound(0.001)
+        token = metrics._current.set(sample)
+        try:
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(call,)) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            metrics._current.reset(token)
+        self.assertEqual(sample.outbound, 16000)
+
+    def test_unknown_methods_share_one_label(self):
+        self.client.force_login(self.pharmacist)
+        for method in ('BREW', 'PROPFIND', 'GET'):
+            self.client.generic(method, '/pharmacy/queue/')
+        self.client.force_login(self.staff)
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('view="health_app:pharmacy_queue",method="GET",status="200"} 1', body)
+        self.assertIn('view="health_app:pharmacy_queue",method="other",status="200"} 2', body)
+        self.assertNotIn('BREW', body)
+
+    def test_prometheus_endpoint_is_staff_only(self):
+        self.client.force_login(self.pharmacist)
+        self.client.get('/pharmacy/queue/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('health_requests_total{view="health_app:pharmacy_queue",method="GET",status="200"} 1',
+                      body)
+        self.assertIn('health_db_queries_bucket{view="health_app:pharmacy_queue",le="+Inf"} 1', body)
+        self.assertIn('# TYPE health_request_latency_seconds summary', body)
+
+    @override_settings(HEALTH_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        self.client.force_login(self.pharmacist)
+        with self.assertLogs('health_app.metrics', 'WARNING') as logs:
+            self.client.get('/pharmacy/queue/')
+        self.assertIn('(health_app:pharmacy_queue)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        self.assertNotIn('0700', logs.output[0])   # parameters stay out of the log
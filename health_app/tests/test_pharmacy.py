@@ -0,0 +1,167 @@
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import Client, TestCase, TransactionTestCase
+from django.utils.timezone import now
+from health_app import services, stats
+from health_app.models import Patient, Program, Enrollment, Diagnosis
+
+
+class PharmacyQueueTestCase(TestCase):
+    """
+    Paginated pharmacy queue and the incremental polling endpoint.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('pharm', password='pw')
+        self.user.groups.add(Group.objects.create(name='Pharmacist'))
+        self.client.force_login(self.user)
+        self.program = Program.objects.create(name='HIV')
+        patient = Patient.objects.create(name='Baraka', age=41, gender='Male', contact='0722')
+        self.patient = patient
+
+    def diagnose(self, **fields):
+        # one diagnosis per enrollment (diagnosis_enrollment_unique)
+        enrollment = Enrollment.objects.create(patient=self.patient, program=self.program)
+        return Diagnosis.objects.create(enrollment=enrollment, diagnosis='x',
+                                        recommendations='y', **fields)
+
+    def test_queue_is_paginated_and_history_windowed(self):
+        for _ in range(30):
+            self.diagnose()
+        self.diagnose(dispensed=True, dispensed_on=now() - timedelta(days=1))
+        self.diagnose(dispensed=True, dispensed_on=now() - timedelta(days=30))
+
+        response = self.client.get('/pharmacy/queue/')
+        self.assertEqual(len(response.context['undispensed_diagnoses']), 25)
+        self.assertEqual(response.context['undispensed_diagnoses'].paginator.count, 30)
+        self.assertEqual(len(response.context['dispensed_diagnoses']), 1)
+
+        response = self.client.get('/pharmacy/queue/?page=2&days=60')
+        self.assertEqual(len(response.context['undispensed_diagnoses']), 5)
+        self.assertEqual(len(response.context['dispensed_diagnoses']), 2)
+
+    def test_changes_since(self):
+        old = self.diagnose()
+        Diagnosis.objects.filter(pk=old.pk).update(created_on=now() - timedelta(hours=1))
+        since = now()
+        new = self.diagnose()
+        gone = self.diagnose()
+        Diagnosis.objects.filter(pk=gone.pk).update(dispensed=True, dispensed_on=now())
+
+        data = self.client.get('/pharmacy/queue/changes/', {'since': since.isoformat()}).json()
+        self.assertEqual([d['id'] for d in data['pending']], [new.pk])
+        self.assertEqual([d['id'] for d in data['dispensed']], [gone.pk])
+        self.assertEqual(data['pending'][0]['patient'], 'Baraka')
+
+    def test_changes_requires_since(self):
+        self.assertEqual(self.client.get('/pharmacy/queue/changes/').status_code, 400)
+        for since in ('yesterday', '2024-02-30T00:00'):
+            response = self.client.get('/pharmacy/queue/changes/', {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+
+    def test_dispense_needs_csrf_token(self):
+        d = self.diagnose()
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.get('/pharmacy/queue/')
+        self.assertContains(response, 'formaction="/pharmacy/dispense/')
+        url = f'/pharmacy/dispense/{d.pk}/{d.enrollment_id}/'
+        self.assertEqual(client.post(url).status_code, 403)
+        token = response.context['csrf_token']
+        self.assertEqual(client.post(url, {'csrfmiddlewaretoken': str(token)}).status_code, 200)
+        self.assertTrue(Diagnosis.objects.get(pk=d.pk).dispensed)
+
+
+class DispenseTestCase(TestCase):
+    """
+    Atomic single and batch dispensing.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('pharm', password='pw')
+        self.user.groups.add(Group.objects.create(name='Pharmacist'))
+        self.client.force_login(self.user)
+        patient = Patient.objects.create(name='Chebet', age=29, gender='Female', contact='0733')
+        program = Program.objects.create(name='TB')
+        self.enrollments = [Enrollment.objects.create(patient=patient, program=program) for _ in range(3)]
+        self.diagnoses   = [Diagnosis.objects.create(enrollment=e, diagnosis='x', recommendations='y')
+                            for e in self.enrollments]
+
+    def test_second_dispense_is_a_conflict(self):
+        d = self.diagnoses[0]
+        url = f'/pharmacy/dispense/{d.pk}/{d.enrollment_id}/'
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        first = Diagnosis.objects.get(pk=d.pk).dispensed_on
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertEqual(Diagnosis.objects.get(pk=d.pk).dispensed_on, first)
+        self.assertEqual(Enrollment.objects.get(pk=d.enrollment_id).status, 'dispensed')
+
+    def test_batch(self):
+        self.client.post(f'/pharmacy/dispense/{self.diagnoses[0].pk}/{self.enrollments[0].pk}/')
+        ids = [d.pk for d in self.diagnoses] + [9999]
+        data = self.client.post('/pharmacy/dispense/batch/', {'ids': ids},
+                                content_type='application/json').json()
+        self.assertEqual(data, {'dispensed': ids[1:3], 'conflicts': ids[:1], 'missing': [9999]})
+        self.assertFalse(Diagnosis.objects.filter(dispensed=False).exists())
+        self.assertEqual(set(Enrollment.objects.values_list('status', flat=True)), {'dispensed'})
+
+    def test_batch_ids_are_validated(self):
+        post = lambda body: self.client.post('/pharmacy/dispense/batch/', body, content_type='application/json')
+        for ids in ['12', [1.9], [True], [str(self.diagnoses[0].pk)], [], None,
+                    list(range(1, services.MAX_DISPENSE_BATCH + 2))]:
+            self.assertEqual(post({'ids': ids}).status_code, 400, ids)
+        self.assertEqual(post([1]).status_code, 400)
+        self.assertFalse(Diagnosis.objects.filter(dispensed=True).exists())
+        with self.assertRaises(TypeError):
+            services.dispense(['1'], self.user)
+
+        response = self.client.post('/pharmacy/dispense/batch/', {'ids': [self.diagnoses[0].pk, '1x']})
+        self.assertEqual(response.status_code, 400)
+        data = self.client.post('/pharmacy/dispense/batch/', {'ids': [self.diagnoses[0].pk]}).json()
+        self.assertEqual(data['dispensed'], [self.diagnoses[0].pk])
+
+
+class DispenseContentionTestCase(TransactionTestCase):
+    """
+    Several pharmacists dispensing the same items at once: every item is
+    dispensed exactly once and the counters stay exact.
+    """
+
+    def test_concurrent_batches(self):
+        users = [get_user_model().objects.create_user(f'pharm{i}') for i in range(6)]
+        patient = Patient.objects.create(name='Duma', age=50, gender='Male', contact='0744')
+        program = Program.objects.create(name='HIV')
+        ids = [Diagnosis.objects.create(enrollment=Enrollment.objects.create(patient=patient, program=program),
+                                        diagnosis='x', recommendations='y').pk
+               for _ in range(20)]
+
+        barrier = threading.Barrier(len(users))
+        results, errors = [], []
+
+        def worker(user):
+            try:
+                barrier.wait()
+                results.append(services.dispense(ids, user))
+            except Exception as exc:  # surfaced by the assertions below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(u,)) for u in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        won = sorted(pk for r in results for pk in r['dispensed'])
+        self.assertEqual(won, ids)
+        for r in results:
+            self.assertEqual(sorted(r['dispensed'] + r['conflicts']), ids)
+        self.assertEqual(stats.overview()['dispensed'], 20)
+        self.assertEqual(stats.overview()['pending'], 0)
@@ -0,0 +1,58 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from health_app.models import Patient, Program, Enrollment, Diagnosis
+
+
+class ListQueryCountTestCase(TestCase):
+    """
+    The list endpoints must issue a constant number of queries, however
+    many patients, enrollments and diagnoses there are.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.program = Program.objects.create(name='TB')
+        self.created = 0
+
+    def add_patients(self, n):
+        for _ in range(n):
+            i = self.created = self.created + 1
+            patient = Patient.objects.create(name=f'P{i}', age=40, gender='Male', contact=f'07{i:08d}')
+            for _ in range(2):
+                enrollment = Enrollment.objects.create(patient=patient, program=self.program)
+                Diagnosis.objects.create(enrollment=enrollment, diagnosis='x', recommendations='y')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_constant(self, url):
+        self.add_patients(2)
+        small = self.count_queries(url)
+        self.add_patients(20)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_patient_list(self):
+        self.assert_constant('/api/patients/?page_size=100')
+
+    def test_patient_stream(self):
+        self.assert_constant('/api/patients/?stream=ndjson')
+
+    def test_enrollment_list(self):
+        self.assert_constant('/api/enrollments/?page_size=100')
+
+    def test_enrollment_stream(self):
+        self.assert_constant('/api/enrollments/?stream=json')
+
+    def test_diagnosis_id_matches_first_diagnosis(self):
+        self.add_patients(1)
+        enrollment = Enrollment.objects.first()
+        data = self.client.get(f'/api/enrollments/{enrollment.pk}/').json()
+        self.assertEqual(data['diagnosis_id'], enrollment.diagnosis_set.order_by('pk').first().pk)
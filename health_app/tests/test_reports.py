@@ -0,0 +1,127 @@
+import datetime
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from django.utils.timezone import localdate, make_aware
+from health_app import reports, response_cache
+from health_app.models import Patient, Program, Enrollment, Diagnosis, ReportRollup, ReportRollupState
+
+
+class ReportsTestCase(TestCase):
+    """
+    Period-bucketed counts, rolled up once a period closes.
+    """
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.today   = localdate()
+        self.hiv     = Program.objects.create(name='HIV')
+        self.tb      = Program.objects.create(name='TB')
+        self.patient = Patient.objects.create(name='Amina', age=30, gender='Female', contact='0700')
+        self.last_month = reports.shift('month', reports.period_start('month', self.today), -1)
+        old = self.enroll(self.hiv, self.last_month)
+        self.enroll(self.hiv, self.last_month)
+        self.enroll(self.tb, self.today)
+        diag = Diagnosis.objects.create(enrollment=old, diagnosis='x', recommendations='y')
+        Diagnosis.objects.filter(pk=diag.pk).update(
+            created_on=make_aware(datetime.datetime.combine(self.last_month, datetime.time(9))),
+            dispensed=True, dispensed_on=make_aware(datetime.datetime.combine(self.today, datetime.time(0, 5))))
+        self.staff = get_user_model().objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def enroll(self, program, day):
+        enrollment = Enrollment.objects.create(patient=self.patient, program=program)
+        Enrollment.objects.filter(pk=enrollment.pk).update(enrolled_on=day)
+        return enrollment
+
+    def test_monthly_counts(self):
+        rows = reports.report('month', self.last_month, self.today)
+        summary = {(r['period_start'], r['program']): (r['enrollments'], r['diagnoses'], r['dispensed'])
+                   for r in rows}
+        this_month = reports.period_start('month', self.today)
+        self.assertEqual(summary, {
+            (self.last_month, 'HIV'): (2, 1, 0),
+            (this_month, 'HIV'):      (0, 0, 1),
+            (this_month, 'TB'):       (1, 0, 0),
+        })
+
+    def test_closed_periods_come_from_rollup(self):
+        reports.report('month', self.last_month, self.today)
+        self.assertEqual(ReportRollup.objects.filter(period='month', metric='enrollments').get().count, 2)
+        # history is not rescanned: raw rows of a closed period no longer matter…
+        Enrollment.objects.filter(enrolled_on=self.last_month).delete()
+        rows = reports.report('month', self.last_month, self.last_month)
+        self.assertEqual(rows[0]['enrollments'], 2)
+        # …until the rollups are rebuilt
+        call_command('rebuild_reports', '--period', 'month', stdout=io.StringIO())
+        self.assertEqual(reports.report('month', self.last_month, self.last_month), [])
+
+    def test_racing_first_roll_up_is_retried(self):
+        real, calls = ReportRollupState.objects.update_or_create, []
+        def lose_once(*args, **kwargs):
+            # the first time, another request inserted the state row meanwhile
+            calls.append(args)
+            if len(calls) == 1:
+                raise IntegrityError('UNIQUE constraint failed: health_app_reportrollupstate.period')
+            return real(*args, **kwargs)
+        with mock.patch.object(ReportRollupState.objects, 'update_or_create', lose_once):
+            self.assertEqual(reports.roll_up('month'), reports.period_start('month', self.today))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ReportRollupState.objects.get(period='month').rolled_until,
+                         reports.period_start('month', self.today))
+        self.assertEqual(ReportRollup.objects.filter(period='month', metric='enrollments').get().count, 2)
+
+    def test_query_count_does_not_grow_with_history(self):
+        reports.report('day', self.today - datetime.timedelta(days=60), self.today)
+        for day in range(2, 40):
+            self.enroll(self.hiv, self.today - datetime.timedelta(days=day))
+        reports.rebuild(('day',))
+        with self.assertNumQueries(4):   # state, rollup rows, live UNION, program names
+            reports.report('day', self.today - datetime.timedelta(days=60), self.today)
+
+    def test_endpoint_json_csv_and_cache(self):
+        url = '/api/reports/'
+        data = self.client.get(url, {'period': 'month', 'start': self.last_month}).json()
+        self.assertEqual(len(data['results']), 3)
+        with self.assertNumQueries(2):   # session and user only
+            self.assertEqual(self.client.get(url, {'period': 'month', 'start': self.last_month})['X-Cache'], 'HIT')
+
+        response = self.client.get(url, {'period': 'month', 'program': self.tb.pk, 'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], 'period_start,program_id,program,enrollments,diagnoses,dispensed')
+        self.assertEqual(len(lines), 2)
+
+    def test_endpoint_validates_and_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/reports/', {'period': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/', {'period': 'day', 'start': '2000-01-01'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/reports/').status_code, 403)
+
+
+class PatientDateFilterTestCase(TestCase):
+    """
+    The patient API's enrollment filters use one EXISTS, without duplicates.
+    """
+
+    def test_filters_match_one_enrollment(self):
+        hiv, tb = Program.objects.create(name='HIV'), Program.objects.create(name='TB')
+        patient = Patient.objects.create(name='Amina', age=30, gender='Female', contact='0700')
+        for program, day in ((hiv, datetime.date(2023, 5, 1)), (hiv, datetime.date(2023, 6, 1)),
+                             (tb, datetime.date(2024, 1, 1))):
+            e = Enrollment.objects.create(patient=patient, program=program)
+            Enrollment.objects.filter(pk=e.pk).update(enrolled_on=day)
+
+        def ids(**params):
+            return [p['id'] for p in self.client.get('/api/patients/', params).json()['results']]
+
+        self.assertEqual(ids(year=2023), [patient.pk])
+        self.assertEqual(ids(year=2023, program_id=hiv.pk), [patient.pk])
+        self.assertEqual(ids(year=2023, program_id=tb.pk), [])
+        self.assertEqual(ids(date='2024-01-01', month=1), [patient.pk])
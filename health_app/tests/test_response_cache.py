@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from health_app.models import Program, Patient, Enrollment, Diagnosis
+from health_app import response_cache, services, importer
+
+
+class ResponseCacheTestCase(TestCase):
+    """
+    API GETs are cached per model version and answer conditional requests.
+    """
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.program = Program.objects.create(name='Malaria')
+        self.patient = Patient.objects.create(name='Ann', age=30, gender='F', contact='0700')
+        self.enroll  = Enrollment.objects.create(patient=self.patient, program=self.program)
+        self.programs_url = reverse('health_app:program-list')
+        self.profile_url  = reverse('health_app:patient-profile', args=[self.patient.pk])
+
+    def test_hit_skips_queries(self):
+        first = self.client.get(self.programs_url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.programs_url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.profile_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.programs_url)['Last-Modified']
+        response = self.client.get(self.programs_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_invalidates(self):
+        etag = self.client.get(self.programs_url)['ETag']
+        Program.objects.create(name='TB')
+        response = self.client.get(self.programs_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_bulk_writes_invalidate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            diag = Diagnosis.objects.create(enrollment=self.enroll, diagnosis='d', recommendations='r')
+        etag = self.client.get(self.profile_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            services.dispense([diag.pk], None)
+        self.assertEqual(self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.profile_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_enrollments(iter([(1, {'patient': self.patient.pk, 'program': self.program.pk})]))
+        response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()['enrollments']), 2)
+
+    def test_query_string_is_part_of_key(self):
+        Patient.objects.create(name='Bob', age=40, gender='M', contact='0711')
+        url = reverse('health_app:patient-list')
+        self.client.get(url)
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('health_app:cache_stats')
+        self.client.get(self.programs_url)
+        self.client.get(self.programs_url)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff = get_user_model().objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).json(), {'hits': 1, 'misses': 1, 'not_modified': 0})
@@ -0,0 +1,59 @@
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from health_app.models import Program, DoctorProfile
+from health_app.roles import get_roles, doctor_program
+
+
+class RoleCacheTestCase(TestCase):
+    """
+    Role sets and doctor programs are cached and invalidated on change.
+    """
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.user    = get_user_model().objects.create_user('doc', password='pw')
+        self.doctor  = Group.objects.create(name='Doctor')
+        self.program = Program.objects.create(name='Malaria')
+        self.user.groups.add(self.doctor)
+        DoctorProfile.objects.create(user=self.user, program=self.program)
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_cached_across_requests(self):
+        self.assertEqual(get_roles(self.fresh_user()), {'Doctor'})
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_roles(user), {'Doctor'})
+            self.assertEqual(doctor_program(user), self.program)
+
+    def test_membership_change_invalidates(self):
+        get_roles(self.fresh_user())
+        self.user.groups.add(Group.objects.create(name='Receptionist'))
+        self.assertEqual(get_roles(self.fresh_user()), {'Doctor', 'Receptionist'})
+        self.doctor.user_set.remove(self.user)
+        self.assertEqual(get_roles(self.fresh_user()), {'Receptionist'})
+
+    def test_role_redirect_uses_cache(self):
+        self.client.force_login(self.user)
+        self.client.get('/')
+        with self.assertNumQueries(2):  # session + user
+            response = self.client.get('/')
+        self.assertRedirects(response, '/doctor/patients/', fetch_redirect_response=False)
+
+    def test_commit_drops_entries_cached_meanwhile(self):
+        # another worker reads the pre-commit membership under the bumped
+        # generation; the bump on commit must drop what it cached
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.user_set.remove(self.user)
+            stale = get_user_model().objects.get(pk=self.user.pk)
+            caches['responses'].set(f"health_app:roles:{caches['responses'].get('health_app:roles:generation')}"
+                                    f":{self.user.pk}", {'roles': frozenset({'Doctor'}), 'program': None})
+            self.assertEqual(get_roles(stale), {'Doctor'})
+        self.assertEqual(get_roles(self.fresh_user()), frozenset())
+
+    def test_shared_cache(self):
+        get_roles(self.fresh_user())
+        self.assertIsNotNone(caches['responses'].get('health_app:roles:generation'))
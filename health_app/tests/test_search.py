@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from health_app import search, services
+from health_app.models import Patient, Program, Enrollment
+
+
+class PatientSearchTestCase(TestCase):
+    """
+    Indexed patient search: normalization, prefix/substring, fuzzy, ranking.
+    """
+
+    def setUp(self):
+        self.amina  = Patient.objects.create(name='Amina Wanjirũ', age=30, gender='Female', contact='+254 712 345 678')
+        self.aminah = Patient.objects.create(name='Aminah Otieno', age=40, gender='Female', contact='0722000111')
+        self.baraka = Patient.objects.create(name='Baraka Mwangi', age=41, gender='Male', contact='0733 222 333')
+
+    def names(self, q, **kwargs):
+        return [p.name for p in search.search_patients(q, **kwargs)]
+
+    def test_uses_fts_index_on_sqlite(self):
+        self.assertEqual(search.backend(), 'fts5')
+
+    def test_substring_prefix_and_accents(self):
+        self.assertEqual(self.names('wanjiru'), ['Amina Wanjirũ'])
+        self.assertEqual(set(self.names('amin')), {'Amina Wanjirũ', 'Aminah Otieno'})
+        self.assertEqual(self.names('AMINA otie'), ['Aminah Otieno'])
+
+    def test_contact_is_normalized(self):
+        self.assertEqual(self.names('712-345', columns=('contact',)), ['Amina Wanjirũ'])
+        self.assertEqual(self.names('0733222'), ['Baraka Mwangi'])
+
+    def test_fuzzy_match_ranks_closest_first(self):
+        self.assertEqual(self.names('Barakka')[0], 'Baraka Mwangi')
+
+    def test_index_follows_updates_and_deletes(self):
+        self.baraka.name = 'Baraka Kamau'
+        self.baraka.save()
+        self.assertEqual(self.names('kamau'), ['Baraka Kamau'])
+        self.baraka.delete()
+        self.assertEqual(self.names('kamau'), [])
+
+    def test_rebuild_index(self):
+        Patient.objects.bulk_create([Patient(name='Zawadi', age=5, gender='Female', contact='0799')])
+        self.assertEqual(self.names('zawadi'), [])
+        self.assertEqual(search.rebuild_index(), 4)
+        self.assertEqual(self.names('zawadi'), ['Zawadi'])
+
+    def test_trigram_rank_uses_every_column(self):
+        with mock.patch.object(search, 'backend', return_value='trigram'):
+            sql = str(search.search_patients('0722', columns=('name', 'contact')).query)
+            one = str(search.search_patients('0722', columns=('contact',)).query)
+        self.assertEqual(sql.count('similarity('), 2)
+        self.assertIn('"name"', sql[sql.index('similarity('):])
+        self.assertEqual(one.count('similarity('), 1)
+
+    def test_api_search_is_ranked(self):
+        self.client.force_login(get_user_model().objects.create_superuser('a', 'a@x.io', 'pw'))
+        data = self.client.get('/api/patients/', {'search': 'amina wanj'}).json()
+        self.assertEqual([p['name'] for p in data['results']], ['Amina Wanjirũ'])
+
+    def test_api_search_pages_in_rank_order(self):
+        self.client.force_login(get_user_model().objects.create_superuser('a', 'a@x.io', 'pw'))
+        Patient.objects.bulk_create([Patient(name=f'Amina {i:02}', age=20, gender='Female', contact=f'0755{i:03}')
+                                     for i in range(5)])
+        search.rebuild_index()
+        expected = [p.name for p in search.search_patients('amina')]
+        names, url, params = [], '/api/patients/', {'search': 'amina', 'page_size': 3}
+        while url:
+            data = self.client.get(url, params).json()
+            names += [p['name'] for p in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(data['count'], 7)
+        self.assertEqual(names, expected)
+
+    def test_contact_filter_is_exact(self):
+        self.client.force_login(get_user_model().objects.create_superuser('a', 'a@x.io', 'pw'))
+        Patient.objects.create(name='Near Miss', age=50, gender='Male', contact='555 0712 999')
+        names = lambda contact: [p['name'] for p in
+                                 self.client.get('/api/patients/', {'contact': contact}).json()['results']]
+        self.assertEqual(names('0722 000 111'), ['Aminah Otieno'])
+        self.assertEqual(names('+254712345678'), ['Amina Wanjirũ'])
+        self.assertEqual(names('0712345678'), ['Amina Wanjirũ'])
+        self.assertEqual(names('0722'), [])
+        self.assertEqual(names('0712'), [])
+
+    def test_filters_apply_before_the_candidate_limit(self):
+        crowd, target = Program.objects.create(name='Q'), Program.objects.create(name='P')
+        for i in range(60):
+            patient = Patient.objects.create(name=f'Alice Q{i}', age=20, gender='Female', contact=f'0700{i:03}')
+            Enrollment.objects.create(patient=patient, program=crowd)
+        alice = Patient.objects.create(name='Alice Target', age=20, gender='Female', contact='0799000000')
+        Enrollment.objects.create(patient=alice, program=target)
+
+        self.client.force_login(get_user_model().objects.create_superuser('a', 'a@x.io', 'pw'))
+        data = self.client.get('/api/patients/', {'search': 'alice', 'program_id': target.pk}).json()
+        self.assertEqual([p['name'] for p in data['results']], ['Alice Target'])
+        self.assertEqual([p.name for p in search.search_patients('alice', limit=5,
+                                                                 queryset=services.program_patients(target))],
+                         ['Alice Target'])
+        self.assertEqual([p.name for p in services.program_patients(target, 'alice')], ['Alice Target'])
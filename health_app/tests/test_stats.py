@@ -0,0 +1,54 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from health_app import stats
+from health_app.models import Patient, Program, Enrollment, Diagnosis, StatCounter
+
+
+class StatCounterTestCase(TestCase):
+    """
+    Incremental counters must always equal a fresh recomputation.
+    """
+
+    def setUp(self):
+        self.doctor  = get_user_model().objects.create_user('doc', password='pw')
+        self.hiv     = Program.objects.create(name='HIV')
+        self.tb      = Program.objects.create(name='TB')
+        self.patient = Patient.objects.create(name='Amina', age=30, gender='Female', contact='0711')
+
+    def assertCountersExact(self):
+        stored = {n: v for n, v in StatCounter.objects.values_list('name', 'value') if v}
+        self.assertEqual(stored, {n: v for n, v in stats.compute().items() if v})
+
+    def test_incremental_updates(self):
+        enrollment = Enrollment.objects.create(patient=self.patient, program=self.hiv)
+        diagnosis  = Diagnosis.objects.create(enrollment=enrollment, diagnosis='x',
+                                              recommendations='y', created_by=self.doctor)
+        self.assertCountersExact()
+
+        diagnosis.dispensed = True
+        diagnosis.save()
+        enrollment.program = self.tb
+        enrollment.save()
+        self.assertCountersExact()
+        self.assertEqual(stats.overview()['dispensed'], 1)
+
+        self.doctor.delete()
+        self.assertCountersExact()
+        self.patient.delete()  # cascades to enrollment and diagnosis
+        self.assertCountersExact()
+
+    def test_overview_query_count_is_constant(self):
+        for i in range(10):
+            Enrollment.objects.create(patient=self.patient, program=self.hiv)
+        with self.assertNumQueries(2):  # counters + program names
+            data = stats.overview()
+        self.assertEqual(data['programs_summary'], [{'program__name': 'HIV', 'count': 10}])
+
+    def test_rebuild_command_fixes_drift(self):
+        Enrollment.objects.create(patient=self.patient, program=self.hiv)
+        StatCounter.objects.filter(name='enrollments').update(value=99)
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertCountersExact()
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import localtime, localdate
+from django.contrib.auth import get_user_model
+from health_app.models import Patient, Program, Enrollment, Diagnosis, DoctorProfile
+from health_app import stats, synthetic, services, reports, response_cache
+
+
+class SyntheticDataTestCase(TestCase):
+    """
+    The benchmark dataset generator: shape, consistency and derived state.
+    """
+
+    def test_generate(self):
+        result = synthetic.generate(patients=300, programs=4, seed=7)
+        self.assertEqual(Patient.objects.count(), 300)
+        self.assertEqual(Program.objects.count(), 4)
+        self.assertEqual(result['enrollments'], Enrollment.objects.count())
+        self.assertGreaterEqual(result['enrollments'], 300)
+
+        # Zipf-sized programs: the first one is the largest
+        sizes = [Enrollment.objects.filter(program=p).count() for p in result['programs']]
+        self.assertEqual(sizes[0], max(sizes))
+
+        # statuses follow the diagnoses, diagnoses are by the program's doctor
+        self.assertFalse(Enrollment.objects.filter(status='registered', diagnosis__isnull=False).exists())
+        self.assertEqual(Enrollment.objects.filter(status='dispensed').count(), result['dispensed'])
+        diagnosis = Diagnosis.objects.select_related('created_by', 'enrollment').first()
+        self.assertEqual(DoctorProfile.objects.get(user=diagnosis.created_by).program_id,
+                         diagnosis.enrollment.program_id)
+        for created_on, enrolled_on in Diagnosis.objects.values_list('created_on', 'enrollment__enrolled_on'):
+            self.assertGreaterEqual(localtime(created_on).date(), enrolled_on)
+
+        # counters were rebuilt despite the bulk inserts
+        self.assertEqual(stats.overview()['patients'], 300)
+        self.assertEqual(stats.overview()['dispensed'], result['dispensed'])
+        self.assertTrue(get_user_model().objects.filter(username='bench-pharmacist',
+                                                        groups__name='Pharmacist').exists())
+
+    def test_reproducible_and_additive(self):
+        synthetic.generate(patients=50, programs=2, seed=3)
+        first = list(Patient.objects.order_by('pk').values_list('name', 'age', 'gender'))
+        Patient.objects.all().delete()
+        Program.objects.all().delete()
+        synthetic.generate(patients=50, programs=2, seed=3)
+        self.assertEqual(list(Patient.objects.order_by('pk').values_list('name', 'age', 'gender')), first)
+
+        synthetic.generate(patients=20, programs=1, seed=3)   # a second batch adds rows
+        self.assertEqual(Patient.objects.count(), 70)
+        self.assertEqual(Program.objects.count(), 3)
+
+    def test_rerun_keeps_programs_and_rollups_current(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        synthetic.generate(patients=40, programs=2, seed=5, days=120)
+        today = localdate()
+        start = reports.shift('month', reports.period_start('month', today), -5)
+        first = reports.report('month', start, today)     # closes the past months
+        self.assertEqual(len(services.program_choices()), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            synthetic.generate(patients=40, programs=1, seed=6, days=120)
+        self.assertEqual(len(services.program_choices()), 3)
+        after = reports.report('month', start, today)
+        reports.rebuild()
+        self.assertEqual(after, reports.report('month', start, today))
+        self.assertGreater(sum(r['enrollments'] for r in after), sum(r['enrollments'] for r in first))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('generate_data', '--patients', '40', '--programs', '2', stdout=out)
+        self.assertIn('40 patient(s)', out.getvalue())
+        self.assertEqual(Patient.objects.count(), 40)
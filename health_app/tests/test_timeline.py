@@ -0,0 +1,120 @@
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from health_app import timeline, services, importer, response_cache
+from health_app.models import Patient, Program, Enrollment, Diagnosis, PatientTimeline
+from health_app.serializers import PatientSerializer, DiagnosisSerializer
+
+
+class PatientTimelineTestCase(TestCase):
+    """
+    Timeline documents follow every write path and serve the profile reads.
+    """
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.doctor  = get_user_model().objects.create_user('doc', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.program = Program.objects.create(name='HIV')
+            self.patient = Patient.objects.create(name='Amina', age=30, gender='Female', contact='0700')
+            self.enroll  = Enrollment.objects.create(patient=self.patient, program=self.program)
+            self.diag    = Diagnosis.objects.create(enrollment=self.enroll, diagnosis='Flu',
+                                                    recommendations='Rest', created_by=self.doctor)
+
+    def assertConsistent(self):
+        result = timeline.check()
+        self.assertEqual((result['missing'], result['stale']), ([], []))
+
+    def test_document_follows_signals(self):
+        document = PatientTimeline.objects.get(pk=self.patient.pk).document
+        self.assertEqual([e['type'] for e in document['events']], ['enrolled', 'diagnosed'])
+        self.assertEqual(document['enrollments'][0]['diagnosis_id'], self.diag.pk)
+        self.enroll.status = 'consulted'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enroll.save()
+        self.assertConsistent()
+        self.patient.name = 'Amina K.'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.save()
+        self.assertConsistent()
+
+    def test_interleaved_writes_keep_the_newest_document(self):
+        # a second writer commits while the first one's rebuild is between build and store
+        tb, build, pending = Program.objects.create(name='TB'), timeline.build, [True]
+        def interleaved(patient_ids):
+            documents = build(patient_ids)
+            if pending:
+                pending.pop()
+                Enrollment.objects.create(patient=self.patient, program=tb)
+            return documents
+        with mock.patch.object(timeline, 'build', side_effect=interleaved):
+            with self.captureOnCommitCallbacks(execute=True):
+                Enrollment.objects.create(patient=self.patient, program=self.program)
+        document = PatientTimeline.objects.get(pk=self.patient.pk).document
+        self.assertEqual(len(document['enrollments']), 3)
+        self.assertConsistent()
+
+    def test_document_matches_api_serializers(self):
+        document = timeline.build([self.patient.pk])[self.patient.pk]
+        patient  = Patient.objects.get(pk=self.patient.pk)
+        expected = PatientSerializer(patient).data
+        self.assertEqual({k: document[k] for k in expected if k != 'enrollments'},
+                         {k: v for k, v in expected.items() if k != 'enrollments'})
+        self.assertEqual(document['enrollments'], [dict(e) for e in expected['enrollments']])
+        self.assertEqual(document['diagnoses'], [dict(DiagnosisSerializer(self.diag).data)])
+
+    def test_bulk_paths_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.dispense([self.diag.pk], self.doctor)
+        document = timeline.get(self.patient.pk)
+        self.assertEqual(document['events'][-1]['type'], 'dispensed')
+        self.assertEqual(document['enrollments'][0]['status'], 'dispensed')
+
+        importer.import_patients(iter([(1, {'name': 'Baraka', 'age': 40, 'gender': 'Male', 'contact': '0711'})]))
+        baraka = Patient.objects.get(contact='0711')
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_enrollments(iter([(1, {'patient': baraka.pk, 'program': self.program.pk})]))
+        self.assertEqual(len(timeline.get(baraka.pk)['enrollments']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.delete()
+        self.assertConsistent()
+
+    def test_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Diagnosis.objects.filter(pk=self.diag.pk).delete()
+        self.assertEqual(timeline.get(self.patient.pk)['diagnoses'], [])
+        self.patient.delete()
+        self.assertFalse(PatientTimeline.objects.exists())
+
+    def test_profile_is_one_read(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(f'/api/patients/{self.patient.pk}/profile/').json()
+        self.assertEqual(data['name'], 'Amina')
+        self.assertEqual(data['diagnoses'][0]['diagnosis'], 'Flu')
+        self.assertEqual(self.client.get('/api/patients/999/profile/').status_code, 404)
+
+    def test_missing_document_is_built_on_read(self):
+        PatientTimeline.objects.all().delete()
+        self.assertEqual(timeline.get_by_contact('0700')['id'], self.patient.pk)
+        self.assertTrue(PatientTimeline.objects.filter(pk=self.patient.pk).exists())
+
+    def test_check_command_reports_and_fixes(self):
+        Diagnosis.objects.filter(pk=self.diag.pk).update(diagnosis='Malaria')   # no signals
+        out = io.StringIO()
+        call_command('check_timelines', stdout=out)
+        self.assertIn('stale: 1', out.getvalue())
+        call_command('check_timelines', '--fix', stdout=io.StringIO())
+        self.assertConsistent()
+        self.assertEqual(timeline.get(self.patient.pk)['diagnoses'][0]['diagnosis'], 'Malaria')
+
+    def test_lookup_page(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get('/patients/lookup/', {'contact': '0700'})
+        self.assertContains(response, 'Amina')
+        self.assertContains(response, 'diagnosed (HIV) by doc')
+        self.assertContains(self.client.get('/patients/lookup/', {'contact': 'nobody'}), 'No patient')
@@ -0,0 +1,176 @@
+"""
+Per-patient timeline documents.
+
+Reading a patient's history used to walk Patient → enrollments →
+diagnoses → users on every request. PatientTimeline keeps the result as
+one JSON document per patient, keyed by patient id:
+
+    {id, name, age, gender, contact,
+     enrollments: [...],          # as PatientSerializer nests them
+     diagnoses:   [...],          # as DiagnosisSerializer renders them
+     events:      [{type: enrolled|diagnosed|dispensed, date, enrollment,
+                    program, diagnosis?, by?}, …]}   # oldest first
+
+signals.py refreshes the affected patient's document on every Patient,
+Enrollment and Diagnosis write; the bulk paths that skip signals
+(services.dispense, importer, user deletion) call refresh() themselves.
+Documents are rebuilt once the writer's transaction commits, with the
+patient rows locked, so two concurrent writers to one patient cannot
+leave the document built by the one that saw less.
+A missing document is built on first read. Documents hold ids, not names,
+so renaming a program or user never fans out. `manage.py check_timelines`
+compares them with the source tables (--fix rewrites the stale ones).
+"""
+from itertools import islice
+
+from django.db        import transaction
+from django.db.models import F
+from rest_framework   import serializers
+
+from .contacts import normalize_contact
+from .models   import Patient, Enrollment, Diagnosis, PatientTimeline
+
+BATCH_SIZE = 500
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BUILDING
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _events(document):
+    programs = {e['id']: e['program'] for e in document['enrollments']}
+    events   = [{'type': 'enrolled', 'date': e['enrolled_on'], 'enrollment': e['id'],
+                 'program': e['program']} for e in document['enrollments']]
+    for d in document['diagnoses']:
+        common = {'enrollment': d['enrollment'], 'program': programs.get(d['enrollment']),
+                  'diagnosis': d['id']}
+        events.append({'type': 'diagnosed', 'date': d['created_on'], **common, 'by': d['created_by']})
+        if d['dispensed'] and d['dispensed_on']:
+            events.append({'type': 'dispensed', 'date': d['dispensed_on'], **common, 'by': d['dispensed_by']})
+    # ISO dates sort chronologically; a day's enrollment sorts before its datetimes
+    return sorted(events, key=lambda e: (e['date'], e['diagnosis'] if 'diagnosis' in e else 0))
+
+# DRF's own formatting, without a serializer per row (see importer._validate)
+_date, _datetime = serializers.DateField(), serializers.DateTimeField()
+
+def _format(value, field):
+    return None if value is None else field.to_representation(value)
+
+def build(patient_ids):
+    """
+    {patient_id: document} for the existing patients among patient_ids, in
+    3 queries; enrollment and diagnosis entries match the API serializers.
+    """
+    documents = {p['id']: {**p, 'enrollments': [], 'diagnoses': []}
+                 for p in Patient.objects.filter(pk__in=patient_ids)
+                                         .values('id', 'name', 'age', 'gender', 'contact')}
+    enrollments = Enrollment.objects.filter(patient__in=patient_ids).with_diagnosis_id().order_by('id') \
+        .values('id', 'enrolled_on', 'status', 'patient', 'program', diagnosis_id=F('first_diagnosis_id'))
+    for e in enrollments:
+        e['enrolled_on'] = _format(e['enrolled_on'], _date)
+        documents[e['patient']]['enrollments'].append(e)
+
+    diagnoses = Diagnosis.objects.filter(enrollment__patient__in=patient_ids).order_by('id').values(
+        'id', 'diagnosis', 'recommendations', 'created_on', 'dispensed', 'dispensed_on',
+        'created_by', 'dispensed_by', 'enrollment', patient_id=F('enrollment__patient'))
+    for d in diagnoses:
+        patient_id        = d.pop('patient_id')
+        d['created_on']   = _format(d['created_on'], _datetime)
+        d['dispensed_on'] = _format(d['dispensed_on'], _datetime)
+        documents[patient_id]['diagnoses'].append(d)
+
+    for document in documents.values():
+        document['events'] = _events(document)
+    return documents
+
+def _batches(ids):
+    ids = iter(ids)
+    while batch := list(islice(ids, BATCH_SIZE)):
+        yield batch
+
+def refresh(patient_ids):
+    """Rebuild and store the documents of these patients after the current transaction commits."""
+    patient_ids = sorted(set(patient_ids))
+    if patient_ids:
+        transaction.on_commit(lambda: _rebuild(patient_ids))
+
+def _rebuild(patient_ids):
+    for batch in _batches(patient_ids):
+        with transaction.atomic():
+            # one rebuild per patient at a time; each reads what committed before it got the lock
+            list(Patient.objects.select_for_update().filter(pk__in=batch).order_by('pk')
+                 .values_list('pk', flat=True))
+            _store(build(batch))
+
+def add_patients(patients):
+    """Documents for just-created Patient instances (nothing to query yet)."""
+    PatientTimeline.objects.bulk_create([PatientTimeline(patient_id=p.pk, document={
+        'id': p.pk, 'name': p.name, 'age': p.age, 'gender': p.gender, 'contact': p.contact,
+        'enrollments': [], 'diagnoses': [], 'events': [],
+    }) for p in patients], batch_size=BATCH_SIZE)
+
+def refresh_for_diagnoses(diagnosis_ids):
+    refresh(Diagnosis.objects.filter(pk__in=diagnosis_ids)
+            .values_list('enrollment__patient_id', flat=True))
+
+def _store(documents):
+    PatientTimeline.objects.bulk_create(
+        [PatientTimeline(patient_id=pk, document=doc) for pk, doc in documents.items()],
+        update_conflicts=True, unique_fields=['patient'], update_fields=['document', 'updated_on'],
+    )
+
+# ────────────────────────────────────────────────────────────────────────────────
+# READING
+# ────────────────────────────────────────────────────────────────────────────────
+
+def get(patient_id):
+    """The patient's document, or None if there is no such patient."""
+    document = PatientTimeline.objects.filter(pk=patient_id).values_list('document', flat=True).first()
+    if document is None:
+        document = build([patient_id]).get(int(patient_id))
+        if document is not None:
+            _store({int(patient_id): document})
+    return document
+
+def get_by_contact(contact):
+    """
+    The document of the patient with this contact, or None. The contact
+    is matched in its canonical form (contacts.py), so '+254 712 345 678'
+    and '0712345678' find the same patient through one unique index.
+    """
+    key = normalize_contact(contact)
+    if key is None:
+        return None
+    document = PatientTimeline.objects.filter(patient__contact_normalized=key) \
+        .values_list('document', flat=True).first()
+    if document is None:
+        patient_id = Patient.objects.filter(contact_normalized=key).values_list('pk', flat=True).first()
+        document   = get(patient_id) if patient_id is not None else None
+    return document
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CONSISTENCY
+# ────────────────────────────────────────────────────────────────────────────────
+
+def check(fix=False):
+    """
+    Compare every stored document with one rebuilt from the source tables.
+    Returns {'checked', 'missing': [ids], 'stale': [ids]}; fix=True stores
+    the rebuilt documents for those patients.
+    """
+    result = {'checked': 0, 'missing': [], 'stale': []}
+    patient_ids = Patient.objects.order_by('pk').values_list('pk', flat=True)
+    for batch in _batches(patient_ids.iterator(chunk_size=BATCH_SIZE)):
+        fresh  = build(batch)
+        stored = dict(PatientTimeline.objects.filter(pk__in=batch).values_list('pk', 'document'))
+        wrong  = {}
+        for pk, document in fresh.items():
+            if pk not in stored:
+                result['missing'].append(pk)
+                wrong[pk] = document
+            elif stored[pk] != document:
+                result['stale'].append(pk)
+                wrong[pk] = document
+        if fix and wrong:
+            _store(wrong)
+        result['checked'] += len(fresh)
+    return result
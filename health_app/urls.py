@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path, include
-from . import views
+from . import views, async_views
 from .views import PatientViewSet, ProgramViewSet, EnrollmentViewSet, DiagnosisViewSet
 from rest_framework import routers
 
@@ -15,19 +16,31 @@ router.register(r'diagnoses', DiagnosisViewSet)
 
 app_name = 'health_app'
 
+# read-mostly role pages: async versions under ASGI (see async_views.py)
+pages = async_views if settings.HEALTH_ASYNC_VIEWS else views
+
 
 urlpatterns = [
+    path('api/cache-stats/',                  views.cache_stats,       name='cache_stats'),
+    path('api/metrics/',                      views.metrics_view,      name='metrics'),
+    path('api/exports/<str:dataset>.<str:extension>', views.export_view, name='export'),
+    path('api/jobs/<int:pk>/',                views.job_status,        name='job'),
+    path('api/reports/',                      views.ReportView.as_view(), name='reports'),
     path('api/', include(router.urls)),
     path('',                                  views.role_redirect,     name='role_redirect'),
-    path('patients/',                         views.list_patients,     name='list_patients'),
+    path('patients/',                         pages.list_patients,     name='list_patients'),
     path('patients/create/',                  views.create_patient,    name='create_patient'),
-    path('enrollments/',                      views.list_enrollments,  name='list_enrollments'),   
+    path('patients/lookup/',                  views.patient_lookup,    name='patient_lookup'),
+    path('enrollments/',                      pages.list_enrollments,  name='list_enrollments'),   
     path('enrollments/create/',               views.create_enrollment, name='create_enrollment'),
-    path('doctor/patients/',                  views.doctor_patients,   name='doctor_patients'),
+    path('doctor/patients/',                  pages.doctor_patients,   name='doctor_patients'),
     path('doctor/diagnose/',                  views.create_diagnosis,  name='create_diagnosis'),
-    path('pharmacy/queue/',                   views.pharmacy_queue,    name='pharmacy_queue'),
+    path('doctor/diagnose/batch/',            views.create_diagnosis_batch, name='create_diagnosis_batch'),
+    path('pharmacy/queue/',                   pages.pharmacy_queue,    name='pharmacy_queue'),
+    path('pharmacy/queue/changes/',           views.pharmacy_queue_changes, name='pharmacy_queue_changes'),
     path('pharmacy/dispense/<int:diag_id>/<int:enrollment_id>/',views.dispense, name='dispense'),
-    path('overview/', views.admin_overview, name='admin_overview'),
+    path('pharmacy/dispense/batch/',          views.dispense_batch,    name='dispense_batch'),
+    path('overview/', pages.admin_overview, name='admin_overview'),
     path('accounts/',                         include('django.contrib.auth.urls')),
 
 ]
@@ -1,41 +1,58 @@
+import json
+import tempfile
 
+from django.contrib.auth import get_user_model
 from django.contrib.auth.views import LoginView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 
 
-import requests
 from django.shortcuts               import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.utils.timezone          import now
-from django.utils.dateparse         import parse_date
-from django.db.models               import Count
-
-from rest_framework               import viewsets, filters
-from rest_framework.decorators    import action
+from django.core.files              import File
+from django.core.files.base         import ContentFile
+from django.core.paginator          import Paginator
+from django.http                    import (JsonResponse, HttpResponseBadRequest, Http404,
+                                           FileResponse, StreamingHttpResponse)
+from django.views.decorators.http   import require_POST
+from django.utils.timezone          import now, localdate
+from django.utils.dateparse         import parse_datetime
+from django.utils.functional        import SimpleLazyObject
+from datetime                       import timedelta
+
+from rest_framework               import viewsets, status
+from rest_framework.exceptions    import ValidationError, ParseError
+from rest_framework.decorators    import action, api_view, permission_classes, renderer_classes
+from rest_framework.permissions   import IsAdminUser, IsAuthenticated
+from rest_framework.settings      import api_settings
+from rest_framework.views         import APIView
 from rest_framework.response      import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models      import Program, Patient, Enrollment, DoctorProfile, Diagnosis
+from .models      import Program, Patient, Enrollment, Diagnosis, Job
 from .forms       import PatientForm, EnrollmentForm
 from .serializers import (
     ProgramSerializer,
     PatientSerializer,
     EnrollmentSerializer,
     DiagnosisSerializer,
+    DiagnosisEntrySerializer,
+    ReportQuerySerializer,
+    JobSerializer,
+    ExportQuerySerializer,
 )
-
-# ────────────────────────────────────────────────────────────────────────────────
-# API ENDPOINT CONSTANTS (used by your function-based views)
-# ────────────────────────────────────────────────────────────────────────────────
-
-API_BASE    = 'http://127.0.0.1:8000/api/'
-PATIENT_API = f'{API_BASE}patients/'
-ENROLL_API  = f'{API_BASE}enrollments/'
-DIAG_API    = f'{API_BASE}diagnoses/'
+from .pagination  import (PatientCursorPagination, PatientSearchPagination, EnrollmentCursorPagination,
+                          StreamingListMixin)
+from .roles       import get_roles, doctor_program
+from .search      import PatientSearchFilter
+from .response_cache import CachedResponseMixin, cached_response
+from .fieldsets   import SparseFieldsViewMixin
+from .reports     import ReportCSVRenderer
+from .metrics     import PrometheusRenderer
+from . import services, stats, importer, response_cache, reports, timeline, metrics, fragments, jobs, exports
 
 # ────────────────────────────────────────────────────────────────────────────────
 # ROLE‐CHECK DECORATOR
@@ -44,65 +61,243 @@ DIAG_API    = f'{API_BASE}diagnoses/'
 def in_group(name):
     """
     Decorator: allows only users in the given group (or superusers).
+    Group membership is read from the cached role set (see roles.py).
     """
-    return user_passes_test(lambda u: u.groups.filter(name=name).exists() or u.is_superuser)
+    return user_passes_test(lambda u: u.is_superuser or name in get_roles(u))
 
 # ────────────────────────────────────────────────────────────────────────────────
 # DRF VIEWSETS
 # ────────────────────────────────────────────────────────────────────────────────
 
-class ProgramViewSet(viewsets.ModelViewSet):
+BULK_FORMATS = {
+    'text/csv':             'csv',
+    'application/x-ndjson': 'ndjson',
+}
+
+def bulk_rows(request):
+    """
+    Rows of a bulk upload: CSV and NDJSON bodies are streamed line by line,
+    a JSON body must be an array of objects.
+    """
+    fmt = BULK_FORMATS.get(request.content_type)
+    if fmt:
+        return importer.read_rows(request._request, fmt)
+    if request.content_type == 'application/json':
+        if not isinstance(request.data, list):
+            raise ParseError('Expected a JSON array of objects.')
+        return ((i, row if isinstance(row, dict) else None) for i, row in enumerate(request.data, 1))
+    raise ParseError('Send text/csv, application/x-ndjson or a JSON array.')
+
+def store_bulk_upload(request):
+    """
+    Save a bulk upload for a background import; returns (stored name,
+    format). CSV and NDJSON bodies are copied as they stream in, a JSON
+    array is stored as NDJSON.
+    """
+    fmt = BULK_FORMATS.get(request.content_type)
+    if fmt:
+        return importer.store_upload(File(request._request), fmt), fmt
+    lines = ''.join(json.dumps(row) + '\n' for _, row in bulk_rows(request))
+    return importer.store_upload(ContentFile(lines.encode()), 'ndjson'), 'ndjson'
+
+def bulk_response(request, task, run):
+    """
+    The import report of a bulk upload, or with ?async=1 a 202 with the
+    background job that will produce it (see jobs.py); the job's payload
+    names the stored upload rather than holding its rows. An
+    Idempotency-Key header makes a retried upload return the first job
+    instead of a new one.
+    """
+    if request.query_params.get('async') != '1':
+        return Response(run(bulk_rows(request)))
+    upload, fmt = store_bulk_upload(request)
+    key = request.headers.get('Idempotency-Key')
+    job = jobs.enqueue(task, {'upload': upload, 'fmt': fmt}, user=request.user,
+                       key=f'{task}:{request.user.pk}:{key}' if key else None)
+    if job.payload.get('upload') != upload:     # a retry: the first job has its own copy
+        importer.delete_upload(upload)
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': reverse('health_app:job', args=[job.pk])})
+
+# Viewset mixin order: CachedResponseMixin, SparseFieldsViewMixin, StreamingListMixin.
+# cache_models also lists the models that ?expand= can pull in.
+
+class ProgramViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """API CRUD for Program."""
     queryset         = Program.objects.all()
     serializer_class = ProgramSerializer
+    cache_models     = (Program,)
 
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(CachedResponseMixin, SparseFieldsViewMixin, StreamingListMixin, viewsets.ModelViewSet):
     """API CRUD for Patient, with nested enrollments and filtering."""
     queryset         = Patient.objects.prefetch_related('enrollments__program').all()
     serializer_class = PatientSerializer
-    filter_backends  = [DjangoFilterBackend, filters.SearchFilter]
-    search_fields    = ['name', 'contact']
+    pagination_class = PatientCursorPagination
+    filter_backends  = [DjangoFilterBackend, PatientSearchFilter]
+    cache_models     = (Patient, Enrollment, Diagnosis, Program)
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        contact    = self.request.query_params.get('contact')
-        date       = self.request.query_params.get('date')
-        month      = self.request.query_params.get('month')
-        year       = self.request.query_params.get('year')
-        program_id = self.request.query_params.get('program_id')
-
-        if contact:
-            qs = qs.filter(contact__icontains=contact)
-        if date:
-            try:
-                qs = qs.filter(enrollments__enrolled_on=parse_date(date))
-            except ValueError:
-                pass
-        if month:
-            qs = qs.filter(enrollments__enrolled_on__month=month)
-        if year:
-            qs = qs.filter(enrollments__enrolled_on__year=year)
-        if program_id:
-            qs = qs.filter(enrollments__program_id=program_id)
-
-        return qs.distinct()
+        return services.patient_queryset(self.request.query_params)
+
+    @property
+    def paginator(self):
+        # ?search= pages by number in rank order; a cursor over id order
+        # would throw the ranking away.
+        if not hasattr(self, '_paginator'):
+            searching = self.request and self.request.query_params.get('search', '').strip()
+            self._paginator = PatientSearchPagination() if searching else self.pagination_class()
+        return self._paginator
+
+    def create(self, request, *args, **kwargs):
+        data = services.create_patient(request.data)
+        return Response(data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'])
+    @cached_response
     def profile(self, request, pk=None):
-        """GET /api/patients/{pk}/profile/ → full patient data."""
-        patient    = self.get_object()
-        serializer = self.get_serializer(patient)
-        return Response(serializer.data)
-
-class EnrollmentViewSet(viewsets.ModelViewSet):
+        """
+        GET /api/patients/{pk}/profile/ → patient data plus diagnoses and
+        events, read from the precomputed timeline (see timeline.py).
+        """
+        document = timeline.get(int(pk)) if str(pk).isdigit() else None
+        if document is None:
+            raise Http404
+        return Response(document)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """POST /api/patients/bulk/ → import report (see importer.py)."""
+        return bulk_response(request, 'import_patients', importer.import_patients)
+
+class EnrollmentViewSet(CachedResponseMixin, SparseFieldsViewMixin, StreamingListMixin, viewsets.ModelViewSet):
     """API CRUD for Enrollment."""
     queryset         = Enrollment.objects.select_related('patient', 'program').all()
     serializer_class = EnrollmentSerializer
+    pagination_class = EnrollmentCursorPagination
+    cache_models     = (Enrollment, Diagnosis, Patient, Program)
+
+    def get_queryset(self):
+        return services.enrollment_queryset()
+
+    def create(self, request, *args, **kwargs):
+        data = services.create_enrollment(request.data)
+        return Response(data, status=status.HTTP_201_CREATED)
 
-class DiagnosisViewSet(viewsets.ModelViewSet):
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        data    = services.update_enrollment(self.get_object(), request.data, partial=partial)
+        return Response(data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """POST /api/enrollments/bulk/ → import report (see importer.py)."""
+        return bulk_response(request, 'import_enrollments', importer.import_enrollments)
+
+class DiagnosisViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """API CRUD for Diagnosis."""
     queryset         = Diagnosis.objects.select_related('enrollment__patient').all()
     serializer_class = DiagnosisSerializer
+    cache_models     = (Diagnosis, Enrollment, Patient, Program)
+
+    def create(self, request, *args, **kwargs):
+        data = services.create_diagnosis(request.data)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        POST /api/diagnoses/batch/ [{enrollment, diagnosis, recommendations}, …]
+        → {created, conflicts, missing} (see services.diagnose).
+        """
+        entries = DiagnosisEntrySerializer(data=request.data, many=True,
+                                           max_length=services.MAX_DIAGNOSIS_BATCH, allow_empty=False)
+        entries.is_valid(raise_exception=True)
+        user = request.user if request.user.is_authenticated else None
+        return Response(services.diagnose(entries.validated_data, user))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """GET /api/cache-stats/ → response cache hit/miss/304 counters (staff only)."""
+    return Response(response_cache.counters())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes([PrometheusRenderer])
+def metrics_view(request):
+    """GET /api/metrics/ → per-view request metrics, Prometheus text format (staff only)."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_status(request, pk):
+    """GET /api/jobs/{pk}/ → status (and, once done, result) of a job queued by this user; staff see all."""
+    job = get_object_or_404(Job, pk=pk)
+    if not (request.user.is_staff or job.created_by_id == request.user.pk):
+        raise Http404
+    return Response(JobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_view(request, dataset, extension):
+    """
+    GET /api/exports/{enrollments|diagnoses|dispensed}.{csv|parquet}?program=&start=&end=
+    → the whole filtered dataset as a download (see exports.py). Staff only.
+    CSV is streamed as rows are read; Parquet is written to a temporary file first,
+    because its footer comes last.
+    """
+    if dataset not in exports.DATASETS or extension not in exports.FORMATS:
+        raise Http404
+    query = ExportQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    rows   = exports.export_rows(dataset, params.get('program'), params.get('start'), params.get('end'))
+    name   = f'{dataset}.{extension}'
+    if extension == 'csv':
+        response = StreamingHttpResponse(exports.write_csv(dataset, rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+    if not exports.parquet_available():
+        raise ValidationError({'format': ['Parquet export needs pyarrow on the server; use .csv.']})
+    spool = tempfile.TemporaryFile()
+    exports.write_parquet(dataset, rows, spool)
+    spool.seek(0)
+    return FileResponse(spool, as_attachment=True, filename=name,
+                        content_type='application/vnd.apache.parquet')
+
+class ReportView(APIView):
+    """
+    GET /api/reports/?period=day|week|month&start=&end=&program=
+    → enrollment/diagnosis/dispense counts per program and period (see
+    reports.py). ?format=csv downloads the same rows. Staff only.
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes   = [*api_settings.DEFAULT_RENDERER_CLASSES, ReportCSVRenderer]
+    cache_models       = (Program, Enrollment, Diagnosis)
+
+    def cache_vary(self, request):
+        # the default window and the open period move at midnight
+        return localdate().isoformat()
+
+    @cached_response
+    def get(self, request):
+        query = ReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response({
+            'period':  params['period'],
+            'start':   params['start'],
+            'end':     params['end'],
+            'program': params.get('program'),
+            'results': reports.report(params['period'], params['start'], params['end'],
+                                      params.get('program')),
+        })
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(request, 'accepted_renderer', None) and request.accepted_renderer.format == 'csv':
+            response['Content-Disposition'] = 'attachment; filename="report.csv"'
+        return response
 
 # ────────────────────────────────────────────────────────────────────────────────
 # ROLE‐BASED REDIRECT & SUPERUSER DASHBOARD
@@ -116,11 +311,12 @@ def role_redirect(request):
     u = request.user
     if u.is_superuser:
         return redirect('health_app:admin_overview')
-    if u.groups.filter(name='Receptionist').exists():
+    roles = get_roles(u)
+    if 'Receptionist' in roles:
         return redirect('health_app:list_patients')
-    if u.groups.filter(name='Doctor').exists():
+    if 'Doctor' in roles:
         return redirect('health_app:doctor_patients')
-    if u.groups.filter(name='Pharmacist').exists():
+    if 'Pharmacist' in roles:
         return redirect('health_app:pharmacy_queue')
     # Fallback
     return redirect('health_app:login')
@@ -136,20 +332,15 @@ class CustomLoginView(LoginView):
 @in_group('Admin')  # or just superuser
 def dashboard(request):
     """
-    Superuser/Admin overview counts.
+    Superuser/Admin overview counts (precomputed, see stats.py).
     """
-    total_patients    = Patient.objects.count()
-    total_enrollments = Enrollment.objects.count()
-    total_diagnoses   = Diagnosis.objects.count()
-    total_dispensed   = Diagnosis.objects.filter(dispensed=True).count()
-    total_pending     = Diagnosis.objects.filter(dispensed=False).count()
-
+    counters = stats.overview()
     return render(request, 'health_app/dashboard.html', {
-        'total_patients':    total_patients,
-        'total_enrollments': total_enrollments,
-        'total_diagnoses':   total_diagnoses,
-        'total_dispensed':   total_dispensed,
-        'total_pending':     total_pending,
+        'total_patients':    counters['patients'],
+        'total_enrollments': counters['enrollments'],
+        'total_diagnoses':   counters['diagnoses'],
+        'total_dispensed':   counters['dispensed'],
+        'total_pending':     counters['pending'],
     })
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -160,12 +351,10 @@ def dashboard(request):
 @in_group('Receptionist')
 def list_patients(request):
     """
-    List patients via API, with optional search (?q=).
+    List patients, with optional search (?q=).
     """
-    q       = request.GET.get('q', '')
-    params  = {'search': q} if q else {}
-    resp    = requests.get(PATIENT_API, params=params)
-    patients = resp.json() if resp.ok else []
+    q        = request.GET.get('q', '')
+    patients = services.search_patients(q)
     return render(request, 'health_app/patients/list.html', {
         'patients': patients,
         'q':        q,
@@ -175,17 +364,19 @@ def list_patients(request):
 @in_group('Receptionist')
 def create_patient(request):
     """
-    Form to create a patient → POST to /api/patients/.
+    Form to create a patient → services.create_patient (same checks as /api/patients/).
     """
     if request.method == 'POST':
         form = PatientForm(request.POST)
         if form.is_valid():
-            r = requests.post(PATIENT_API, json=form.cleaned_data)
-            if r.status_code == 201:
+            try:
+                patient = services.create_patient(form.cleaned_data)
+            except ValidationError as exc:
+                form.add_error(None, f'Could not save patient: {exc.detail}')
+            else:
                 return render(request, 'health_app/receipts/patient_receipt.html', {
-                    'patient': r.json()
+                    'patient': patient
                 })
-            form.add_error(None, 'API error: ' + r.text)
     else:
         form = PatientForm()
     return render(request, 'health_app/patients/create.html', {'form': form})
@@ -194,12 +385,10 @@ def create_patient(request):
 @in_group('Receptionist')
 def list_enrollments(request):
     """
-    List enrollments via API, with optional search (?q=).
+    List enrollments, with optional search (?q=) on patient or program name.
     """
     q           = request.GET.get('q', '')
-    params      = {'search': q} if q else {}
-    resp        = requests.get(ENROLL_API, params=params)
-    enrollments = resp.json() if resp.ok else []
+    enrollments = services.enrollment_queryset(q)
     return render(request, 'health_app/enrollments/list.html', {
         'enrollments': enrollments,
         'q':           q,
@@ -209,7 +398,7 @@ def list_enrollments(request):
 @in_group('Receptionist')
 def create_enrollment(request):
     """
-    Form to create an enrollment → POST to /api/enrollments/.
+    Form to create an enrollment → services.create_enrollment.
     """
     if request.method == 'POST':
         form = EnrollmentForm(request.POST)
@@ -220,10 +409,12 @@ def create_enrollment(request):
                 'enrolled_on': form.cleaned_data['date_enrolled'].isoformat(),
 
             }
-            r = requests.post(ENROLL_API, json=data)
-            if r.status_code == 201:
+            try:
+                services.create_enrollment(data)
+            except ValidationError as exc:
+                form.add_error(None, f'Could not save enrollment: {exc.detail}')
+            else:
                 return redirect('health_app:list_enrollments')
-            form.add_error(None, 'API error: ' + r.text)
     else:
         form = EnrollmentForm()
     return render(request, 'health_app/enrollments/create.html', {'form': form})
@@ -238,16 +429,14 @@ def doctor_patients(request):
     """
     List patients enrolled in the logged-in doctor's program.
     """
-    q  = request.GET.get('q', '')
-    dp = get_object_or_404(DoctorProfile, user=request.user)
-    patients = Patient.objects.filter(
-        enrollments__program=dp.program,
-        name__icontains=q
-    ).distinct()
+    q        = request.GET.get('q', '')
+    program  = doctor_program(request.user)
+    patients = list(services.program_patients(program, q))
     return render(request, 'health_app/doctor/patients.html', {
-        'patients': patients,
-        'program':  dp.program,
-        'q':        q,
+        'patients':         patients,
+        'patients_version': fragments.stamp_program_patients(patients),
+        'program':          program,
+        'q':                q,
     })
 
 @login_required
@@ -257,13 +446,11 @@ def view_patient(request, patient_id):
     """
     View patient details + relevant enrollments (Doctor or Receptionist).
     """
-    resp = requests.get(f"{PATIENT_API}{patient_id}/")
-    patient = resp.json() if resp.ok else None
+    patient = services.get_patient(patient_id)
 
-    dp = get_object_or_404(DoctorProfile, user=request.user)
     enrollments = Enrollment.objects.filter(
         patient_id=patient_id,
-        program=dp.program
+        program=doctor_program(request.user)
     )
 
     return render(request, 'health_app/doctor/view_patient.html', {
@@ -275,133 +462,194 @@ def view_patient(request, patient_id):
 @in_group('Doctor')
 def create_diagnosis(request, enrollment_id=None):
     """
-    Form to create a Diagnosis → POST to /api/diagnoses/.
-    Prevents duplicate diagnoses per enrollment.
+    Form to create a Diagnosis → services.diagnose, which also marks the
+    enrollment consulted. Duplicates are refused by the database.
     """
-    dp    = get_object_or_404(DoctorProfile, user=request.user)
-    error = None
+    program = doctor_program(request.user)
+    error   = None
 
     if request.method == 'POST':
-        diag_text = request.POST.get('diagnosis', '').strip()
-        recs      = request.POST.get('recommendations', '').strip()
-        eid       = request.POST.get('enrollment')
-
-        if diag_text and recs and eid:
-            if Diagnosis.objects.filter(enrollment_id=eid).exists():
-                error = "Diagnosis already exists for this enrollment."
-            else:
-                payload = {
-                    'enrollment':      eid,
-                    'diagnosis':       diag_text,
-                    'recommendations': recs,
-                    'created_by':      request.user.id,
-                }
-                r = requests.post(DIAG_API, json=payload)
-                if r.status_code == 201:
-                    # mark consulted via API
-                    requests.patch(f"{ENROLL_API}{eid}/", json={'status': 'consulted'})
-                    return render(request, 'health_app/receipts/diagnosis_receipt.html', {
-                        'diagnosis': r.json()
-                    })
-                error = "API error saving diagnosis."
+        entry = DiagnosisEntrySerializer(data={
+            'enrollment':      request.POST.get('enrollment'),
+            'diagnosis':       request.POST.get('diagnosis', '').strip(),
+            'recommendations': request.POST.get('recommendations', '').strip(),
+        })
+        if entry.is_valid():
+            result = services.diagnose([entry.validated_data], request.user, program=program)
+            if result['created']:
+                return render(request, 'health_app/receipts/diagnosis_receipt.html', {
+                    'diagnosis': result['created'][0]
+                })
+            error = ("Diagnosis already exists for this enrollment." if result['conflicts']
+                     else "That enrollment is not in your program.")
         else:
             error = "All fields are required."
 
-    enrollments = Enrollment.objects.filter(program=dp.program, status='registered')
+    enrollments = Enrollment.objects.filter(program=program, status='registered')
     return render(request, 'health_app/doctor/create_diagnosis.html', {
         'enrollments':            enrollments,
         'error':                  error,
         'selected_enrollment_id': enrollment_id,
     })
 
+@login_required
+@in_group('Doctor')
+@require_POST
+def create_diagnosis_batch(request):
+    """
+    Diagnose many enrollments of the doctor's program in one round trip.
+    POST {"diagnoses": [{"enrollment", "diagnosis", "recommendations"}, …]} (JSON)
+    → {"created": [...], "conflicts": [...], "missing": [...]}
+    """
+    try:
+        rows = json.loads(request.body).get('diagnoses')
+    except (ValueError, AttributeError):
+        rows = None
+    if not isinstance(rows, list) or not 0 < len(rows) <= services.MAX_DIAGNOSIS_BATCH:
+        return HttpResponseBadRequest(
+            f'Body must be a JSON object with a "diagnoses" list of 1–{services.MAX_DIAGNOSIS_BATCH} entries.')
+    entries = DiagnosisEntrySerializer(data=rows, many=True)
+    if not entries.is_valid():
+        return JsonResponse({'errors': entries.errors}, status=400)
+    result = services.diagnose(entries.validated_data, request.user, program=doctor_program(request.user))
+    return JsonResponse(result)
+
 # ────────────────────────────────────────────────────────────────────────────────
 # PHARMACIST VIEWS
 # ────────────────────────────────────────────────────────────────────────────────
 
+PHARMACY_PAGE_SIZE    = 25
+PHARMACY_HISTORY_DAYS = 7
+
+def history_days(request):
+    """?days= for the dispensed history, clamped to 1–90."""
+    try:
+        return min(max(int(request.GET.get('days', PHARMACY_HISTORY_DAYS)), 1), 90)
+    except ValueError:
+        return PHARMACY_HISTORY_DAYS
+
 @login_required
 @in_group('Pharmacist')
 def pharmacy_queue(request):
     """
-    Show undispensed vs. dispensed diagnoses.
+    Paginated work queue of undispensed diagnoses (oldest first), plus the
+    dispensed history for the last ?days= days (default 7, max 90).
     """
-    undispensed = Diagnosis.objects.filter(dispensed=False) \
-        .select_related('enrollment__patient', 'enrollment__program')
-    dispensed   = Diagnosis.objects.filter(dispensed=True) \
-        .select_related('enrollment__patient', 'enrollment__program')
+    days      = history_days(request)
+    pending   = Paginator(services.pending_queue(), PHARMACY_PAGE_SIZE) \
+                    .get_page(request.GET.get('page'))
+    dispensed = Paginator(services.dispensed_history(now() - timedelta(days=days)),
+                          PHARMACY_PAGE_SIZE).get_page(request.GET.get('dispensed_page'))
 
     return render(request, 'health_app/pharmacy/queue.html', {
-        'undispensed_diagnoses': undispensed,
+        'undispensed_diagnoses': pending,
+        'pending_version':       fragments.stamp_diagnoses(pending),
         'dispensed_diagnoses':   dispensed,
+        'dispensed_version':     fragments.stamp_diagnoses(dispensed),
+        'days':                  days,
+        'polled_at':             now().isoformat(),
     })
 
 @login_required
 @in_group('Pharmacist')
-def dispense(request, diag_id, enrollment_id):
+def pharmacy_queue_changes(request):
     """
-    Mark a Diagnosis as dispensed and update its Enrollment status.
+    JSON polling endpoint: GET ?since=<ISO timestamp> → diagnoses that
+    entered or left the pending queue since then, plus the server time to
+    send as the next ?since=.
     """
-    diag = get_object_or_404(Diagnosis, id=diag_id)
-    diag.dispensed    = True
-    diag.dispensed_on = now()
-    diag.dispensed_by = request.user
-    diag.save()
+    try:
+        since = parse_datetime(request.GET.get('since', ''))
+    except ValueError:      # well formed but not a real date, e.g. 2024-02-30T00:00
+        since = None
+    if since is None:
+        return HttpResponseBadRequest('since must be an ISO 8601 timestamp.')
+    polled_at = now()
+    return JsonResponse({'now': polled_at.isoformat(), **services.queue_changes(since)})
 
-    enroll        = get_object_or_404(Enrollment, id=enrollment_id)
-    enroll.status = 'dispensed'
-    enroll.save()
+@login_required
+@in_group('Pharmacist')
+@require_POST
+def dispense(request, diag_id, enrollment_id):
+    """
+    POST (CSRF-protected): mark a Diagnosis as dispensed and update its
+    Enrollment status, atomically. Responds 409 if someone else already
+    dispensed it.
+    """
+    get_object_or_404(Diagnosis, id=diag_id, enrollment_id=enrollment_id)
+    result = services.dispense([diag_id], request.user)
+    diag   = Diagnosis.objects.select_related('dispensed_by').get(id=diag_id)
 
     return render(request, 'health_app/receipts/dispense_receipt.html', {
-        'diag': diag
-    })
+        'diag':     diag,
+        'conflict': bool(result['conflicts']),
+    }, status=409 if result['conflicts'] else 200)
+
+@login_required
+@in_group('Pharmacist')
+@require_POST
+def dispense_batch(request):
+    """
+    Dispense many diagnoses in one round trip.
+    POST ids=1&ids=2… (form) or {"ids": [1, 2, …]} (JSON)
+    → {"dispensed": [...], "conflicts": [...], "missing": [...]}
+    """
+    if request.content_type == 'application/json':
+        try:
+            ids = json.loads(request.body).get('ids')
+        except (ValueError, AttributeError):
+            ids = None
+    else:
+        # form values are strings: only plain digit strings become ids
+        ids = [int(v) if v.isascii() and v.isdigit() else v for v in request.POST.getlist('ids')]
+    if (not isinstance(ids, list) or not 0 < len(ids) <= services.MAX_DISPENSE_BATCH
+            or any(type(pk) is not int for pk in ids)):
+        return HttpResponseBadRequest(
+            f'Send an "ids" list of 1–{services.MAX_DISPENSE_BATCH} integer diagnosis ids.')
+    return JsonResponse(services.dispense(ids, request.user))
 
 # ────────────────────────────────────────────────────────────────────────────────
 # UTILITY VIEW: PATIENT LOOKUP
 # ────────────────────────────────────────────────────────────────────────────────
 
+@login_required
 def patient_lookup(request):
     """
     Find patient by contact, display their enrollments & diagnoses.
+    The contact may be written in any form (see contacts.py); the page is
+    built from services.lookup_patient, as the overview's search is.
     """
-    contact = request.GET.get('contact')
-    patient = Patient.objects.filter(contact=contact).first()
-    if patient:
-        enrollments = patient.enrollments.select_related('program')
-        diagnoses   = Diagnosis.objects.filter(enrollment__in=enrollments) \
-                           .select_related('created_by')
+    contact  = request.GET.get('contact')
+    document = services.lookup_patient(contact)
+    if document:
         return render(request, 'health_app/patient_lookup.html', {
-            'patient':     patient,
-            'enrollments': enrollments,
-            'diagnoses':   diagnoses
+            'patient':     document,
+            'enrollments': document['enrollments'],
+            'diagnoses':   document['diagnoses'],
+            'events':      document['events'],
+            'contact':     contact,
         })
-    return render(request, 'health_app/patient_lookup.html', {'not_found': True})
+    return render(request, 'health_app/patient_lookup.html', {'not_found': bool(contact), 'contact': contact})
 
 # ────────────────────────────────────────────────────────────────────────────────
 # STAFF‐ONLY ADMIN OVERVIEW
 # ────────────────────────────────────────────────────────────────────────────────
 
+# what the cached summary section shows: counters over these tables, doctor usernames
+OVERVIEW_MODELS = (Patient, Enrollment, Diagnosis, Program, get_user_model())
+
 @staff_member_required
 def admin_overview(request):
     """
     Staff-only overview: model counts, program & doctor summaries, patient search.
+    Counts come from the materialized counters (see stats.py), read only when
+    the cached summary fragment is out of date.
     """
-    patients_count      = Patient.objects.count()
-    total_enrollments   = Enrollment.objects.count()
-    programs_summary    = Enrollment.objects.values('program__name') \
-                                .annotate(count=Count('id'))
-    doctor_diagnoses    = Diagnosis.objects.values('created_by__username') \
-                                .annotate(count=Count('id'))
-    dispensed_count     = Diagnosis.objects.filter(dispensed=True).count()
-    not_dispensed_count = Diagnosis.objects.filter(dispensed=False).count()
-
     contact = request.GET.get('contact')
-    searched_patient = Patient.objects.filter(contact=contact).first() if contact else None
+    searched_patient = services.lookup_patient(contact)
 
     return render(request, 'health_app/admin/overview.html', {
-        'patients_count':      patients_count,
-        'total_enrollments':   total_enrollments,
-        'programs_summary':    programs_summary,
-        'doctor_diagnoses':    doctor_diagnoses,
-        'dispensed_count':     dispensed_count,
-        'not_dispensed_count': not_dispensed_count,
-        'searched_patient':    searched_patient,
+        'overview':         SimpleLazyObject(stats.overview),
+        'overview_version': fragments.models_version(*OVERVIEW_MODELS),
+        'searched_patient': searched_patient,
     })
@@ -0,0 +1,6 @@
+import os
+from django.core.asgi import get_asgi_application
+os.environ.setdefault('DJANGO_SETTINGS_MODULE','health_system.settings')
+# serve the async role pages (health_app/async_views.py) under ASGI
+os.environ.setdefault('HEALTH_ASYNC_VIEWS','1')
+application = get_asgi_application()
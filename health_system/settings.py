@@ -1,4 +1,5 @@
 import os
+from health_app import database
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'replace-me'
 DEBUG = True
@@ -9,6 +10,7 @@ INSTALLED_APPS = [
     'rest_framework','django_filters','health_app',
 ]
 MIDDLEWARE = [
+    'health_app.metrics.MetricsMiddleware',   # first, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -21,18 +23,62 @@ ROOT_URLCONF = 'health_system.urls'
 TEMPLATES = [{
     'BACKEND': 'django.template.backends.django.DjangoTemplates',
     'DIRS': [os.path.join(BASE_DIR, 'health_app', 'templates')],
-    'APP_DIRS': True,
-    'OPTIONS': {'context_processors':[
-        'django.template.context_processors.debug',
-        'django.template.context_processors.request',
-        'django.contrib.auth.context_processors.auth',
-        'django.contrib.messages.context_processors.messages',
-    ]},
+    'OPTIONS': {
+        # compiled templates are kept in memory per process; in development the
+        # autoreloader clears them when a template file changes
+        'loaders': [('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ])],
+        'context_processors':[
+            'django.template.context_processors.debug',
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
+    },
 }]
 WSGI_APPLICATION = 'health_system.wsgi.application'
-DATABASES = {'default':{'ENGINE':'django.db.backends.sqlite3','NAME':os.path.join(BASE_DIR,'db.sqlite3')}}
+ASGI_APPLICATION = 'health_system.asgi.application'
+# async role pages (health_app/async_views.py); asgi.py sets this to 1
+HEALTH_ASYNC_VIEWS = os.environ.get('HEALTH_ASYNC_VIEWS') == '1'
+# SQLite (WAL) by default; HEALTH_DATABASE_URL=postgres://… switches to PostgreSQL
+# with persistent or pooled connections (health_app/database.py lists the knobs)
+DATABASES = {'default': database.config(os.environ, BASE_DIR)}
 AUTH_PASSWORD_VALIDATORS = []
 LANGUAGE_CODE = 'en-us'; TIME_ZONE = 'UTC'; USE_I18N=True; USE_L10N=True; USE_TZ=True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'health_app', 'static')]
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+# Response cache for the API (health_app/response_cache.py), also holding the
+# fragment versions, role sets and program list. HEALTH_CACHE picks
+# the backend — locmem (single process only: other workers would never see the
+# version bumps), file (shared by workers on one host) or redis — and
+# HEALTH_CACHE_LOCATION overrides the directory / URL.
+_RESPONSE_CACHES = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache',       'health-responses'),
+    'file':   ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, '.cache', 'responses')),
+    'redis':  ('django.core.cache.backends.redis.RedisCache',         'redis://127.0.0.1:6379/1'),
+}
+_backend, _location = _RESPONSE_CACHES[os.environ.get('HEALTH_CACHE', 'locmem')]
+CACHES = {
+    'default':   {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': {'BACKEND': _backend, 'LOCATION': os.environ.get('HEALTH_CACHE_LOCATION', _location),
+                  'OPTIONS': {'MAX_ENTRIES': 10000} if _backend.endswith('LocMemCache') else {}},
+}
+HEALTH_RESPONSE_CACHE = 'responses'
+# Row/section fragment cache of the role pages (health_app/fragments.py), in
+# the responses cache; HEALTH_FRAGMENT_CACHE=0 renders everything afresh.
+HEALTH_FRAGMENT_CACHE = os.environ.get('HEALTH_FRAGMENT_CACHE', '1') != '0'
+# Patient contacts are matched in international form: a leading trunk 0 is
+# replaced by this country code (health_app/contacts.py).
+HEALTH_CONTACT_COUNTRY_CODE = os.environ.get('HEALTH_CONTACT_COUNTRY_CODE', '254')
+# Background jobs (health_app/jobs.py): a job running longer than this many
+# seconds is taken to have lost its worker and is requeued.
+HEALTH_JOB_TIMEOUT = int(os.environ.get('HEALTH_JOB_TIMEOUT', '600'))
+# Uploads queued for a background import are kept here until it has run
+# (health_app/importer.py); every worker must be able to read it.
+HEALTH_UPLOAD_DIR = os.environ.get('HEALTH_UPLOAD_DIR', os.path.join(BASE_DIR, '.uploads'))
+# Request metrics (health_app/metrics.py): log requests at least this slow,
+# with their SQL; unset leaves slow-request logging off.
+HEALTH_SLOW_REQUEST_MS = float(os.environ['HEALTH_SLOW_REQUEST_MS']) if os.environ.get('HEALTH_SLOW_REQUEST_MS') else None